@@ -26,6 +26,8 @@ setup(
         "fpzip==1.2.4",
         "imageio>=2.31.1",
         "python-dotenv==1.0.1",
+        "zstandard>=0.21.0",
+        "orjson>=3.9",
     ],
     extras_require={
         "dev": [
@@ -39,6 +41,9 @@ setup(
             "tqdm",
             "matplotlib",
         ],
+        "parquet": [
+            "pyarrow>=14,<26",
+        ],
     },
     python_requires=">=3.9",
     classifiers=[
@@ -1,22 +1,50 @@
 import logging
 import os
 import threading
+import uuid
 from collections import defaultdict
+from functools import partial
 from threading import Lock
 
 import pandas as pd
-from flask import Flask
+from flask import g, redirect, request, session, url_for
 from flask_cors import CORS
 from flask_session import Session
 
+from synanno.backend.cpu_pool import CpuPool
+from synanno.backend.edit_log import open_edit_log
+from synanno.backend.jobs import JobExecutor
+from synanno.backend.metadata_store import MetadataStore
+from synanno.backend.page_events import PageEvents
+from synanno.backend.prefetch import PagePrefetcher
+from synanno.backend.processing import (
+    grid_mip,
+    instance_pages,
+    reload_instance,
+    source_tile_token,
+)
+from synanno.backend.shared_tiles import SharedTileStore
+from synanno.backend.tile_cache import TileCache
+from synanno.backend.tile_store import TileStore
+from synanno.backend.utils import TILE_MIMETYPES
+from synanno.backend.workspaces import (
+    WorkspaceFlask,
+    WorkspaceManager,
+    WorkspacesFull,
+    current_workspace,
+)
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# the endpoints that read no session state, they never create a workspace
+STATELESS_ENDPOINTS = (None, "static", "landingpage.landing")
+
 
 def create_app():
     """Factory function to create and configure the Flask app."""
 
-    app = Flask(__name__)
+    app = WorkspaceFlask(__name__)
 
     # Configure Flask app
     configure_app(app)
@@ -31,9 +59,86 @@ def create_app():
     # attach a lock for the data frame access to the app instance
     app.df_metadata_lock = Lock()
 
+    # the tile cache outlives resets, it is shared by all sessions
+    app.tile_cache = TileCache(
+        app.config["TILE_CACHE_DIR"], app.config["TILE_CACHE_SIZE_MB"] * 1024**2
+    )
+
+    # lets further worker processes serve the tiles of the pages built here
+    app.shared_tiles = (
+        SharedTileStore(app.config["SHARED_TILE_DB"])
+        if app.config["SHARED_TILE_DB"]
+        else None
+    )
+
+    # runs page builds and other long tasks in the background under a job ID
+    app.jobs = JobExecutor(app.config["JOB_WORKERS"])
+
+    # runs the CPU-bound instance processing, the downloads stay on threads
+    app.cpu_pool = CpuPool(app.config["CPU_WORKERS"])
+
+    # holds the session state, assigned last as all later attributes live in it
+    setup_workspaces(app)
+
     return app
 
 
+def setup_workspaces(app):
+    """Keep the session state in workspaces, one per annotator if configured."""
+    app.workspaces = WorkspaceManager(
+        partial(initialize_global_variables, app),
+        per_session=app.config["PER_SESSION_WORKSPACES"],
+        max_workspaces=app.config["MAX_WORKSPACES"],
+        idle_timeout=app.config["WORKSPACE_IDLE_MINUTES"] * 60,
+        on_evict=partial(release_workspace, app),
+        in_use=partial(workspace_in_use, app),
+    )
+
+    @app.before_request
+    def bind_workspace():
+        anonymous = app.workspaces.per_session and "workspace" not in session
+        if anonymous:
+            # a saved session keeps its ID, and thus its workspace
+            session["workspace"] = True
+        if request.endpoint in STATELESS_ENDPOINTS:
+            return None
+        if anonymous:
+            # a request without a saved session, e.g. a health check, gets no
+            # workspace, the landing page starts the session of an annotator
+            return redirect(url_for("landingpage.landing"))
+        try:
+            g.workspace_token = app.workspaces.bind(app.workspaces.current())
+        except WorkspacesFull as exc:
+            logger.warning("Refusing session %s: %s", session.sid, exc)
+            return (
+                "All annotation sessions of this server are in use, "
+                "please try again later.",
+                503,
+            )
+        return None
+
+    @app.teardown_request
+    def unbind_workspace(exc):
+        token = g.pop("workspace_token", None)
+        if token is not None:
+            current_workspace.reset(token)
+
+
+def workspace_in_use(app):
+    """Tell whether the current workspace opened a dataset or holds instances."""
+    return app.vol_dim != (0, 0, 0) or not app.df_metadata.empty
+
+
+def release_workspace(app):
+    """Stop the background work of the current workspace before it is dropped."""
+    app.prefetcher.cancel(wait=False)
+    # the log stays on disk, its edits are restored when the dataset is reopened
+    if app.edit_log is not None:
+        app.edit_log.close()
+    if app.shared_tiles is not None:
+        app.shared_tiles.drop(app.workspaces.current_id())
+
+
 def configure_app(app):
     """Configure the Flask app with required settings."""
     # Enable CORS
@@ -56,14 +161,52 @@ def configure_app(app):
         PORT=int(os.getenv("APP_PORT", 80)),
         NG_IP=os.getenv("PUBLIC_DNS_SYNANNO", "0.0.0.0"),
         NG_PORT=os.getenv("NG_PORT", "9015"),
+        TILE_CACHE_DIR=os.getenv("TILE_CACHE_DIR", "/tmp/synanno_tile_cache"),
+        TILE_CACHE_SIZE_MB=int(os.getenv("TILE_CACHE_SIZE_MB", 2048)),
+        PREFETCH_DEPTH=int(os.getenv("PREFETCH_DEPTH", 2)),
+        JOB_WORKERS=int(os.getenv("JOB_WORKERS", 2)),
+        SOURCE_TILE_CODEC=os.getenv("SOURCE_TILE_CODEC", "png"),
+        SOURCE_TILE_QUALITY=int(os.getenv("SOURCE_TILE_QUALITY", 90)),
+        PNG_COMPRESS_LEVEL=int(os.getenv("PNG_COMPRESS_LEVEL", 6)),
+        CPU_WORKERS=int(os.getenv("CPU_WORKERS", 0)),
+        DOWNLOAD_WORKERS=int(os.getenv("DOWNLOAD_WORKERS", 8)),
+        SEGMENT_WORKERS=int(os.getenv("SEGMENT_WORKERS", 4)),
+        STORE_WORKERS=int(os.getenv("STORE_WORKERS", 2)),
+        PIPELINE_QUEUE_SIZE=int(os.getenv("PIPELINE_QUEUE_SIZE", 8)),
+        MATCH_TARGET_MIP=bool(os.getenv("MATCH_TARGET_MIP", "False") == "True"),
+        GRID_MIP=int(os.getenv("GRID_MIP", 0)),
+        TILE_MEMORY_BUDGET_MB=int(os.getenv("TILE_MEMORY_BUDGET_MB", 1024)),
+        SHARED_TILE_DB=os.getenv("SHARED_TILE_DB", ""),
+        PER_SESSION_WORKSPACES=bool(
+            os.getenv("PER_SESSION_WORKSPACES", "False") == "True"
+        ),
+        MAX_WORKSPACES=int(os.getenv("MAX_WORKSPACES", 8)),
+        WORKSPACE_IDLE_MINUTES=int(os.getenv("WORKSPACE_IDLE_MINUTES", 0)),
+        EDIT_LOG_DIR=os.getenv("EDIT_LOG_DIR", "/tmp/synanno_edit_log"),
+        EDIT_LOG_FLUSH_MS=int(os.getenv("EDIT_LOG_FLUSH_MS", 200)),
+        MATERIALIZATION_CACHE_DIR=os.getenv(
+            "MATERIALIZATION_CACHE_DIR", "/tmp/synanno_materialization_cache"
+        ),
     )
 
-    # Initialize global variables
-    initialize_global_variables(app)
+    if app.config["SOURCE_TILE_CODEC"] not in TILE_MIMETYPES:
+        logger.warning(
+            "Unknown SOURCE_TILE_CODEC %s, using png. Choose one of: %s.",
+            app.config["SOURCE_TILE_CODEC"],
+            ", ".join(TILE_MIMETYPES),
+        )
+        app.config["SOURCE_TILE_CODEC"] = "png"
 
 
 def initialize_global_variables(app):
-    """Set up the global variables for the app."""
+    """Set up the session state of the app's current workspace."""
+    # a running prefetch would otherwise write into the new session's data
+    if hasattr(app, "prefetcher"):
+        app.prefetcher.cancel()
+
+    # loads the viewed page and the pages following it in the background
+    app.prefetcher = PagePrefetcher(app.config["PREFETCH_DEPTH"], app.jobs)
+
     app.proofread_time = {
         "start_grid": None,
         "finish_grid": None,
@@ -86,6 +229,7 @@ def initialize_global_variables(app):
     app.cz1, app.cz2, app.cz, app.cy, app.cx = 0, 0, 0, 0, 0
     app.n_pages = 0
     app.tiles_per_page = 24  # Number of images per page
+    app.source_tile_codec = app.config["SOURCE_TILE_CODEC"]
     # Neuron skeleton info/data
     app.sections = None
     app.neuron_ready = None
@@ -159,13 +303,22 @@ def initialize_global_variables(app):
 
     app.df_metadata = pd.DataFrame(columns=app.columns).astype(dtypes)
 
+    # finds and updates single instances of df_metadata without scanning it
+    app.metadata_store = MetadataStore()
+
     app.synapse_data = {}
 
     # holds a dict of tuples with the page number and the section index
     app.page_section_mapping = {}
 
-    app.source_image_data = defaultdict(dict)
-    app.target_image_data = defaultdict(dict)
+    # evicts the instances furthest from the current page once over budget
+    app.tile_store = TileStore(
+        app.config["TILE_MEMORY_BUDGET_MB"] * 1024**2,
+        loader=reload_instance,
+        page_of=instance_pages,
+    )
+    app.source_image_data = app.tile_store.source
+    app.target_image_data = app.tile_store.target
 
     app.snapped_point_cloud = None
 
@@ -176,6 +329,27 @@ def initialize_global_variables(app):
 
     app.retrieve_instance_metadata_lock = threading.Lock()
 
+    # identifies the session in the tiles' URLs and ETags, see file_access.send_tile
+    app.tile_session = uuid.uuid4().hex
+    app.tile_versions = defaultdict(int)
+    app.tile_manifest_version = 0
+
+    # publishes the loading progress of the pages, see annotation.page_events
+    app.page_events = PageEvents()
+
+    # logs the annotation edits to disk, a reset discards the previous session's
+    # edits, the edits logged before a crash or restart are kept until a dataset
+    # is opened, see opendata.upload_file and edit_log.start_session
+    if hasattr(app, "edit_log"):
+        if app.edit_log is not None:
+            app.edit_log.clear()
+    else:
+        app.edit_log = open_edit_log(
+            app.config["EDIT_LOG_DIR"],
+            app.workspaces.current_id(),
+            app.config["EDIT_LOG_FLUSH_MS"] / 1000,
+        )
+
 
 def register_routes(app):
     """Register routes to avoid circular imports."""
@@ -208,4 +382,7 @@ def setup_context_processors(app):
 
     @app.context_processor
     def handle_context():
-        return dict(os=os)  # noqa: C408
+        # versions the EM tile URLs, see processing.source_tile_token
+        return dict(  # noqa: C408
+            os=os, tile_token=source_tile_token, grid_mip=grid_mip
+        )
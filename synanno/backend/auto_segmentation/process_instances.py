@@ -2,9 +2,9 @@ from typing import Any
 
 import numpy as np
 from cloudvolume import Bbox
-from skimage.transform import resize
 
 from synanno.backend.processing import process_syn
+from synanno.backend.utils import resize_mask
 
 
 def retrieve_instance_from_cv(
@@ -63,24 +63,7 @@ def retrieve_instance_from_cv(
     cropped_img = cropped_img.squeeze(axis=3)
     cropped_gt = cropped_gt.squeeze(axis=3)
 
-    if sum(cropped_img.shape) > sum(cropped_gt.shape):  # Up-sampling
-        cropped_gt = resize(
-            cropped_gt,
-            cropped_img.shape,
-            mode="constant",
-            preserve_range=True,
-            anti_aliasing=False,
-        )
-        cropped_gt = (cropped_gt > 0.5).astype(int)  # Convert to binary mask
-    elif sum(cropped_img.shape) < sum(cropped_gt.shape):  # Down-sampling
-        cropped_gt = resize(
-            cropped_gt,
-            cropped_img.shape,
-            mode="constant",
-            preserve_range=True,
-            anti_aliasing=True,
-        )
-        cropped_gt = (cropped_gt > 0.5).astype(int)  # Convert to binary mask
+    cropped_gt = resize_mask(cropped_gt, cropped_img.shape)
 
     cropped_seg = process_syn(cropped_gt)
 
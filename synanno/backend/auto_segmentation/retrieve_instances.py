@@ -3,9 +3,9 @@ from typing import Any
 import numpy as np
 import pandas as pd
 from cloudvolume import Bbox, CloudVolume
-from skimage.transform import resize
 
 from synanno.backend.processing import calculate_crop_pad, process_syn
+from synanno.backend.utils import resize_mask
 
 
 def setup_cloud_volume(bucket_url: str, cv_secret: str) -> CloudVolume:
@@ -225,22 +225,5 @@ def _resize_volumes(
     cropped_img: np.ndarray, cropped_gt: np.ndarray
 ) -> tuple[np.ndarray, np.ndarray]:
     """Resize the volumes to match their shapes."""
-    if sum(cropped_img.shape) > sum(cropped_gt.shape):  # Up-sampling
-        cropped_gt = resize(
-            cropped_gt,
-            cropped_img.shape,
-            mode="constant",
-            preserve_range=True,
-            anti_aliasing=False,
-        )
-        cropped_gt = (cropped_gt > 0.5).astype(int)  # Convert to binary mask
-    elif sum(cropped_img.shape) < sum(cropped_gt.shape):  # Down-sampling
-        cropped_gt = resize(
-            cropped_gt,
-            cropped_img.shape,
-            mode="constant",
-            preserve_range=True,
-            anti_aliasing=True,
-        )
-        cropped_gt = (cropped_gt > 0.5).astype(int)  # Convert to binary mask
+    cropped_gt = resize_mask(cropped_gt, cropped_img.shape)
     return cropped_img, cropped_gt
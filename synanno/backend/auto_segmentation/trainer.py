@@ -191,17 +191,20 @@ class Trainer:
         self,
         model_path: str,
         dataset: Union[SynapseDataset, list[torch.Tensor]],
+        model: Optional[UNet3D] = None,
     ) -> tuple[list[torch.Tensor], list[torch.Tensor]]:
         """Run inference using the UNet3D model.
 
         Args:
             model_path: Path to the model file.
             dataset: The dataset to run inference on.
+            model: An already loaded model, loaded from model_path if None.
 
         Returns:
             Lists of target and prediction tensors.
         """
-        model = self.load_model(model_path)
+        if model is None:
+            model = self.load_model(model_path)
 
         if isinstance(dataset, SynapseDataset):
             test_loader = self._create_dataloader(dataset, shuffle=False)
@@ -0,0 +1,163 @@
+import logging
+import threading
+from typing import Hashable, Optional
+
+import numpy as np
+from cloudvolume import Bbox, CloudVolume
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def to_voxel_bbox(
+    bbox: Bbox, cv: CloudVolume, coord_resolution: np.ndarray, mip: int = 0
+) -> Bbox:
+    """Convert a bounding box given in coord_resolution units to voxels of a mip.
+
+    Mirrors the conversion CloudVolume applies to a download with coord_resolution,
+    so that crops cut from a region match a direct download voxel for voxel.
+
+    Args:
+        bbox: Bounding box in coord_resolution units.
+        cv: The cloud volume the bounding box refers to.
+        coord_resolution: The resolution of the bounding box coordinates.
+        mip: The mip level to convert to.
+
+    Returns:
+        The bounding box in voxels of the given mip level.
+    """
+    factor = cv.mip_resolution(mip) / np.asarray(coord_resolution)
+    return (bbox / factor).astype(np.int64)
+
+
+def snap_to_chunks(bbox: Bbox, cv: CloudVolume, mip: int = 0) -> Bbox:
+    """Grow a voxel bounding box to the chunk grid of the cloud volume.
+
+    Args:
+        bbox: Bounding box in voxels.
+        cv: The cloud volume that defines the chunk grid.
+        mip: The mip level of the bounding box.
+
+    Returns:
+        The chunk aligned bounding box, clamped to the volume bounds.
+    """
+    snapped = bbox.expand_to_chunk_size(
+        cv.mip_chunk_size(mip), offset=cv.mip_voxel_offset(mip)
+    )
+    return Bbox.clamp(snapped, cv.mip_bounds(mip))
+
+
+def merge_regions(bboxes: list[Bbox]) -> tuple[list[Bbox], list[int]]:
+    """Merge chunk aligned bounding boxes into a small set of download regions.
+
+    Two regions are merged if they share at least one chunk and their union is not
+    larger than the two regions downloaded separately. A merged region therefore
+    never fetches more voxels than the individual downloads it replaces.
+
+    Args:
+        bboxes: Chunk aligned bounding boxes.
+
+    Returns:
+        The merged regions and, for every input box, the index of its region.
+    """
+    regions = [bbox.clone() for bbox in bboxes]
+    members = [[i] for i in range(len(bboxes))]
+
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                if not Bbox.intersects(regions[i], regions[j]):
+                    continue
+                union = Bbox.expand(regions[i], regions[j])
+                if union.volume() <= regions[i].volume() + regions[j].volume():
+                    regions[i] = union
+                    members[i] += members[j]
+                    del regions[j]
+                    del members[j]
+                    merged = True
+                    break
+            if merged:
+                break
+
+    assignment = [0] * len(bboxes)
+    for region_index, region_members in enumerate(members):
+        for member in region_members:
+            assignment[member] = region_index
+
+    return regions, assignment
+
+
+class PageCutouts:
+    """Chunk aligned download regions shared by all instances of a page.
+
+    Each region is downloaded once, by the first instance that needs it, and the
+    per-instance crops are cut out of the region array in memory.
+
+    Args:
+        cv: The cloud volume to download from.
+        bboxes: Bounding boxes in coord_resolution units, keyed by instance.
+        coord_resolution: The resolution of the bounding box coordinates.
+        mip: The mip level to download.
+    """
+
+    def __init__(
+        self,
+        cv: CloudVolume,
+        bboxes: dict[Hashable, Bbox],
+        coord_resolution: np.ndarray,
+        mip: int = 0,
+    ):
+        self.cv = cv
+        self.mip = mip
+
+        bounds = cv.mip_bounds(mip)
+        self._voxel_bboxes = {}
+        for key, bbox in bboxes.items():
+            voxel_bbox = to_voxel_bbox(bbox, cv, coord_resolution, mip)
+            # instances reaching beyond the volume keep their own download
+            if bounds.contains_bbox(voxel_bbox) and not voxel_bbox.subvoxel():
+                self._voxel_bboxes[key] = voxel_bbox
+
+        keys = list(self._voxel_bboxes.keys())
+        self.regions, assignment = merge_regions(
+            [snap_to_chunks(self._voxel_bboxes[key], cv, mip) for key in keys]
+        )
+        self._region_of = dict(zip(keys, assignment))
+
+        self._region_data = {}
+        self._region_locks = [threading.Lock() for _ in self.regions]
+
+        logger.info(
+            "Planned %d download region(s) for %d instance(s).",
+            len(self.regions),
+            len(bboxes),
+        )
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        """Return the crop of an instance, downloading its region if needed.
+
+        Args:
+            key: The instance key used when planning the page.
+
+        Returns:
+            The crop as a view into the region array, or None if the instance is
+            not covered by the plan.
+        """
+        if key not in self._region_of:
+            return None
+
+        region_index = self._region_of[key]
+        with self._region_locks[region_index]:
+            if region_index not in self._region_data:
+                self._region_data[region_index] = self.cv.download(
+                    self.regions[region_index], mip=self.mip, parallel=True
+                )
+        region_data = self._region_data[region_index]
+
+        start = self._voxel_bboxes[key].minpt - self.regions[region_index].minpt
+        stop = self._voxel_bboxes[key].maxpt - self.regions[region_index].minpt
+        return region_data[
+            start[0] : stop[0], start[1] : stop[1], start[2] : stop[2]  # noqa: E203
+        ]
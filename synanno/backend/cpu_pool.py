@@ -0,0 +1,163 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Callable, Optional
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# describes an array held in shared memory: block name, shape and dtype
+ArrayDescriptor = tuple[str, tuple, str]
+
+
+def share_array(
+    array: np.ndarray,
+) -> tuple[shared_memory.SharedMemory, ArrayDescriptor]:
+    """Copy an array into a new shared memory block.
+
+    Args:
+        array: The array to share.
+
+    Returns:
+        The shared memory block and the descriptor to attach to it.
+    """
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def attach_array(
+    descriptor: ArrayDescriptor,
+) -> tuple[shared_memory.SharedMemory, np.ndarray]:
+    """Attach to an array shared with share_array.
+
+    Args:
+        descriptor: The descriptor returned by share_array.
+
+    Returns:
+        The shared memory block and the array backed by it.
+    """
+    name, shape, dtype = descriptor
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def run_shared(
+    func: Callable[..., dict[str, np.ndarray]],
+    descriptors: dict[str, ArrayDescriptor],
+    kwargs: dict,
+) -> dict[str, ArrayDescriptor]:
+    """Run a function in a worker process on arrays passed through shared memory.
+
+    Args:
+        func: Takes the arrays and kwargs as keyword arguments, returns named arrays.
+        descriptors: The shared input arrays by argument name.
+        kwargs: Further keyword arguments of the function.
+
+    Returns:
+        The descriptors of the returned arrays, the caller unlinks their blocks.
+    """
+    blocks, arrays, outputs = [], {}, {}
+    try:
+        for key, descriptor in descriptors.items():
+            shm, arrays[key] = attach_array(descriptor)
+            blocks.append(shm)
+        # the results may be views of the inputs, share them before detaching
+        results = func(**arrays, **kwargs)
+        for key in list(results):
+            shm, outputs[key] = share_array(results.pop(key))
+            shm.close()
+    finally:
+        arrays.clear()
+        for shm in blocks:
+            shm.close()
+    return outputs
+
+
+class CpuPool:
+    """Runs CPU-bound array processing in a pool of worker processes.
+
+    Arrays are passed to and from the workers through shared memory instead of
+    being pickled. The workers are started on first use. With zero workers the
+    functions run in the calling thread.
+
+    Args:
+        max_workers: The number of worker processes.
+    """
+
+    def __init__(self, max_workers: int = 0):
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def run(
+        self, func: Callable[..., dict[str, np.ndarray]], arrays: dict, **kwargs
+    ) -> dict[str, np.ndarray]:
+        """Run a function on the given arrays, in a worker process if configured.
+
+        Args:
+            func: A module level function that takes the arrays and kwargs as
+                keyword arguments and returns named arrays.
+            arrays: The input arrays by argument name.
+            **kwargs: Further picklable keyword arguments of the function.
+
+        Returns:
+            The arrays returned by the function.
+        """
+        if self.max_workers <= 0:
+            return func(**arrays, **kwargs)
+
+        inputs, descriptors = [], {}
+        try:
+            for key, array in arrays.items():
+                shm, descriptors[key] = share_array(array)
+                inputs.append(shm)
+            try:
+                future = self._get_executor().submit(
+                    run_shared, func, descriptors, kwargs
+                )
+                outputs = future.result()
+            except BrokenProcessPool:
+                logger.error("The CPU worker pool broke, running in-process.")
+                self.shutdown()
+                return func(**arrays, **kwargs)
+        finally:
+            for shm in inputs:
+                shm.close()
+                shm.unlink()
+
+        results = {}
+        for key, descriptor in outputs.items():
+            shm, array = attach_array(descriptor)
+            results[key] = array.copy()
+            del array
+            shm.close()
+            shm.unlink()
+        return results
+
+    def shutdown(self) -> None:
+        """Stop the worker processes, they are started again on the next run."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Start the worker processes, unless they are already running."""
+        with self._lock:
+            if self._executor is None:
+                # forking a multi-threaded server is unsafe
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context(
+                    "forkserver" if "forkserver" in methods else "spawn"
+                )
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=context
+                )
+                logger.info("Started %d CPU worker processes.", self.max_workers)
+            return self._executor
@@ -0,0 +1,339 @@
+import base64
+import json
+import logging
+import os
+import re
+import threading
+from typing import Optional
+
+import pandas as pd
+from flask import current_app
+
+from synanno.backend.utils import NpEncoder
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# canvas types that hold a single drawn slice, saving one replaces the previous
+SINGLE_SLICE_CANVASES = ("circlePre", "circlePost")
+
+
+class EditLog:
+    """Appends the annotation edits of a workspace to a JSON lines file.
+
+    The edits are written by a background thread. It collects the edits appended
+    within flush_interval seconds and writes and fsyncs them at once, so a route
+    returns without waiting for the disk and a crash loses at most the last
+    interval. The log starts with the configuration of the session it belongs to,
+    its edits are replayed when the same dataset is opened again, e.g. after a
+    restart, see start_session and replay_edits.
+
+    Args:
+        path: The path of the log file.
+        flush_interval: Seconds the writer waits to batch edits before the fsync.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.2):
+        self.path = path
+        self.flush_interval = flush_interval
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._pending: list[str] = []
+        self._appended = 0
+        self._written = 0
+        self._flushing = False
+        self._closed = False
+        self._file = open(path, "a", encoding="utf-8")
+        self._condition = threading.Condition()
+        self._writer = threading.Thread(
+            target=self._write_batches, name="edit-log", daemon=True
+        )
+        self._writer.start()
+
+    def append(self, op: str, **fields) -> None:
+        """Queue an edit for the next batch.
+
+        The fields are serialized right away, later changes to them are not logged.
+
+        Args:
+            op: The kind of the edit, see replay_edits.
+            **fields: The data of the edit.
+        """
+        line = json.dumps({"op": op, **fields}, cls=NpEncoder)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError(f"The edit log {self.path} is closed.")
+            self._pending.append(line)
+            self._appended += 1
+            if len(self._pending) == 1:
+                self._condition.notify_all()
+
+    def flush(self) -> None:
+        """Block until all appended edits are written and synced to disk."""
+        with self._condition:
+            target = self._appended
+            self._flushing = bool(self._pending)
+            self._condition.notify_all()
+            self._condition.wait_for(lambda: self._written >= target or self._closed)
+
+    def records(self) -> list[dict]:
+        """Read the logged edits in the order they were appended.
+
+        Returns:
+            The edits, a line torn by a crash during the write is skipped.
+        """
+        self.flush()
+        records = []
+        with open(self.path, encoding="utf-8") as file:
+            for number, line in enumerate(file, start=1):
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.warning(
+                        "Skipping the unreadable line %d of %s.", number, self.path
+                    )
+        return records
+
+    def rewrite(self, records: list[dict]) -> None:
+        """Atomically replace the log, e.g. with a snapshot of the replayed edits.
+
+        Args:
+            records: The edits the log consists of afterwards.
+        """
+        with self._condition:
+            self._flushing = bool(self._pending)
+            self._condition.notify_all()
+            self._condition.wait_for(lambda: self._written == self._appended)
+            temporary = f"{self.path}.tmp"
+            with open(temporary, "w", encoding="utf-8") as file:
+                for record in records:
+                    file.write(json.dumps(record, cls=NpEncoder) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+            self._file.close()
+            os.replace(temporary, self.path)
+            self._file = open(self.path, "a", encoding="utf-8")
+
+    def clear(self) -> None:
+        """Discard all edits, e.g. when the session is reset."""
+        self.rewrite([])
+
+    def close(self) -> None:
+        """Write the pending edits and stop the writer, the file is kept."""
+        self.flush()
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._writer.join()
+        self._file.close()
+
+    def _write_batches(self) -> None:
+        """Write and fsync the pending edits once per batch."""
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                # let the edits of concurrent requests join the batch
+                self._condition.wait_for(
+                    lambda: self._flushing or self._closed, self.flush_interval
+                )
+                batch, self._pending = self._pending, []
+                self._flushing = False
+            try:
+                self._file.write("".join(line + "\n" for line in batch))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            except OSError as exc:
+                logger.error("Failed to write the edit log %s: %s", self.path, exc)
+            with self._condition:
+                self._written += len(batch)
+                self._condition.notify_all()
+
+
+def open_edit_log(
+    directory: str, workspace_id: str, flush_interval: float
+) -> Optional[EditLog]:
+    """Open the edit log of a workspace.
+
+    Args:
+        directory: The directory of the logs, an empty string disables the log.
+        workspace_id: The ID of the workspace, it names the file.
+        flush_interval: Seconds the writer waits to batch edits, see EditLog.
+
+    Returns:
+        The edit log, None if disabled.
+    """
+    if not directory:
+        return None
+    name = re.sub(r"[^\w-]", "_", workspace_id)
+    return EditLog(os.path.join(directory, f"{name}.jsonl"), flush_interval)
+
+
+def log_edit(op: str, **fields) -> None:
+    """Append an edit to the current workspace's log, if the log is enabled.
+
+    Args:
+        op: The kind of the edit, see replay_edits.
+        **fields: The data of the edit.
+    """
+    if current_app.edit_log is not None:
+        current_app.edit_log.append(op, **fields)
+
+
+def log_masks(image_index: str, canvas_type: str, masks: dict[str, bytes]) -> None:
+    """Append drawn or predicted masks of an instance to the current log.
+
+    Args:
+        image_index: The image index of the instance.
+        canvas_type: The kind of the masks, e.g. curve or auto_curve.
+        masks: The PNG encoded masks by slice.
+    """
+    log_edit(
+        "masks",
+        image_index=str(image_index),
+        canvas_type=canvas_type,
+        masks=encode_masks(masks),
+    )
+
+
+def encode_masks(masks: dict[str, bytes]) -> dict[str, str]:
+    """Encode PNG masks by slice as base64 text for the log."""
+    return {
+        slice_id: base64.b64encode(data).decode("ascii")
+        for slice_id, data in masks.items()
+    }
+
+
+def apply_masks(image_index: str, canvas_type: str, masks: dict[str, bytes]) -> None:
+    """Store masks in the target layer like the draw view does.
+
+    Args:
+        image_index: The image index of the instance.
+        canvas_type: The kind of the masks, e.g. curve or auto_curve.
+        masks: The PNG encoded masks by slice.
+    """
+    target = current_app.target_image_data[image_index]
+    if canvas_type in SINGLE_SLICE_CANVASES or canvas_type not in target:
+        target[canvas_type] = {}
+    target[canvas_type].update(masks)
+
+
+def start_session(config: dict, resume: bool = True) -> list[dict]:
+    """Begin logging the edits of a session opened with the given configuration.
+
+    The edits logged before belong to the same session if the log starts with the
+    same configuration. They are kept, to be restored by replay_edits once the
+    session is set up. The edits of any other session are discarded, so a new
+    dataset never inherits the instances of a previous one.
+
+    Args:
+        config: Identifies the session, e.g. the volume URLs and the crop sizes.
+        resume: Keep the edits of the same session, e.g. unless a session export
+            replaces them.
+
+    Returns:
+        The logged edits of the same session, empty if there are none to restore.
+    """
+    edit_log = current_app.edit_log
+    if edit_log is None:
+        return []
+
+    # compare the configuration the way it is read back from the log
+    header = json.loads(json.dumps({"op": "session", "config": config}, cls=NpEncoder))
+    records = edit_log.records()
+    if (
+        resume
+        and current_app.df_metadata.empty
+        and records
+        and records[0] == header
+        and len(records) > 1
+    ):
+        return records
+    if records:
+        logger.info("Discarding the edits of another session in %s.", edit_log.path)
+    edit_log.rewrite([header])
+    return []
+
+
+def replay_edits(edit_log: EditLog, records: list[dict]) -> int:
+    """Restore the metadata and masks of the current workspace from its log.
+
+    The log holds the following edits:
+        session: The configuration of the session, the first record.
+        append: New metadata records, e.g. of a page or a false negative.
+        replace: Metadata records that replace all others, e.g. of a loaded JSON.
+        update: New column values of an instance.
+        drop: The removal of an instance.
+        masks: Drawn or predicted masks of an instance.
+
+    The log is compacted to a snapshot of the restored state afterwards, so it
+    does not grow over restarts.
+
+    Args:
+        edit_log: The log of the current workspace.
+        records: The logged edits, see start_session.
+
+    Returns:
+        The number of replayed edits.
+    """
+    if not records:
+        return 0
+
+    store = current_app.metadata_store
+    snapshot = []
+    with current_app.df_metadata_lock:
+        for record in records:
+            op = record["op"]
+            if op == "session":
+                snapshot = [record]
+            elif op == "append":
+                store.append(record["records"])
+            elif op == "replace":
+                frame = pd.DataFrame(record["records"], columns=current_app.columns)
+                current_app.df_metadata = frame
+            elif op == "update":
+                store.update(record["page"], record["image_index"], **record["values"])
+            elif op == "drop":
+                store.drop(record["page"], record["image_index"])
+            elif op != "masks":
+                logger.warning("Skipping the unknown edit %s of %s.", op, edit_log.path)
+
+    # outside the lock, restoring the masks may reload an evicted instance
+    for record in records:
+        if record["op"] == "masks":
+            apply_masks(
+                record["image_index"],
+                record["canvas_type"],
+                {
+                    slice_id: base64.b64decode(data)
+                    for slice_id, data in record["masks"].items()
+                },
+            )
+
+    frame = current_app.df_metadata
+    if not frame.empty:
+        current_app.n_pages = max(current_app.n_pages, int(frame["Page"].max()))
+
+    snapshot.append({"op": "replace", "records": frame.to_dict("records")})
+    for image_index in list(current_app.target_image_data):
+        for canvas_type, masks in current_app.target_image_data[image_index].items():
+            if not canvas_type.isdigit():
+                snapshot.append(
+                    {
+                        "op": "masks",
+                        "image_index": image_index,
+                        "canvas_type": canvas_type,
+                        "masks": encode_masks(masks),
+                    }
+                )
+    edit_log.rewrite(snapshot)
+
+    logger.info(
+        "Replayed %d edits of %s, restored %d instances.",
+        len(records),
+        edit_log.path,
+        len(frame),
+    )
+    return len(records)
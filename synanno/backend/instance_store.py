@@ -0,0 +1,231 @@
+import json
+import logging
+import threading
+from collections.abc import MutableMapping
+from typing import Callable, Iterator, Optional, Union
+
+import numpy as np
+import zstandard
+from PIL import Image
+
+from .tile_store import entry_nbytes
+from .utils import img_to_png_bytes
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# compression level of the in-memory volumes, favours speed over ratio
+ZSTD_LEVEL = 3
+
+
+class InstanceSlices(MutableMapping):
+    """The slices of one instance, encoded the first time they are requested.
+
+    Holds the instance's padded volume zstd compressed in memory and behaves like
+    the dict of encoded slices keyed by z index it replaces. Encoded slices are
+    memoized. Additional entries, such as the drawn masks of the draw view, are
+    stored under their own keys like in a plain dict.
+
+    Args:
+        volume: The padded volume of the instance.
+        first_slice: The z index of the volume's first slice.
+        slice_axis: The axis of the volume that holds the z slices.
+        render: Turns the volume and a slice position into the slice's image.
+        encode: Turns a slice's image into the bytes served to the client.
+        mimetype: The mimetype of the encoded slices.
+        content_key: Identifies the encoded slices' content, used as HTTP ETag.
+        mip: The mip level the volume was downloaded at, coarser mips serve the
+            grid view.
+
+    Attributes:
+        on_grow: Called after slices were encoded and memoized, e.g. by the
+            TileStore holding the slices to enforce its memory budget.
+    """
+
+    def __init__(
+        self,
+        volume: np.ndarray,
+        first_slice: int,
+        slice_axis: int,
+        render: Callable[[np.ndarray, int], Union[np.ndarray, Image.Image]],
+        encode: Callable[[Union[np.ndarray, Image.Image]], bytes] = img_to_png_bytes,
+        mimetype: str = "image/png",
+        content_key: Optional[str] = None,
+        mip: int = 0,
+    ):
+        self.shape = volume.shape
+        self.dtype = volume.dtype
+        self.first_slice = int(first_slice)
+        self.slice_axis = slice_axis
+        self.render = render
+        self.encode = encode
+        self.mimetype = mimetype
+        self.content_key = content_key
+        self.mip = mip
+        self._compressed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(
+            np.ascontiguousarray(volume).tobytes()
+        )
+        self._encoded: dict[str, bytes] = {}
+        self._entries: dict[str, object] = {}
+        self._lock = threading.Lock()
+        self.on_grow: Optional[Callable[[], None]] = None
+
+    @property
+    def volume(self) -> np.ndarray:
+        """The decompressed volume of the instance."""
+        data = zstandard.ZstdDecompressor().decompress(self._compressed)
+        return np.frombuffer(data, dtype=self.dtype).reshape(self.shape)
+
+    @property
+    def nbytes(self) -> int:
+        """The approximate memory held by the compressed volume, the slices and the
+        additional entries."""
+        return (
+            len(self._compressed)
+            + sum(len(v) for v in self._encoded.values())
+            + sum(entry_nbytes(v) for v in self._entries.values())
+        )
+
+    def slice_keys(self) -> list[str]:
+        """The z indices of the volume's slices."""
+        return [str(self.first_slice + s) for s in range(self.shape[self.slice_axis])]
+
+    def encoded_keys(self) -> list[str]:
+        """The z indices of the slices that were encoded so far."""
+        with self._lock:
+            return [key for key in self.slice_keys() if key in self._encoded]
+
+    def array(self, key: str) -> Union[np.ndarray, Image.Image]:
+        """Render a slice of the volume without encoding it.
+
+        Args:
+            key: The z index of the slice.
+
+        Returns:
+            The rendered slice.
+        """
+        position = int(key) - self.first_slice
+        if not 0 <= position < self.shape[self.slice_axis]:
+            raise KeyError(key)
+        return self.render(self.volume, position)
+
+    def encode_slices(self, keys: Optional[list[str]] = None) -> None:
+        """Encode several slices from a single decompression of the volume.
+
+        Args:
+            keys: The z indices to encode, all slices if None.
+        """
+        slice_keys = self.slice_keys()
+        keys = slice_keys if keys is None else keys
+        missing = [
+            key
+            for key in keys
+            if key in slice_keys
+            and key not in self._encoded
+            and key not in self._entries
+        ]
+        if not missing:
+            return
+
+        volume = self.volume
+        for key in missing:
+            image = self.render(volume, int(key) - self.first_slice)
+            with self._lock:
+                self._encoded[key] = self.encode(image)
+        self._grown()
+
+    def to_cache_entry(self, name: str) -> dict[str, bytes]:
+        """Serialize the volume for the tile cache.
+
+        Args:
+            name: The prefix of the blob names.
+
+        Returns:
+            The compressed volume and its layout as named blobs.
+        """
+        layout = {
+            "shape": list(self.shape),
+            "dtype": self.dtype.str,
+            "first_slice": self.first_slice,
+            "slice_axis": self.slice_axis,
+            "mip": self.mip,
+        }
+        return {
+            name + ".zst": self._compressed,
+            name + ".json": json.dumps(layout).encode("utf-8"),
+        }
+
+    @classmethod
+    def from_cache_entry(
+        cls,
+        entry: dict[str, bytes],
+        name: str,
+        render: Callable[[np.ndarray, int], Union[np.ndarray, Image.Image]],
+        encode: Callable[[Union[np.ndarray, Image.Image]], bytes] = img_to_png_bytes,
+        mimetype: str = "image/png",
+        content_key: Optional[str] = None,
+    ) -> "InstanceSlices":
+        """Restore a volume serialized with to_cache_entry.
+
+        Args:
+            entry: The tile cache entry.
+            name: The prefix of the blob names.
+            render: Turns the volume and a slice position into the slice's image.
+            encode: Turns a slice's image into the bytes served to the client.
+            mimetype: The mimetype of the encoded slices.
+            content_key: Identifies the encoded slices' content.
+
+        Returns:
+            The restored instance slices.
+        """
+        layout = json.loads(entry[name + ".json"])
+        instance = cls.__new__(cls)
+        instance.shape = tuple(layout["shape"])
+        instance.dtype = np.dtype(layout["dtype"])
+        instance.first_slice = layout["first_slice"]
+        instance.slice_axis = layout["slice_axis"]
+        instance.mip = layout.get("mip", 0)
+        instance.render = render
+        instance.encode = encode
+        instance.mimetype = mimetype
+        instance.content_key = content_key
+        instance._compressed = entry[name + ".zst"]
+        instance._encoded = {}
+        instance._entries = {}
+        instance._lock = threading.Lock()
+        instance.on_grow = None
+        return instance
+
+    def __getitem__(self, key: str):
+        if key in self._entries:
+            return self._entries[key]
+        if key not in self._encoded:
+            image = self.array(key)
+            with self._lock:
+                self._encoded[key] = self.encode(image)
+            self._grown()
+        return self._encoded[key]
+
+    def _grown(self) -> None:
+        """Report newly encoded slices, see on_grow."""
+        if self.on_grow is not None:
+            self.on_grow()
+
+    def __setitem__(self, key: str, value) -> None:
+        self._entries[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self._entries:
+            raise KeyError(key)
+        del self._entries[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._entries or key in self.slice_keys()
+
+    def __iter__(self) -> Iterator[str]:
+        slice_keys = self.slice_keys()
+        yield from slice_keys
+        yield from (key for key in self._entries if key not in slice_keys)
+
+    def __len__(self) -> int:
+        return len(set(self.slice_keys()) | set(self._entries))
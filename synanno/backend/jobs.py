@@ -0,0 +1,203 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterator, Optional
+
+from flask import Flask
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# states after which a job does not change anymore
+FINAL_STATES = ("done", "failed", "cancelled")
+
+
+class JobExecutor:
+    """Runs long tasks, such as page builds, in the background under a job ID.
+
+    Requests submit a job and return its ID right away. Clients then poll the
+    job's status or subscribe to its state changes. Jobs that accept a
+    cancel_event argument can be cancelled while they run.
+
+    Args:
+        max_workers: The number of jobs that run at the same time.
+        history: The number of finished jobs whose status is kept.
+        keep_alive: Seconds after which an idle subscription sends a comment to keep
+            the connection open.
+    """
+
+    def __init__(
+        self, max_workers: int = 2, history: int = 100, keep_alive: float = 15.0
+    ):
+        self.history = history
+        self.keep_alive = keep_alive
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="job"
+        )
+        self._condition = threading.Condition()
+        self._jobs: OrderedDict[str, dict] = OrderedDict()
+        self._futures: dict[str, Future] = {}
+        self._cancel_events: dict[str, threading.Event] = {}
+
+    def submit(
+        self,
+        app: Flask,
+        kind: str,
+        func: Callable,
+        *args,
+        cancellable: bool = False,
+        **kwargs,
+    ) -> str:
+        """Queue a function to run within the app context.
+
+        The job sees the caller's context variables, e.g. its workspace.
+
+        Args:
+            app: The Flask app the job runs for.
+            kind: Describes the job, e.g. page_build.
+            func: The function to run.
+            *args: Positional arguments of the function.
+            cancellable: Pass a cancel_event keyword argument to the function.
+            **kwargs: Keyword arguments of the function.
+
+        Returns:
+            The ID of the job.
+        """
+        job_id = uuid.uuid4().hex
+        if cancellable:
+            kwargs["cancel_event"] = self._cancel_events[job_id] = threading.Event()
+
+        with self._condition:
+            self._jobs[job_id] = {
+                "id": job_id,
+                "kind": kind,
+                "state": "queued",
+                "error": None,
+                "submitted": time.time(),
+                "started": None,
+                "finished": None,
+            }
+            self._prune()
+        # the job runs in the workspace of the request that submitted it
+        context = contextvars.copy_context()
+        self._futures[job_id] = self._executor.submit(
+            context.run, self._run, app, job_id, func, *args, **kwargs
+        )
+        return job_id
+
+    def status(self, job_id: str) -> Optional[dict]:
+        """Return a copy of a job's status, None if the job is unknown."""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[dict]:
+        """Block until a job finished or the timeout passed.
+
+        Args:
+            job_id: The ID of the job.
+            timeout: Seconds to wait at most, None waits until the job finished.
+
+        Returns:
+            The job's status, None if the job is unknown.
+        """
+        future = self._futures.get(job_id)
+        if future is not None:
+            try:
+                future.result(timeout)
+            except Exception as exc:
+                logger.debug("Job %s did not finish: %s", job_id, exc)
+        return self.status(job_id)
+
+    def cancel(self, job_id: str, wait: bool = False) -> None:
+        """Cancel a job, a running job stops if it accepts a cancel_event.
+
+        Args:
+            job_id: The ID of the job.
+            wait: Block until the job stopped.
+        """
+        if job_id in self._cancel_events:
+            self._cancel_events[job_id].set()
+        future = self._futures.get(job_id)
+        if future is not None and future.cancel():
+            # the job never started, so _run does not clean up after it
+            self._cancel_events.pop(job_id, None)
+            self._update(job_id, state="cancelled", finished=time.time())
+        if wait:
+            self.wait(job_id)
+
+    def subscribe(self, job_id: str) -> Iterator[str]:
+        """Yield the state changes of a job in the text/event-stream format.
+
+        Args:
+            job_id: The job to follow.
+
+        Yields:
+            The formatted events, the last one carries the job's final state.
+        """
+        last = None
+        while True:
+            with self._condition:
+                job = self._jobs.get(job_id)
+                if job == last:
+                    notified = self._condition.wait(self.keep_alive)
+                    job = self._jobs.get(job_id)
+                else:
+                    notified = True
+                job = dict(job) if job is not None else None
+
+            if job is None:
+                yield f"event: error\ndata: {json.dumps({'id': job_id})}\n\n"
+                return
+            if job == last:
+                if not notified:
+                    yield ": keep-alive\n\n"
+                continue
+
+            last = job
+            yield f"event: {job['state']}\ndata: {json.dumps(job)}\n\n"
+            if job["state"] in FINAL_STATES:
+                return
+
+    def _run(self, app: Flask, job_id: str, func: Callable, *args, **kwargs) -> None:
+        """Run a job within the app context and record its state."""
+        self._update(job_id, state="running", started=time.time())
+        cancel_event = self._cancel_events.get(job_id)
+        try:
+            with app.app_context():
+                func(*args, **kwargs)
+        except Exception as exc:
+            logger.error("Job %s failed: %s", job_id, exc)
+            self._update(job_id, state="failed", error=str(exc), finished=time.time())
+            raise
+        finally:
+            self._cancel_events.pop(job_id, None)
+
+        state = (
+            "cancelled"
+            if cancel_event is not None and cancel_event.is_set()
+            else "done"
+        )
+        self._update(job_id, state=state, finished=time.time())
+
+    def _update(self, job_id: str, **changes) -> None:
+        """Change a job's status and wake up the subscribers."""
+        with self._condition:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(changes)
+            self._condition.notify_all()
+
+    def _prune(self) -> None:
+        """Forget the oldest finished jobs beyond the history size."""
+        finished = [
+            job_id for job_id, job in self._jobs.items() if job["state"] in FINAL_STATES
+        ]
+        for job_id in finished[: max(len(finished) - self.history, 0)]:
+            del self._jobs[job_id]
+            self._futures.pop(job_id, None)
+            self._cancel_events.pop(job_id, None)
@@ -0,0 +1,139 @@
+import hashlib
+import logging
+import os
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# the columns of a materialization table that the volume and neuron views read
+MATERIALIZATION_COLUMNS = [
+    "pre_pt_x",
+    "pre_pt_y",
+    "pre_pt_z",
+    "post_pt_x",
+    "post_pt_y",
+    "post_pt_z",
+    "x",
+    "y",
+    "z",
+    "pre_neuron_id",
+    "post_neuron_id",
+]
+
+# the smallest integer type used, narrower types overflow when scaling coordinates
+COMPACT_INT = np.int32
+
+
+def compact_dtypes(table: pd.DataFrame) -> pd.DataFrame:
+    """Store the integer columns as int32 where their values fit.
+
+    Args:
+        table: The materialization table, modified in place.
+
+    Returns:
+        The table.
+    """
+    limits = np.iinfo(COMPACT_INT)
+    for column in table.columns:
+        values = table[column]
+        if (
+            pd.api.types.is_integer_dtype(values)
+            and values.dtype.itemsize > limits.bits // 8
+            and (
+                values.empty
+                or (values.min() >= limits.min and values.max() <= limits.max)
+            )
+        ):
+            table[column] = values.astype(COMPACT_INT)
+    return table
+
+
+def read_csv(path: str) -> pd.DataFrame:
+    """Parse the used columns of a materialization table's CSV file.
+
+    Args:
+        path: Path to the CSV file.
+
+    Returns:
+        The table with compact dtypes.
+    """
+    return compact_dtypes(
+        pd.read_csv(path, usecols=lambda column: column in MATERIALIZATION_COLUMNS)
+    )
+
+
+def cache_path(path: str, cache_dir: str) -> str:
+    """Name the cache file of a CSV file, a changed CSV file gets a new name.
+
+    Args:
+        path: Path to the CSV file.
+        cache_dir: The directory of the cache files.
+
+    Returns:
+        The path of the cache file.
+    """
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}"
+    digest = hashlib.sha1(key.encode(), usedforsecurity=False).hexdigest()
+    return os.path.join(cache_dir, f"{digest}.arrow")
+
+
+def write_cache(table: pd.DataFrame, target: str) -> None:
+    """Write a table as uncompressed Arrow IPC file, so it can be memory-mapped."""
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temporary = f"{target}.{os.getpid()}.tmp"
+    # a single chunk per column lets read_cache map the columns without a copy
+    feather.write_feather(
+        pa.Table.from_pandas(table, preserve_index=False),
+        temporary,
+        compression="uncompressed",
+        chunksize=max(len(table), 1),
+    )
+    # concurrent workers may build the same cache, the last one wins
+    os.replace(temporary, target)
+
+
+def read_cache(source: str) -> pd.DataFrame:
+    """Memory-map a cache file, the numeric columns are not copied into memory."""
+    import pyarrow.feather as feather
+
+    table = feather.read_table(source, memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+
+def read_materialization(path: str, cache_dir: Optional[str] = None) -> pd.DataFrame:
+    """Read the used columns of a materialization table with compact dtypes.
+
+    The CSV file is parsed once and cached as Arrow IPC file in cache_dir. Later
+    reads memory-map the cache, so the table is read from disk only as far as it
+    is accessed. Without pyarrow, or without cache_dir, the CSV file is parsed
+    every time.
+
+    Args:
+        path: Path to the CSV file of the materialization table.
+        cache_dir: The directory of the cache files, None disables the cache.
+
+    Returns:
+        The materialization table.
+    """
+    if not cache_dir:
+        return read_csv(path)
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        logger.info("Install pyarrow to cache the materialization table.")
+        return read_csv(path)
+
+    target = cache_path(path, cache_dir)
+    if not os.path.exists(target):
+        logger.info("Caching the materialization table %s as %s.", path, target)
+        write_cache(read_csv(path), target)
+    return read_cache(target)
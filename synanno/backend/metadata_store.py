@@ -0,0 +1,243 @@
+import logging
+from collections import Counter
+from typing import Hashable, Optional
+
+import numpy as np
+import pandas as pd
+from flask import current_app
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# the width of the fixed-width arrays of the bounding box and padding columns
+ARRAY_SHAPES = {
+    "Original_Bbox": (6,),
+    "Adjusted_Bbox": (6,),
+    "Padding": (3, 2),
+}
+
+
+class MetadataStore:
+    """Finds and updates instances in the session's metadata in constant time.
+
+    The metadata stays a DataFrame in current_app.df_metadata. The store keeps a
+    hash index from (Page, Image_Index) to the row label next to it, so that
+    looking up or updating one instance does not scan the frame. Rows added with
+    append extend the index instead of rebuilding it. The index is rebuilt when
+    the frame was replaced or resized by code that does not go through the store.
+
+    Callers hold current_app.df_metadata_lock as they do for the frame itself,
+    e.g. page builds in the background append to the store concurrently with the
+    routes.
+    """
+
+    def __init__(self):
+        self._frame: Optional[pd.DataFrame] = None
+        self._size = 0
+        self._labels: dict[tuple[int, int], Hashable] = {}
+        self._by_image_index: dict[int, Hashable] = {}
+        self._pages: Counter = Counter()
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """The metadata frame of the current workspace."""
+        return current_app.df_metadata
+
+    def label(self, page: int, image_index: int) -> Optional[Hashable]:
+        """Return the row label of an instance, None if it is not in the metadata."""
+        return self._index().get((int(page), int(image_index)))
+
+    def get(self, page: int, image_index: int) -> Optional[dict]:
+        """Return the metadata record of an instance.
+
+        Args:
+            page: The page of the instance.
+            image_index: The image index of the instance.
+
+        Returns:
+            The record like df.to_dict("records") returns it, None if the instance
+            is not in the metadata.
+        """
+        label = self.label(page, image_index)
+        if label is None:
+            return None
+        return self.frame.loc[[label]].to_dict("records")[0]
+
+    def find(self, image_index: int) -> Optional[dict]:
+        """Return the metadata record of an instance by its image index only."""
+        self._index()
+        label = self._by_image_index.get(int(image_index))
+        if label is None:
+            return None
+        return self.frame.loc[[label]].to_dict("records")[0]
+
+    def has_page(self, page: int) -> bool:
+        """Whether the metadata holds instances of a page."""
+        self._index()
+        return self._pages[int(page)] > 0
+
+    def update(self, page: int, image_index: int, **values) -> bool:
+        """Write columns of a single instance.
+
+        Args:
+            page: The page of the instance.
+            image_index: The image index of the instance.
+            **values: The new values by column name.
+
+        Returns:
+            False if the instance is not in the metadata.
+        """
+        label = self.label(page, image_index)
+        if label is None:
+            return False
+        frame = self.frame
+        for column, value in values.items():
+            frame.at[label, column] = value
+        return True
+
+    def update_many(
+        self, changes: list[tuple[int, int, dict]]
+    ) -> list[tuple[int, int, dict]]:
+        """Write columns of many instances with a single assignment per column.
+
+        Args:
+            changes: The page, image index and new values by column name of every
+                instance, later changes of an instance win.
+
+        Returns:
+            The changes of the instances that are in the metadata.
+        """
+        applied, columns = [], {}
+        for page, image_index, values in changes:
+            label = self.label(page, image_index)
+            if label is None:
+                continue
+            applied.append((int(page), int(image_index), values))
+            for column, value in values.items():
+                columns.setdefault(column, {})[label] = value
+
+        frame = self.frame
+        for column, values in columns.items():
+            # object columns hold lists, the values must not be broadcast
+            numeric = column in frame and frame[column].dtype != object
+            dtype = None if numeric else object
+            frame.loc[list(values), column] = pd.Series(
+                list(values.values()), index=list(values), dtype=dtype
+            )
+        return applied
+
+    def drop(self, page: int, image_index: int) -> bool:
+        """Remove an instance from the metadata.
+
+        Returns:
+            False if the instance is not in the metadata.
+        """
+        label = self.label(page, image_index)
+        if label is None:
+            return False
+        self.frame.drop(index=label, inplace=True)
+        del self._labels[(int(page), int(image_index))]
+        if self._by_image_index.get(int(image_index)) == label:
+            del self._by_image_index[int(image_index)]
+        self._pages[int(page)] -= 1
+        self._size = len(self.frame)
+        return True
+
+    def drop_many(self, keys: list[tuple[int, int]]) -> list[tuple[int, int]]:
+        """Remove many instances from the metadata at once.
+
+        Args:
+            keys: The page and image index of every instance.
+
+        Returns:
+            The keys of the instances that were in the metadata.
+        """
+        labels = {}
+        for page, image_index in keys:
+            label = self.label(page, image_index)
+            if label is not None:
+                labels[(int(page), int(image_index))] = label
+        if not labels:
+            return []
+        self.frame.drop(index=list(labels.values()), inplace=True)
+        for key, label in labels.items():
+            del self._labels[key]
+            if self._by_image_index.get(key[1]) == label:
+                del self._by_image_index[key[1]]
+            self._pages[key[0]] -= 1
+        self._size = len(self.frame)
+        return list(labels)
+
+    def append(self, records: list[dict]) -> None:
+        """Add instances to the metadata with a single concatenation.
+
+        The rows already in the frame keep their labels, so the index stays valid
+        after rows were dropped. The concatenation copies the frame, appending a
+        single record, e.g. a false negative, is linear in the frame's length.
+
+        Args:
+            records: The metadata records of the new instances.
+        """
+        if not records:
+            return
+        self._index()
+        frame = self.frame
+        start = len(frame)
+        first_label = int(frame.index.max()) + 1 if start else 0
+        new_rows = pd.DataFrame(
+            records, index=pd.RangeIndex(first_label, first_label + len(records))
+        )
+        current_app.df_metadata = pd.concat([frame, new_rows])
+        self._add_rows(current_app.df_metadata.iloc[start:])
+        self._frame = current_app.df_metadata
+        self._size = len(self._frame)
+
+    def array(self, column: str, labels: Optional[pd.Index] = None) -> np.ndarray:
+        """Return a bounding box or padding column as a fixed-width integer array.
+
+        Args:
+            column: One of Original_Bbox, Adjusted_Bbox or Padding.
+            labels: The rows to return, all rows if None.
+
+        Returns:
+            The values with one row per instance, e.g. of shape (n, 6) for the
+            bounding boxes.
+        """
+        values = self.frame[column]
+        if labels is not None:
+            values = values.loc[labels]
+        shape = (len(values),) + ARRAY_SHAPES[column]
+        if not len(values):
+            return np.zeros(shape, dtype=np.int64)
+        return np.asarray(values.tolist(), dtype=np.int64).reshape(shape)
+
+    def set_array(self, column: str, labels: pd.Index, values: np.ndarray) -> None:
+        """Write a fixed-width array back to a bounding box or padding column.
+
+        Args:
+            column: One of Original_Bbox, Adjusted_Bbox or Padding.
+            labels: The rows to write.
+            values: One row per label, see array.
+        """
+        self.frame.loc[labels, column] = pd.Series(
+            values.tolist(), index=labels, dtype=object
+        )
+
+    def _index(self) -> dict[tuple[int, int], Hashable]:
+        """Return the index, rebuilt if the frame changed behind the store's back."""
+        frame = self.frame
+        if frame is not self._frame or len(frame) != self._size:
+            self._labels, self._by_image_index, self._pages = {}, {}, Counter()
+            self._add_rows(frame)
+            self._frame, self._size = frame, len(frame)
+        return self._labels
+
+    def _add_rows(self, rows: pd.DataFrame) -> None:
+        """Add rows of the frame to the index."""
+        pages = rows["Page"].to_numpy()
+        image_indices = rows["Image_Index"].to_numpy()
+        for label, page, image_index in zip(rows.index, pages, image_indices):
+            key = (int(page), int(image_index))
+            self._labels[key] = label
+            self._by_image_index.setdefault(key[1], label)
+            self._pages[key[0]] += 1
@@ -0,0 +1,138 @@
+import json
+import logging
+import threading
+import time
+from typing import Iterator
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class PageEvents:
+    """Publishes the loading progress of pages as Server-Sent Events.
+
+    Every page has a stream of events: a progress event when loading starts, a
+    ready or error event per instance and a done event once all instances were
+    processed. Subscribers first receive the events published so far, then the new
+    ones as they happen. Finished streams are forgotten after a while, subscribers
+    arriving later wait for the page to be loaded again.
+
+    Args:
+        keep_alive: Seconds after which an idle subscription sends a comment to keep
+            the connection open.
+        retention: Seconds a finished stream is kept for late subscribers.
+    """
+
+    def __init__(self, keep_alive: float = 15.0, retention: float = 300.0):
+        self.keep_alive = keep_alive
+        self.retention = retention
+        self._condition = threading.Condition()
+        self._streams: dict[int, dict] = {}
+
+    def open(self, page: int, image_indices: list[int]) -> None:
+        """Start the stream of a page, unless the page is already being loaded.
+
+        Args:
+            page: The page to load.
+            image_indices: The image indices of the page's instances.
+        """
+        with self._condition:
+            self._prune()
+            stream = self._streams.get(page)
+            if stream is not None and stream["finished"] is None:
+                return
+            self._streams[page] = {
+                "total": len(image_indices),
+                "ready": set(),
+                "events": [],
+                "finished": None,
+            }
+            self._publish(page, "progress")
+
+    def ready(self, page: int, image_index: int) -> None:
+        """Announce that the tiles of an instance are available.
+
+        Args:
+            page: The page of the instance.
+            image_index: The image index of the instance.
+        """
+        with self._condition:
+            stream = self._streams.get(page)
+            if stream is None or int(image_index) in stream["ready"]:
+                return
+            stream["ready"].add(int(image_index))
+            self._publish(page, "ready", image_index=int(image_index))
+
+    def failed(self, page: int, image_index: int) -> None:
+        """Announce that an instance could not be loaded.
+
+        Args:
+            page: The page of the instance.
+            image_index: The image index of the instance.
+        """
+        with self._condition:
+            if page in self._streams:
+                self._publish(page, "error", image_index=int(image_index))
+
+    def finish(self, page: int) -> None:
+        """Announce that all instances of a page were processed.
+
+        Args:
+            page: The loaded page.
+        """
+        with self._condition:
+            stream = self._streams.get(page)
+            if stream is None or stream["finished"] is not None:
+                return
+            stream["finished"] = time.monotonic()
+            self._publish(page, "done")
+            self._prune()
+
+    def subscribe(self, page: int) -> Iterator[str]:
+        """Yield the events of a page in the text/event-stream format until done.
+
+        Args:
+            page: The page to follow.
+
+        Yields:
+            The formatted events.
+        """
+        stream, position = None, 0
+        while True:
+            with self._condition:
+                if self._streams.get(page) is not stream:
+                    # the page is loaded anew, start over with the new stream
+                    stream, position = self._streams.get(page), 0
+                if stream is None or position >= len(stream["events"]):
+                    notified = self._condition.wait(self.keep_alive)
+                    events = []
+                else:
+                    events = stream["events"][position:]
+                    position = len(stream["events"])
+
+            if not events:
+                if not notified:
+                    yield ": keep-alive\n\n"
+                continue
+
+            for name, data in events:
+                yield f"event: {name}\ndata: {json.dumps(data)}\n\n"
+                if name == "done":
+                    return
+
+    def _publish(self, page: int, name: str, **data) -> None:
+        """Append an event to the stream of a page and wake up the subscribers."""
+        stream = self._streams[page]
+        data.update(page=page, ready=len(stream["ready"]), total=stream["total"])
+        stream["events"].append((name, data))
+        self._condition.notify_all()
+
+    def _prune(self) -> None:
+        """Forget the streams that finished longer than the retention time ago."""
+        expired = time.monotonic() - self.retention
+        for page in [
+            page
+            for page, stream in self._streams.items()
+            if stream["finished"] is not None and stream["finished"] < expired
+        ]:
+            del self._streams[page]
@@ -0,0 +1,158 @@
+import contextvars
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterable, NamedTuple, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# marks the end of a stage's input
+_END = object()
+
+
+class Stage(NamedTuple):
+    """A step of a StagedPipeline.
+
+    Args:
+        name: The name of the stage, used for the timings.
+        func: Turns the output of the previous stage into the input of the next
+            one. Returning None completes the item early.
+        workers: The number of threads running the stage.
+    """
+
+    name: str
+    func: Callable[[Any], Any]
+    workers: int = 1
+
+
+class StagedPipeline:
+    """Streams items through stages that are connected by bounded queues.
+
+    Every stage runs on its own threads, so that e.g. downloads and CPU-bound
+    processing of different items overlap. The bounded queues stop fast stages from
+    running far ahead of slow ones.
+
+    Args:
+        stages: The stages in the order the items pass them.
+        queue_size: The number of items waiting in front of each stage.
+        cancel_event: Once set, the items not yet processed are dropped.
+    """
+
+    def __init__(
+        self,
+        stages: list[Stage],
+        queue_size: int = 8,
+        cancel_event: Optional[threading.Event] = None,
+    ):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.cancel_event = cancel_event or threading.Event()
+        self.timings = {
+            stage.name: {"items": 0, "errors": 0, "seconds": 0.0} for stage in stages
+        }
+        self._timings_lock = threading.Lock()
+
+    def run(
+        self,
+        items: Iterable,
+        on_done: Optional[Callable[[Any], None]] = None,
+        on_error: Optional[Callable[[Any, Exception], None]] = None,
+    ) -> dict[str, dict]:
+        """Pass all items through the stages and wait until they are processed.
+
+        Args:
+            items: The inputs of the first stage.
+            on_done: Called with the original item once it passed all stages.
+            on_error: Called with the original item and the exception if a stage
+                failed, the item is dropped.
+
+        Returns:
+            The number of items, errors and busy seconds per stage.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads = []
+        for index, stage in enumerate(self.stages):
+            next_queue = queues[index + 1] if index + 1 < len(queues) else None
+            remaining = [stage.workers]
+            for _ in range(stage.workers):
+                # the stages see the caller's context variables, e.g. its workspace
+                thread = threading.Thread(
+                    target=contextvars.copy_context().run,
+                    args=(self._work, stage, queues[index], next_queue, remaining),
+                    kwargs={"on_done": on_done, "on_error": on_error},
+                    daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+
+        for item in items:
+            if self.cancel_event.is_set():
+                break
+            queues[0].put((item, item))
+        queues[0].put(_END)
+
+        for thread in threads:
+            thread.join()
+
+        for name, timing in self.timings.items():
+            logger.info(
+                "Stage %s: %d items, %d errors, %.2fs busy.",
+                name,
+                timing["items"],
+                timing["errors"],
+                timing["seconds"],
+            )
+        return self.timings
+
+    def _work(
+        self,
+        stage: Stage,
+        in_queue: queue.Queue,
+        out_queue: Optional[queue.Queue],
+        remaining: list[int],
+        on_done: Optional[Callable[[Any], None]],
+        on_error: Optional[Callable[[Any, Exception], None]],
+    ) -> None:
+        """Run one worker of a stage until the stage's input ends."""
+        while True:
+            entry = in_queue.get()
+            if entry is _END:
+                # let the other workers of the stage see the end as well
+                in_queue.put(_END)
+                with self._timings_lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last and out_queue is not None:
+                    out_queue.put(_END)
+                return
+
+            item, payload = entry
+            if self.cancel_event.is_set():
+                continue
+
+            start = time.perf_counter()
+            try:
+                result = stage.func(payload)
+            except Exception as exc:
+                self._record(stage, start, failed=True)
+                logger.error("Stage %s failed: %s", stage.name, exc)
+                if on_error is not None:
+                    on_error(item, exc)
+                continue
+            self._record(stage, start)
+
+            if result is None or out_queue is None:
+                if on_done is not None:
+                    on_done(item)
+            else:
+                out_queue.put((item, result))
+
+    def _record(self, stage: Stage, start: float, failed: bool = False) -> None:
+        """Add an item's processing time to the stage's timing."""
+        with self._timings_lock:
+            timing = self.timings[stage.name]
+            timing["items"] += 1
+            timing["errors"] += int(failed)
+            timing["seconds"] += time.perf_counter() - start
@@ -0,0 +1,85 @@
+import logging
+import threading
+from typing import Optional
+
+from flask import Flask
+
+from .jobs import JobExecutor
+from .processing import retrieve_instance_metadata
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class PagePrefetcher:
+    """Loads the page the user is viewing and speculatively the pages following it.
+
+    The pages are loaded one after the other as a background job, starting with
+    the page the user is viewing. Scheduling a new set of pages, e.g. because the
+    user jumped elsewhere, cancels the pages that were not loaded yet. The new job
+    starts once the cancelled one released the page loading lock.
+
+    Args:
+        depth: Number of pages to load ahead, a value of 0 disables prefetching.
+        jobs: The executor running the page builds.
+    """
+
+    def __init__(self, depth: int, jobs: JobExecutor):
+        self.depth = depth
+        self.jobs = jobs
+        self._job_id: Optional[str] = None
+
+    def schedule(
+        self, app: Flask, pages: list[int], current_page: Optional[int] = None
+    ) -> Optional[str]:
+        """Cancel the running prefetch and start loading the given pages.
+
+        Args:
+            app: The Flask app whose session data to load.
+            pages: The pages to load ahead, in order.
+            current_page: The page the user is viewing, loaded before the pages
+                ahead regardless of the prefetch depth.
+
+        Returns:
+            The ID of the page build job, None if there is nothing to load.
+        """
+        previous = self._job_id
+        self.cancel(wait=False)
+        pages = pages[: max(self.depth, 0)]
+        if current_page is not None:
+            pages = [current_page] + pages
+        if not pages:
+            return None
+
+        self._job_id = self.jobs.submit(
+            app, "page_build", self._prefetch, pages, previous, cancellable=True
+        )
+        return self._job_id
+
+    def cancel(self, wait: bool = True) -> None:
+        """Stop prefetching after the instances that are currently being loaded.
+
+        Args:
+            wait: Block until the running instances finished and released the
+                page loading lock.
+        """
+        if self._job_id is None:
+            return
+        self.jobs.cancel(self._job_id, wait=wait)
+        if wait:
+            self._job_id = None
+
+    def _prefetch(
+        self,
+        pages: list[int],
+        previous: Optional[str],
+        cancel_event: threading.Event,
+    ) -> None:
+        """Load the given pages until cancelled, after the previous job stopped."""
+        if previous is not None:
+            self.jobs.wait(previous)
+        for page in pages:
+            if cancel_event.is_set():
+                return
+            logger.info("Loading page %d in the background.", page)
+            retrieve_instance_metadata(page=page, cancel_event=cancel_event)
@@ -1,6 +1,9 @@
+import json
 import logging
-import traceback
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import os
+import sqlite3
+import threading
+from functools import partial
 from typing import Callable, Optional
 
 import numpy as np
@@ -10,9 +13,21 @@ from flask import Flask, current_app
 from PIL import Image
 from scipy.ndimage import center_of_mass
 from skimage.measure import label as label_cc
-from skimage.transform import resize
 
-from .utils import adjust_image_range, draw_cylinder, img_to_png_bytes
+from .chunk_planner import PageCutouts
+from .edit_log import log_edit
+from .instance_store import InstanceSlices
+from .materialization import read_materialization
+from .pipeline import Stage, StagedPipeline
+from .tile_bundle import tile_etag
+from .utils import (
+    TILE_MIMETYPES,
+    NpEncoder,
+    adjust_image_range,
+    encode_tile,
+    render_overlay,
+    resize_mask,
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -39,9 +54,9 @@ def process_syn(gt: np.ndarray) -> np.ndarray:
     # assign each synapse a unique index
     seg = label_cc(gt).astype(int)
     # identify the centers largest connected component and mask out the rest
-    unique, _ = np.unique(seg, return_counts=True)
+    unique = np.unique(seg)
     if len(unique) > 1:
-        center_blob_value = get_center_blob_value_vectorized(seg, np.unique(seg)[1:])
+        center_blob_value = get_center_blob_value_vectorized(seg, unique[1:])
         seg *= seg == center_blob_value
     else:
         logger.warning("No synapse segmentation mask found in the volume.")
@@ -66,12 +81,10 @@ def get_center_blob_value_vectorized(
     # Calculate the center of the entire array
     array_center = np.array(labeled_array.shape) / 2.0
 
-    # Create a 4D array where the first dimension is equal to the number of blobs
-    # and the last three dimensions are equal to the dimensions of the original array
-    blob_masks = np.equal.outer(blob_values, labeled_array)
-
-    # Compute the center of mass for each blob
-    blob_centers = np.array([center_of_mass(mask) for mask in blob_masks])
+    # Compute the center of mass of all blobs in a single pass over the labels
+    blob_centers = np.array(
+        center_of_mass(labeled_array != 0, labeled_array, blob_values)
+    ).reshape(len(blob_values), labeled_array.ndim)
 
     # Calculate the distance from each blob center to the array center
     distances = np.linalg.norm(blob_centers - array_center, axis=1)
@@ -107,62 +120,92 @@ def calculate_crop_pad(
         pad (tuple): the padding parameters.
 
     """
-    c11o, c12o, c21o, c22o, c31o, c32o = bbox_3d  # region to crop
-    c11m, c12m, c21m, c22m, c31m, c32m = (
-        0,
-        volume_shape[0],
-        0,
-        volume_shape[1],
-        0,
-        volume_shape[2],
+    bboxes, pads = calculate_crop_pad_array(
+        np.asarray([bbox_3d], dtype=np.int64), volume_shape, pad_z=pad_z
     )
-    c11, c21, c31 = max(c11o, c11m), max(c21o, c21m), max(c31o, c31m)
-    c12, c22, c32 = min(c12o, c12m), min(c22o, c22m), min(c32o, c32m)
+    return bboxes[0].tolist(), pads[0].tolist()
 
-    assert c11 < c12 and c21 < c22 and c31 < c32, "Invalid bounding box."
 
-    pad = [
-        [c11 - c11o, c12o - c12],
-        [c21 - c21o, c22o - c22],
-        [c31 - c31o, c32o - c32],
-    ]
+def calculate_crop_pad_array(
+    bboxes: np.ndarray, volume_shape: tuple, pad_z: bool = False
+) -> tuple[np.ndarray, np.ndarray]:
+    """Calculate the crop/pad parameters for many bounding boxes at once.
 
-    if not pad_z:
-        pad[list(current_app.coordinate_order.keys()).index("z")] = [0, 0]
+    Args:
+        bboxes: The bounding boxes, of shape (n, 6).
+        volume_shape: The shape of the 3D volume.
+        pad_z: Whether to pad the z dimension.
 
-    return [c11, c12, c21, c22, c31, c32], pad
+    Returns:
+        The bounding boxes cropped to the volume, of shape (n, 6), and the
+        padding that restores their size, of shape (n, 3, 2).
+    """
+    bounds = bboxes.reshape(-1, 3, 2)
+    lower = np.maximum(bounds[:, :, 0], 0)
+    upper = np.minimum(bounds[:, :, 1], np.asarray(volume_shape[:3]))
 
+    assert np.all(lower < upper), "Invalid bounding box."
 
-def syn2rgb(label: np.ndarray) -> np.ndarray:
-    """Convert the binary mask of the synapse to RGB format.
+    pad = np.stack([lower - bounds[:, :, 0], bounds[:, :, 1] - upper], axis=-1)
 
-    Args:
-        label (np.ndarray): the binary mask of the synapse.
+    if not pad_z:
+        pad[:, list(current_app.coordinate_order.keys()).index("z")] = 0
 
-    Returns:
-        out (np.ndarray): the RGB mask of the synapse.
-    """
-    tmp = [None] * 3
-    tmp[0] = tmp[2] = label > 0
-    tmp[1] = np.zeros_like(label)
-    out = adjust_image_range(np.stack(tmp, -1))  # shape is (*, 3))
-    return out
+    return np.stack([lower, upper], axis=-1).reshape(-1, 6), pad
 
 
-def free_page() -> None:
-    """Remove the current and next page segmentation/images from the dict."""
+def free_page(keep_pages: Optional[list[int]] = None) -> None:
+    """Remove the segmentation/images of all instances labeled as "correct".
 
-    # retrieve the image index for all instances that are not labeled as "correct"
+    Args:
+        keep_pages: Pages whose instances stay in memory, e.g. the current page and
+            the pages loaded ahead by the prefetcher.
+    """
+    keep_pages = keep_pages or []
+
+    # retrieve the image index for all instances that are labeled as "correct"
     with current_app.df_metadata_lock:
-        key_list = current_app.df_metadata.query('Label == "correct"')[
-            "Image_Index"
-        ].values.tolist()
+        key_list = current_app.df_metadata.query(
+            'Label == "correct" and Page not in @keep_pages'
+        )["Image_Index"].values.tolist()
 
     for key in key_list:
         if str(key) in current_app.source_image_data:
             del current_app.source_image_data[str(key)]
+            bump_tile_version(key, "source")
         if str(key) in current_app.target_image_data:
             del current_app.target_image_data[str(key)]
+            bump_tile_version(key, "target")
+
+
+def instance_pages() -> dict[str, int]:
+    """Map the image index of every instance in the metadata to its page.
+
+    Returns:
+        The page of every instance by image index.
+    """
+    with current_app.df_metadata_lock:
+        df = current_app.df_metadata
+        return dict(zip(df["Image_Index"].astype(str), df["Page"].astype(int)))
+
+
+def reload_instance(image_index: str, mip: int = 0) -> None:
+    """Load an instance evicted from the tile store again.
+
+    Args:
+        image_index: The image index of the instance.
+        mip: The mip level the EM slices were held at before the eviction.
+    """
+    with current_app.df_metadata_lock:
+        item = current_app.metadata_store.find(int(image_index))
+
+    if item is None:
+        logger.warning("Cannot reload instance %s, it has no metadata.", image_index)
+        return
+    try:
+        process_instance(item, mip=mip)
+    except Exception as exc:
+        logger.error("Error reloading instance %s: %s", image_index, exc)
 
 
 def retrieve_materialization_data(df: pd.DataFrame) -> dict:
@@ -210,113 +253,204 @@ def retrieve_materialization_data(df: pd.DataFrame) -> dict:
     return df.to_dict("index")
 
 
-def retrieve_instance_metadata(page: int = 1, mode: str = "annotate"):
-    """Visualize the synapse and EM images in 2D slices for each instance.
+def upcoming_pages(page: int, depth: int) -> list[int]:
+    """Return the pages that follow the given page in the order they are reviewed.
 
-        Cropping the bounding box of the instance. Processing each instance
-        individually, retrieving them from the cloud volume and saving them
-        to the local disk.
+    For neuron based loading the pages follow the traversal order of the neuron's
+    sections, the empty pages for adding false negatives are skipped.
 
     Args:
-        page (int): the current page number for which to compute the data.
+        page: The page the user is currently viewing.
+        depth: The maximum number of pages to return.
+
+    Returns:
+        Up to depth page numbers, in review order.
     """
+    if current_app.page_section_mapping:
+        # the section indices follow sort_sections_by_traversal_order
+        pages = sorted(
+            (
+                p
+                for p, (_, fn_page) in current_app.page_section_mapping.items()
+                if not fn_page
+            ),
+            key=lambda p: (current_app.page_section_mapping[p][0], p),
+        )
+        if page in pages:
+            pages = pages[pages.index(page) + 1 :]  # noqa: E203
+        else:
+            pages = [p for p in pages if p > page]
+    else:
+        pages = list(range(page + 1, current_app.n_pages + 1))
+    return pages[:depth]
 
-    with current_app.retrieve_instance_metadata_lock:
 
-        # retrieve the order of the coordinates (xyz, xzy, yxz, yzx, zxy, zyx)
+def is_instance_loaded(item: dict, mip: int = 0) -> bool:
+    """Check whether all slices of an instance are already held in memory.
 
-        with current_app.df_metadata_lock:
-            page_empty = current_app.df_metadata.query("Page == @page").empty
+    Args:
+        item: Dictionary containing metadata of the instance.
+        mip: The coarsest acceptable mip level of the EM slices.
 
-        if page_empty and not (
-            mode == "draw" and current_app.df_metadata.query('Label != "correct"').empty
-        ):
-            # retrieve the data for the current page
-            page_metadata = current_app.synapse_data.query("page == @page")
+    Returns:
+        True if all slices of the instance are in memory.
+    """
+    slice_axis = list(current_app.coordinate_order.keys()).index("z")
+    first_slice = item["Adjusted_Bbox"][slice_axis * 2]
+    nr_slices = (
+        item["Adjusted_Bbox"][slice_axis * 2 + 1]
+        - first_slice
+        + sum(item["Padding"][slice_axis])
+    )
+
+    source_slices = current_app.source_image_data.get(str(item["Image_Index"]), {})
+    target_slices = current_app.target_image_data.get(str(item["Image_Index"]), {})
+    if getattr(source_slices, "mip", 0) > mip:
+        return False
+    return all(
+        str(first_slice + s) in source_slices
+        and (
+            item["Error_Description"] == "False Negative"
+            or str(first_slice + s) in target_slices
+        )
+        for s in range(nr_slices)
+    )
+
+
+def ensure_full_resolution(item: dict) -> None:
+    """Replace an instance's grid resolution EM slices with full resolution ones.
+
+    Args:
+        item: Dictionary containing metadata of the instance.
+    """
+    if not is_instance_loaded(item):
+        process_instance(item)
+
+
+def create_page_metadata(page: int = 1, mode: str = "annotate") -> None:
+    """Add the instances of a page to the metadata DataFrame, if not done before.
 
-            page_metadata = retrieve_materialization_data(page_metadata)
+    Args:
+        page: The page whose instances to add.
+        mode: The view the data is loaded for: annotate | draw
+    """
+    # retrieve the order of the coordinates (xyz, xzy, yxz, yzx, zxy, zyx)
 
-            coordinate_order = list(current_app.coordinate_order.keys())
+    with current_app.df_metadata_lock:
+        page_empty = not current_app.metadata_store.has_page(page)
 
-            crop_size_x = (
-                current_app.crop_size_z
-                if mode == "annotate"
-                else current_app.crop_size_z_draw
+    if page_empty and not (
+        mode == "draw" and current_app.df_metadata.query('Label != "correct"').empty
+    ):
+        # retrieve the data for the current page
+        page_metadata = current_app.synapse_data.query("page == @page")
+
+        page_metadata = retrieve_materialization_data(page_metadata)
+
+        coordinate_order = list(current_app.coordinate_order.keys())
+
+        crop_size_x = (
+            current_app.crop_size_z
+            if mode == "annotate"
+            else current_app.crop_size_z_draw
+        )
+
+        instance_list = []
+        for idx in page_metadata.keys():
+            item = {
+                "Page": int(page),
+                "Image_Index": int(idx),
+                "materialization_index": (
+                    page_metadata[idx]["materialization_index"]
+                    if "materialization_index" in page_metadata[idx]
+                    else -1
+                ),
+                "section_index": (
+                    page_metadata[idx]["section_index"]
+                    if "section_index" in page_metadata[idx]
+                    else -1
+                ),
+                "tree_traversal_index": (
+                    page_metadata[idx]["tree_traversal_index"]
+                    if "tree_traversal_index" in page_metadata[idx]
+                    else -1
+                ),
+                "Label": "correct",
+                "Annotated": "No",
+                "neuron_id": (
+                    current_app.selected_neuron_id
+                    if current_app.selected_neuron_id is not None
+                    else "No Neuron Selected..."
+                ),
+                "Error_Description": "None",
+                "X_Index": coordinate_order.index("x"),
+                "Y_Index": coordinate_order.index("y"),
+                "Z_Index": coordinate_order.index("z"),
+                "Middle_Slice": int(page_metadata[idx]["z"]),
+                "cz0": int(page_metadata[idx]["z"]),
+                "cy0": int(page_metadata[idx]["y"]),
+                "cx0": int(page_metadata[idx]["x"]),
+                "pre_pt_x": int(page_metadata[idx]["pre_pt_x"]),
+                "pre_pt_y": int(page_metadata[idx]["pre_pt_y"]),
+                "pre_pt_z": int(page_metadata[idx]["pre_pt_z"]),
+                "post_pt_x": int(page_metadata[idx]["post_pt_x"]),
+                "post_pt_y": int(page_metadata[idx]["post_pt_y"]),
+                "post_pt_z": int(page_metadata[idx]["post_pt_z"]),
+                "crop_size_x": current_app.crop_size_x,
+                "crop_size_y": current_app.crop_size_y,
+                "crop_size_z": crop_size_x,
+            }
+
+            bbox_org = [
+                item["cz0"] - crop_size_x // 2,
+                item["cz0"] + max(1, (crop_size_x + 1) // 2),
+                item["cy0"] - current_app.crop_size_y // 2,
+                item["cy0"] + (current_app.crop_size_y + 1) // 2,
+                item["cx0"] - current_app.crop_size_x // 2,
+                item["cx0"] + (current_app.crop_size_x + 1) // 2,
+            ]
+
+            item["Original_Bbox"] = [
+                bbox_org[coordinate_order.index(coord) * 2 + i]
+                for coord in ["z", "y", "x"]
+                for i in range(2)
+            ]
+
+            item["Adjusted_Bbox"], item["Padding"] = calculate_crop_pad(
+                item["Original_Bbox"], current_app.vol_dim
             )
 
-            instance_list = []
-            for idx in page_metadata.keys():
-                item = {
-                    "Page": int(page),
-                    "Image_Index": int(idx),
-                    "materialization_index": (
-                        page_metadata[idx]["materialization_index"]
-                        if "materialization_index" in page_metadata[idx]
-                        else -1
-                    ),
-                    "section_index": (
-                        page_metadata[idx]["section_index"]
-                        if "section_index" in page_metadata[idx]
-                        else -1
-                    ),
-                    "tree_traversal_index": (
-                        page_metadata[idx]["tree_traversal_index"]
-                        if "tree_traversal_index" in page_metadata[idx]
-                        else -1
-                    ),
-                    "Label": "correct",
-                    "Annotated": "No",
-                    "neuron_id": (
-                        current_app.selected_neuron_id
-                        if current_app.selected_neuron_id is not None
-                        else "No Neuron Selected..."
-                    ),
-                    "Error_Description": "None",
-                    "X_Index": coordinate_order.index("x"),
-                    "Y_Index": coordinate_order.index("y"),
-                    "Z_Index": coordinate_order.index("z"),
-                    "Middle_Slice": int(page_metadata[idx]["z"]),
-                    "cz0": int(page_metadata[idx]["z"]),
-                    "cy0": int(page_metadata[idx]["y"]),
-                    "cx0": int(page_metadata[idx]["x"]),
-                    "pre_pt_x": int(page_metadata[idx]["pre_pt_x"]),
-                    "pre_pt_y": int(page_metadata[idx]["pre_pt_y"]),
-                    "pre_pt_z": int(page_metadata[idx]["pre_pt_z"]),
-                    "post_pt_x": int(page_metadata[idx]["post_pt_x"]),
-                    "post_pt_y": int(page_metadata[idx]["post_pt_y"]),
-                    "post_pt_z": int(page_metadata[idx]["post_pt_z"]),
-                    "crop_size_x": current_app.crop_size_x,
-                    "crop_size_y": current_app.crop_size_y,
-                    "crop_size_z": crop_size_x,
-                }
-
-                bbox_org = [
-                    item["cz0"] - crop_size_x // 2,
-                    item["cz0"] + max(1, (crop_size_x + 1) // 2),
-                    item["cy0"] - current_app.crop_size_y // 2,
-                    item["cy0"] + (current_app.crop_size_y + 1) // 2,
-                    item["cx0"] - current_app.crop_size_x // 2,
-                    item["cx0"] + (current_app.crop_size_x + 1) // 2,
-                ]
-
-                item["Original_Bbox"] = [
-                    bbox_org[coordinate_order.index(coord) * 2 + i]
-                    for coord in ["z", "y", "x"]
-                    for i in range(2)
-                ]
-
-                item["Adjusted_Bbox"], item["Padding"] = calculate_crop_pad(
-                    item["Original_Bbox"], current_app.vol_dim
-                )
+            instance_list.append(item)
 
-                instance_list.append(item)
+        # Append to shared DataFrame, unless a concurrent call created the page
+        with current_app.df_metadata_lock:
+            if not current_app.metadata_store.has_page(page):
+                # logged first, so that edits of the page follow it in the log
+                log_edit("append", records=instance_list)
+                current_app.metadata_store.append(instance_list)
 
-            # Append to shared DataFrame
-            df_list = pd.DataFrame(instance_list)
-            with current_app.df_metadata_lock:
-                current_app.df_metadata = pd.concat(
-                    [current_app.df_metadata, df_list], ignore_index=True
-                )
+
+def retrieve_instance_metadata(
+    page: int = 1,
+    mode: str = "annotate",
+    cancel_event: Optional[threading.Event] = None,
+):
+    """Visualize the synapse and EM images in 2D slices for each instance.
+
+        Cropping the bounding box of the instance. Processing each instance
+        individually, retrieving them from the cloud volume and saving them
+        to the local disk.
+
+    Args:
+        page (int): the current page number for which to compute the data.
+        mode (str): the view the data is loaded for: annotate | draw
+        cancel_event (threading.Event): stops loading the instances that were
+            not started yet once set, used by the page prefetcher.
+    """
+
+    with current_app.retrieve_instance_metadata_lock:
+
+        create_page_metadata(page, mode)
 
         # retrieve the page's metadata from the dataframe
         with current_app.df_metadata_lock:
@@ -330,92 +464,111 @@ def retrieve_instance_metadata(page: int = 1, mode: str = "annotate"):
             "records"
         )  # convert dataframe to list of dicts
 
-        with ThreadPoolExecutor(max_workers=8) as executor:
-            futures = [
-                executor.submit(
-                    run_with_app_context,
-                    current_app._get_current_object(),
-                    process_instance,
-                    item,
-                )
-                for item in page_metadata
-            ]
+        page_events = current_app.page_events
+        page_events.open(page, [item["Image_Index"] for item in page_metadata])
 
-            for future in as_completed(futures):
-                try:
-                    future.result()
-                except Exception as exc:
-                    logger.error("Error processing instance: %s", exc)
-                    logger.info("Retrying...")
-                    try:
-                        future.result(timeout=15)
-                    except Exception as exc_retry:
-                        logger.error("Retry failed: %s", exc_retry)
-                        traceback.print_exc()
+        # the grid shows the EM at a coarser mip, if configured
+        mip = grid_mip() if mode == "annotate" else 0
 
-        logger.info("Completed processing for page %d.", page)
+        # instances that are in memory or were reviewed before need no download
+        missing_metadata = []
+        for item in page_metadata:
+            if is_instance_loaded(item, mip) or load_instance_from_cache(item, mip=mip):
+                page_events.ready(page, item["Image_Index"])
+            else:
+                missing_metadata.append(item)
 
+        # neighbouring instances share chunks, download them once per page
+        cutouts = plan_page_cutouts(missing_metadata, mip)
 
-def update_slice_number(data: dict) -> None:
-    """Update the slice number of the bounding box for the given instances.
-
-    Args:
-        data (dict): the dictionary containing the metadata of the instances.
-    """
-    # Adjust the bounding box
-    with current_app.retrieve_instance_metadata_lock:
-        coord_order = list(current_app.coordinate_order.keys())
-
-        for instance in data:
-            # retrieve the CloudVolume's coordinate order: xyz, xzy, yxz, yzx, zxy, zyx
-
-            instance["crop_size_z"] = current_app.crop_size_z_draw
-            og_bb = instance["Original_Bbox"]
+        # download, segment and store the instances in overlapping stages
+        app = current_app._get_current_object()
+        pipeline = StagedPipeline(
+            [
+                Stage(
+                    "download",
+                    partial(
+                        run_with_app_context,
+                        app,
+                        download_instance,
+                        cutouts=cutouts,
+                        mip=mip,
+                    ),
+                    app.config["DOWNLOAD_WORKERS"],
+                ),
+                Stage(
+                    "segment",
+                    partial(run_with_app_context, app, segment_instance),
+                    app.config["SEGMENT_WORKERS"],
+                ),
+                Stage(
+                    "store",
+                    partial(run_with_app_context, app, store_instance),
+                    app.config["STORE_WORKERS"],
+                ),
+            ],
+            queue_size=app.config["PIPELINE_QUEUE_SIZE"],
+            cancel_event=cancel_event,
+        )
+        pipeline.run(
+            missing_metadata,
+            on_done=lambda item: page_events.ready(page, item["Image_Index"]),
+            on_error=lambda item, exc: page_events.failed(page, item["Image_Index"]),
+        )
 
-            z1 = og_bb[coord_order.index("z") * 2]
-            z2 = og_bb[coord_order.index("z") * 2 + 1]
+        if cancel_event is not None and cancel_event.is_set():
+            logger.info("Cancelled processing for page %d.", page)
+            return
 
-            nr_slices = z2 - z1
+        page_events.finish(page)
+        logger.info("Completed processing for page %d.", page)
 
-            missing_nr_slices = current_app.crop_size_z_draw - nr_slices
 
-            if missing_nr_slices < 0:
-                logger.warning("We already have more slices than the model can handle.")
-                break
+def update_slice_number(labels: Optional[pd.Index] = None) -> None:
+    """Extend the bounding boxes of instances to crop_size_z_draw slices.
 
-            og_bb[coord_order.index("z") * 2] = z1 - missing_nr_slices // 2
-            og_bb[coord_order.index("z") * 2 + 1] = z2 + (missing_nr_slices + 1) // 2
+    The bounding boxes, crop and padding are computed for all instances at once.
+    Instances that already span more slices keep their bounding box.
 
-            assert (
-                og_bb[coord_order.index("z") * 2 + 1]
-                - og_bb[coord_order.index("z") * 2]
-                == current_app.crop_size_z_draw
-            )
-
-            (
-                instance["Adjusted_Bbox"],
-                instance["Padding"],
-            ) = calculate_crop_pad(
-                instance["Original_Bbox"], current_app.vol_dim, pad_z=True
+    Args:
+        labels: The rows of the metadata to update, all rows if None.
+    """
+    with current_app.retrieve_instance_metadata_lock:
+        store = current_app.metadata_store
+        if labels is None:
+            labels = store.frame.index
+        if not len(labels):
+            return
+
+        # retrieve the CloudVolume's coordinate order: xyz, xzy, yxz, yzx, zxy, zyx
+        z_axis = list(current_app.coordinate_order.keys()).index("z")
+        depth = current_app.crop_size_z_draw
+
+        bboxes = store.array("Original_Bbox", labels)
+        missing_nr_slices = depth - (bboxes[:, z_axis * 2 + 1] - bboxes[:, z_axis * 2])
+
+        too_deep = missing_nr_slices < 0
+        if too_deep.any():
+            logger.warning(
+                "%d instances already have more slices than the model can handle.",
+                too_deep.sum(),
             )
+            labels = labels[~too_deep]
+            bboxes = bboxes[~too_deep]
+            missing_nr_slices = missing_nr_slices[~too_deep]
 
-            # Update the fields Adjusted_Bbox, Padding, crop_size_z, and Original_Bbox
-            condition = (current_app.df_metadata["Page"] == instance["Page"]) & (
-                current_app.df_metadata["Image_Index"] == instance["Image_Index"]
-            )
+        bboxes[:, z_axis * 2] -= missing_nr_slices // 2
+        bboxes[:, z_axis * 2 + 1] += (missing_nr_slices + 1) // 2
 
-            row_index = current_app.df_metadata.loc[condition].index[0]
+        adjusted, padding = calculate_crop_pad_array(
+            bboxes, current_app.vol_dim, pad_z=True
+        )
 
-            current_app.df_metadata.at[row_index, "Adjusted_Bbox"] = instance[
-                "Adjusted_Bbox"
-            ]
-            current_app.df_metadata.at[row_index, "Padding"] = instance["Padding"]
-            current_app.df_metadata.at[row_index, "crop_size_z"] = instance[
-                "crop_size_z"
-            ]
-            current_app.df_metadata.at[row_index, "Original_Bbox"] = instance[
-                "Original_Bbox"
-            ]
+        # Update the fields Adjusted_Bbox, Padding, crop_size_z, and Original_Bbox
+        store.set_array("Original_Bbox", labels, bboxes)
+        store.set_array("Adjusted_Bbox", labels, adjusted)
+        store.set_array("Padding", labels, padding)
+        store.frame.loc[labels, "crop_size_z"] = depth
 
 
 def adjust_synapse_points(
@@ -507,51 +660,351 @@ def scale_synapse_points(
     return pre_pt_x, pre_pt_y, pre_pt_z, post_pt_x, post_pt_y, post_pt_z
 
 
-def save_slices_in_memory(
+def render_source_slice(volume: np.ndarray, position: int, slice_axis: int):
+    """Render a slice of the padded EM volume.
+
+    Args:
+        volume: The padded EM volume of the instance.
+        position: The position of the slice along the slice axis.
+        slice_axis: The axis of the volume that holds the z slices.
+
+    Returns:
+        The EM slice as uint8 image.
+    """
+    return adjust_image_range(np.take(volume, position, axis=slice_axis))
+
+
+def source_tile_encoder() -> tuple[Callable, str]:
+    """Return the encoder and mimetype of the session's EM tile codec.
+
+    Returns:
+        The function encoding an EM slice and the mimetype of the encoded slices.
+    """
+    codec = current_app.source_tile_codec
+    encode = partial(
+        encode_tile,
+        codec=codec,
+        quality=current_app.config["SOURCE_TILE_QUALITY"],
+        png_compress_level=current_app.config["PNG_COMPRESS_LEVEL"],
+    )
+    return encode, TILE_MIMETYPES[codec]
+
+
+def source_content_key(instance_key: str) -> str:
+    """Identify the encoded EM slices of an instance by its content and codec.
+
+    Args:
+        instance_key: The instance's tile cache key.
+
+    Returns:
+        The content key of the instance's encoded EM slices.
+    """
+    return current_app.tile_cache.make_key(
+        instance_key=instance_key,
+        codec=current_app.source_tile_codec,
+        quality=current_app.config["SOURCE_TILE_QUALITY"],
+        png_compress_level=current_app.config["PNG_COMPRESS_LEVEL"],
+    )
+
+
+def bump_tile_version(image_index: str, layer: str) -> None:
+    """Mark the tiles of an instance's layer as changed, see tile_bundle.tile_etag.
+
+    Every change also advances the version of the tile manifest and publishes the
+    layer to the shared tile store.
+
+    Args:
+        image_index: The image index of the instance.
+        layer: The rewritten layer, e.g. target, curve or auto_curve.
+    """
+    current_app.tile_versions[(str(image_index), layer)] += 1
+    current_app.tile_manifest_version += 1
+    publish_tiles(str(image_index), layer)
+
+
+def publish_tiles(image_index: str, layer: str) -> None:
+    """Copy the encoded tiles of an instance's layer to the shared tile store.
+
+    Other worker processes serve the published tiles, see SharedTileStore. A
+    removed layer is removed from the shared store as well. Only slices that were
+    already encoded are published, the others are not rendered just to publish
+    them and other workers answer them with 404 until they are published.
+
+    Args:
+        image_index: The image index of the instance.
+        layer: The layer to publish, e.g. source, target or curve.
+    """
+    if current_app.shared_tiles is None:
+        return
+
+    if layer == "source":
+        slices = current_app.source_image_data.get(image_index, {})
+    else:
+        target = current_app.target_image_data.get(image_index, {})
+        slices = target if layer == "target" else target.get(layer, {})
+
+    if hasattr(slices, "encoded_keys"):
+        slice_ids = slices.encoded_keys()
+    else:
+        slice_ids = [key for key in slices if key.isdigit()]
+    mimetype = getattr(slices, "mimetype", "image/png")
+
+    try:
+        current_app.shared_tiles.publish(
+            current_app.workspaces.current_id(),
+            current_app.tile_session,
+            image_index,
+            layer,
+            instance_pages().get(image_index),
+            [
+                (
+                    slice_id,
+                    slices[slice_id],
+                    mimetype,
+                    tile_etag(slices, image_index, layer, slice_id),
+                )
+                for slice_id in slice_ids
+            ],
+            mip=getattr(slices, "mip", 0),
+        )
+    except sqlite3.Error as exc:
+        logger.error(
+            "Failed to publish the %s tiles of %s: %s", layer, image_index, exc
+        )
+
+
+def render_target_slice(
+    volume: np.ndarray,
+    position: int,
+    slice_axis: int,
+    markers: list,
+    coord_order: list,
+    radius: int = 10,
+) -> Image:
+    """Render a slice of the synapse segmentation with the pre/post markers.
+
+    Args:
+        volume: The padded segmentation volume of the instance.
+        position: The position of the slice along the slice axis.
+        slice_axis: The axis of the volume that holds the z slices.
+        markers: The x, y, z position, main and sub color of each marker.
+        coord_order: List containing the coordinate order.
+        radius: Radius of the markers in pixels.
+
+    Returns:
+        The RGBA overlay of the slice.
+    """
+    overlay = render_overlay(
+        np.take(volume, [position], axis=slice_axis),
+        markers,
+        coord_order,
+        z_offset=position,
+        radius=radius,
+    )
+    return Image.fromarray(np.take(overlay, 0, axis=slice_axis), "RGBA")
+
+
+def store_instance_slices(
+    image_index: str,
+    source: InstanceSlices,
+    target: Optional[InstanceSlices],
+    middle_slice: Optional[int] = None,
+) -> None:
+    """Place the slices of an instance in Flask's shared memory buffer.
+
+    Args:
+        image_index: The image index of the instance.
+        source: The EM slices of the instance.
+        target: The segmentation slices, None for false negatives.
+        middle_slice: The slice the grid view shows first, encoded before the
+            slices are published, see publish_tiles.
+    """
+    # the grid requests the middle slice right after the page is built
+    if middle_slice is not None:
+        for slices in (source, target):
+            if slices is not None:
+                slices.encode_slices([str(middle_slice)])
+
+    current_app.source_image_data[image_index] = source
+    bump_tile_version(image_index, "source")
+
+    if target is not None:
+        # keep the masks drawn in the draw view, they are not part of the volume
+        previous = current_app.target_image_data.get(image_index, {})
+        for key in list(previous):
+            if not key.isdigit():
+                target[key] = previous[key]
+        current_app.target_image_data[image_index] = target
+        bump_tile_version(image_index, "target")
+
+
+def save_instance_in_memory(
     cropped_img_pad: np.ndarray,
-    vis_label: np.ndarray,
+    cropped_seg_pad: np.ndarray,
+    markers: list,
     item: dict,
     coord_order: list,
-) -> None:
-    """Convert images to bytes and save them in Flask's shared memory buffer.
+    cache_key: str,
+    mip: int = 0,
+) -> dict[str, bytes]:
+    """Save the instance's volumes in Flask's shared memory buffer.
+
+    The slices are encoded when they are requested for the first time.
 
     Args:
         cropped_img_pad: Padded cropped image (numpy array).
-        vis_label: Visual label of the synapse segmentation (numpy array).
+        cropped_seg_pad: Padded synapse segmentation (numpy array).
+        markers: The x, y, z position, main and sub color of each marker.
         item: Dictionary containing metadata of the current instance.
         coord_order: List containing the coordinate order.
+        cache_key: The instance's tile cache key.
+        mip: The mip level the EM volume was downloaded at.
+
+    Returns:
+        The instance's tile cache entry, see load_instance_from_cache.
     """
     slice_axis = coord_order.index("z")
+    first_slice = item["Adjusted_Bbox"][slice_axis * 2]
 
-    for s in range(cropped_img_pad.shape[slice_axis]):
+    encode, mimetype = source_tile_encoder()
+    source = InstanceSlices(
+        cropped_img_pad,
+        first_slice,
+        slice_axis,
+        partial(render_source_slice, slice_axis=slice_axis),
+        encode=encode,
+        mimetype=mimetype,
+        content_key=source_content_key(cache_key),
+        mip=mip,
+    )
+    entry = source.to_cache_entry("source")
+
+    target = None
+    if item["Error_Description"] != "False Negative":
+        target = InstanceSlices(
+            (cropped_seg_pad > 0).astype(np.uint8),
+            first_slice,
+            slice_axis,
+            partial(
+                render_target_slice,
+                slice_axis=slice_axis,
+                markers=markers,
+                coord_order=coord_order,
+                radius=marker_radius(mip),
+            ),
+            mip=mip,
+        )
+        entry.update(target.to_cache_entry("target"))
+        entry["markers.json"] = json.dumps(markers, cls=NpEncoder).encode("utf-8")
+
+    store_instance_slices(
+        str(item["Image_Index"]), source, target, item.get("Middle_Slice")
+    )
+    return entry
 
-        image_index = str(item["Image_Index"])
-        img_z_index = str(item["Adjusted_Bbox"][slice_axis * 2] + s)
 
-        # Process EM image
-        slicing_img = [s if idx == slice_axis else slice(None) for idx in range(3)]
-        current_app.source_image_data[image_index][img_z_index] = img_to_png_bytes(
-            adjust_image_range(cropped_img_pad[tuple(slicing_img)])
+def instance_cache_key(item: dict, mip: int = 0) -> str:
+    """Derive the tile cache key of an instance.
+
+    The key covers everything that determines the instance's tiles: the volumes,
+    their resolutions, the crop, the synapse markers and their colors.
+
+    Args:
+        item: Dictionary containing metadata of the current instance.
+        mip: The mip level of the EM volume.
+
+    Returns:
+        The content address of the instance's tiles.
+    """
+    return current_app.tile_cache.make_key(
+        version=3,
+        source_url=current_app.source_cv.cloudpath,
+        target_url=current_app.target_cv.cloudpath,
+        source_mip=mip,
+        mip=target_mip(),
+        coordinate_order=list(current_app.coordinate_order.keys()),
+        coord_resolution_source=current_app.coord_resolution_source,
+        coord_resolution_target=current_app.coord_resolution_target,
+        vol_dim=current_app.vol_dim,
+        adjusted_bbox=item["Adjusted_Bbox"],
+        padding=item["Padding"],
+        false_negative=item["Error_Description"] == "False Negative",
+        pre_pt=[item["pre_pt_x"], item["pre_pt_y"], item["pre_pt_z"]],
+        post_pt=[item["post_pt_x"], item["post_pt_y"], item["post_pt_z"]],
+        marker_colors=[
+            current_app.pre_id_color_main,
+            current_app.pre_id_color_sub,
+            current_app.post_id_color_main,
+            current_app.post_id_color_sub,
+        ],
+    )
+
+
+def load_instance_from_cache(
+    item: dict, cache_key: Optional[str] = None, mip: int = 0
+) -> bool:
+    """Load the volumes of an instance from the tile cache into memory.
+
+    Args:
+        item: Dictionary containing metadata of the current instance.
+        cache_key: The instance's cache key, derived from the item if None.
+        mip: The mip level of the EM volume.
+
+    Returns:
+        True if the instance was found in the tile cache.
+    """
+    if not current_app.tile_cache.enabled:
+        return False
+
+    cache_key = cache_key or instance_cache_key(item, mip)
+    entry = current_app.tile_cache.get(cache_key)
+    if entry is None:
+        return False
+
+    coord_order = list(current_app.coordinate_order.keys())
+    slice_axis = coord_order.index("z")
+
+    encode, mimetype = source_tile_encoder()
+    source = InstanceSlices.from_cache_entry(
+        entry,
+        "source",
+        partial(render_source_slice, slice_axis=slice_axis),
+        encode=encode,
+        mimetype=mimetype,
+        content_key=source_content_key(cache_key),
+    )
+
+    target = None
+    if "markers.json" in entry:
+        target = InstanceSlices.from_cache_entry(
+            entry,
+            "target",
+            partial(
+                render_target_slice,
+                slice_axis=slice_axis,
+                markers=json.loads(entry["markers.json"]),
+                coord_order=coord_order,
+                radius=marker_radius(mip),
+            ),
         )
 
-        # Process Synapse Segmentation image
-        if item["Error_Description"] != "False Negative":
-            slicing_seg = [s if idx == slice_axis else slice(None) for idx in range(4)]
-            current_app.target_image_data[image_index][img_z_index] = img_to_png_bytes(
-                apply_transparency(vis_label[tuple(slicing_seg)])
-            )
+    store_instance_slices(
+        str(item["Image_Index"]), source, target, item.get("Middle_Slice")
+    )
+    return True
 
 
-def process_instance(item: dict) -> None:
-    """Process the synapse and EM images for a single instance.
+def get_instance_bounds(item: dict, coord_order: list) -> tuple[dict, Bbox, Bbox]:
+    """Compute the source and target bounding boxes of an instance.
 
     Args:
         item: Dictionary containing the metadata of the current instance.
+        coord_order: List containing the coordinate order.
+
+    Returns:
+        The crop box as dictionary and the source and target bounding boxes.
     """
     crop_bbox = item["Adjusted_Bbox"]
-    img_padding = item["Padding"]
-
-    coord_order = list(current_app.coordinate_order.keys())
 
     crop_box_dict = {
         coord_order[0] + "1": crop_bbox[0],
@@ -572,19 +1025,192 @@ def process_instance(item: dict) -> None:
         (bound_target.maxpt * list(current_app.scale.values())).astype(int),
     )
 
-    cropped_img = current_app.source_cv.download(
-        bound_source,
-        coord_resolution=current_app.coord_resolution_source,
-        mip=0,
-        parallel=True,
-    ).squeeze(axis=3)
-    cropped_gt = current_app.target_cv.download(
-        bound_target,
-        coord_resolution=current_app.coord_resolution_target,
-        mip=0,
-        parallel=True,
-    ).squeeze(axis=3)
+    return crop_box_dict, bound_source, bound_target
+
+
+def target_mip() -> int:
+    """Return the mip level at which the target volume is downloaded.
+
+    With MATCH_TARGET_MIP, the target is fetched at the mip whose resolution equals
+    the source's resolution, so that it needs no resampling. Otherwise, or if no mip
+    matches, mip 0 is used.
+
+    Returns:
+        The mip level of the target downloads.
+    """
+    if not current_app.config["MATCH_TARGET_MIP"]:
+        return 0
+    for mip in current_app.target_cv.available_mips:
+        if np.array_equal(
+            current_app.target_cv.mip_resolution(mip),
+            current_app.coord_resolution_source,
+        ):
+            return mip
+    return 0
+
+
+def mip_factor(mip: int) -> int:
+    """Return by how much a mip of the source volume is downsampled in x and y.
+
+    Args:
+        mip: The mip level of the source volume.
+
+    Returns:
+        The downsampling factor relative to mip 0.
+    """
+    if mip == 0:
+        return 1
+    axes = list(current_app.coordinate_order.keys())
+    factor = current_app.source_cv.mip_resolution(
+        mip
+    ) / current_app.source_cv.mip_resolution(0)
+    return int(factor[axes.index("x")])
+
+
+def source_tile_token(mip: int) -> str:
+    """Version the URLs of EM tiles by session and mip level.
+
+    An EM tile requested with the token of the mip it is held at never changes, so
+    it is cached forever, see file_access.send_tile. Loading the instance at
+    another mip changes the tile and thus needs another token.
+
+    Args:
+        mip: The mip level the view expects the EM slices at.
+
+    Returns:
+        The token, passed as query argument v.
+    """
+    return f"{current_app.tile_session}.{mip}"
+
+
+def grid_mip() -> int:
+    """Return the mip level at which the grid view's EM volumes are downloaded.
+
+    GRID_MIP is only used if the source volume has the mip and the mip keeps the z
+    resolution and downsamples x and y by the same integer factor.
+
+    Returns:
+        The mip level for the grid view, 0 for full resolution.
+    """
+    mip = current_app.config["GRID_MIP"]
+    if mip <= 0:
+        return 0
+
+    source_cv = current_app.source_cv
+    if mip not in source_cv.available_mips:
+        logger.warning("The source volume has no mip %d, using mip 0.", mip)
+        return 0
+
+    axes = list(current_app.coordinate_order.keys())
+    factor = source_cv.mip_resolution(mip) / source_cv.mip_resolution(0)
+    fx, fy, fz = (factor[axes.index(c)] for c in "xyz")
+    if fz != 1 or fx != fy or fx != int(fx):
+        logger.warning("Mip %d is not an isotropic xy downsampling, using 0.", mip)
+        return 0
+    return mip
+
+
+def marker_radius(mip: int) -> int:
+    """Return the radius of the synapse markers at a mip of the source volume."""
+    return max(10 // mip_factor(mip), 2)
+
+
+def plan_page_cutouts(
+    page_metadata: list[dict], mip: int = 0
+) -> dict[str, PageCutouts]:
+    """Plan chunk aligned source and target downloads for all instances of a page.
+
+    Args:
+        page_metadata: List of the instance metadata of the page.
+        mip: The mip level of the source downloads.
+
+    Returns:
+        The source and target cutouts keyed by "source" and "target".
+    """
+    coord_order = list(current_app.coordinate_order.keys())
+
+    source_bboxes, target_bboxes = {}, {}
+    for item in page_metadata:
+        _, bound_source, bound_target = get_instance_bounds(item, coord_order)
+        source_bboxes[item["Image_Index"]] = bound_source
+        target_bboxes[item["Image_Index"]] = bound_target
+
+    return {
+        "source": PageCutouts(
+            current_app.source_cv,
+            source_bboxes,
+            current_app.coord_resolution_source,
+            mip=mip,
+        ),
+        "target": PageCutouts(
+            current_app.target_cv,
+            target_bboxes,
+            current_app.coord_resolution_target,
+            mip=target_mip(),
+        ),
+    }
+
+
+def download_instance_volumes(
+    item: dict,
+    bound_source: Bbox,
+    bound_target: Bbox,
+    cutouts: Optional[dict],
+    mip: int = 0,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Retrieve the EM and synapse volumes of an instance.
+
+    Crops are cut from the page's download regions if the instance is part of
+    the plan, otherwise they are downloaded individually.
+
+    Args:
+        item: Dictionary containing the metadata of the current instance.
+        bound_source: The bounding box of the instance in the source volume.
+        bound_target: The bounding box of the instance in the target volume.
+        cutouts: The page's planned cutouts, see plan_page_cutouts.
+        mip: The mip level of the EM volume.
+
+    Returns:
+        The EM and synapse volumes of the instance.
+    """
+    cropped_img, cropped_gt = None, None
+    if cutouts is not None:
+        cropped_img = cutouts["source"].get(item["Image_Index"])
+        cropped_gt = cutouts["target"].get(item["Image_Index"])
+
+    if cropped_img is None:
+        cropped_img = current_app.source_cv.download(
+            bound_source,
+            coord_resolution=current_app.coord_resolution_source,
+            mip=mip,
+            parallel=True,
+        )
+    if cropped_gt is None:
+        cropped_gt = current_app.target_cv.download(
+            bound_target,
+            coord_resolution=current_app.coord_resolution_target,
+            mip=target_mip(),
+            parallel=True,
+        )
+
+    return cropped_img.squeeze(axis=3), cropped_gt.squeeze(axis=3)
+
 
+def transform_instance_volumes(
+    cropped_img: np.ndarray, cropped_gt: np.ndarray, img_padding: list
+) -> dict[str, np.ndarray]:
+    """Orient, resample, segment and pad the downloaded volumes of an instance.
+
+    Does not depend on the app context, so that it can run in a worker process.
+
+    Args:
+        cropped_img: The EM volume of the instance.
+        cropped_gt: The synapse volume of the instance.
+        img_padding: The padding of the instance's volumes.
+
+    Returns:
+        The padded EM volume as "img" and the binary synapse mask as "seg".
+    """
     # TODO: Remove this hardcoded transformation
     # and figure out why the NG as a different orientation
 
@@ -596,24 +1222,7 @@ def process_instance(item: dict) -> None:
     cropped_img = np.rot90(cropped_img, k=-1, axes=(0, 1))
     cropped_gt = np.rot90(cropped_gt, k=-1, axes=(0, 1))
 
-    if sum(cropped_img.shape) > sum(cropped_gt.shape):
-        cropped_gt = resize(
-            cropped_gt,
-            cropped_img.shape,
-            mode="constant",
-            preserve_range=True,
-            anti_aliasing=False,
-        )
-        cropped_gt = (cropped_gt > 0.5).astype(int)
-    elif sum(cropped_img.shape) < sum(cropped_gt.shape):
-        cropped_gt = resize(
-            cropped_gt,
-            cropped_img.shape,
-            mode="constant",
-            preserve_range=True,
-            anti_aliasing=True,
-        )
-        cropped_gt = (cropped_gt > 0.5).astype(int)
+    cropped_gt = resize_mask(cropped_gt, cropped_img.shape)
 
     cropped_seg = process_syn(cropped_gt)
 
@@ -621,14 +1230,99 @@ def process_instance(item: dict) -> None:
         cropped_img, img_padding, mode="constant", constant_values=148
     )
     cropped_seg_pad = np.pad(
-        cropped_seg, img_padding, mode="constant", constant_values=0
+        (cropped_seg > 0).astype(np.uint8), img_padding, mode="constant"
     )
 
     assert (
         cropped_img_pad.shape == cropped_seg_pad.shape
     ), "The shape of the source and target images do not match."
 
-    vis_label = None
+    return {"img": cropped_img_pad, "seg": cropped_seg_pad}
+
+
+def process_instance(item: dict, cutouts: Optional[dict] = None, mip: int = 0) -> None:
+    """Process the synapse and EM images for a single instance.
+
+    Runs the stages of the page pipeline one after the other, see
+    retrieve_instance_metadata.
+
+    Args:
+        item: Dictionary containing the metadata of the current instance.
+        cutouts: The page's planned cutouts, if None the instance is downloaded
+            individually.
+        mip: The mip level of the EM volume, 0 for full resolution.
+    """
+    state = download_instance(item, cutouts, mip)
+    if state is not None:
+        store_instance(segment_instance(state))
+
+
+def download_instance(
+    item: dict, cutouts: Optional[dict] = None, mip: int = 0
+) -> Optional[dict]:
+    """Download the volumes of an instance, unless it is in the tile cache.
+
+    Args:
+        item: Dictionary containing the metadata of the current instance.
+        cutouts: The page's planned cutouts, if None the instance is downloaded
+            individually.
+        mip: The mip level of the EM volume, 0 for full resolution.
+
+    Returns:
+        The instance's state for segment_instance, None if it was loaded from the
+        tile cache.
+    """
+    coord_order = list(current_app.coordinate_order.keys())
+
+    cache_key = instance_cache_key(item, mip)
+    if load_instance_from_cache(item, cache_key, mip):
+        return None
+
+    crop_box_dict, bound_source, bound_target = get_instance_bounds(item, coord_order)
+
+    cropped_img, cropped_gt = download_instance_volumes(
+        item, bound_source, bound_target, cutouts, mip
+    )
+    return {
+        "item": item,
+        "cache_key": cache_key,
+        "mip": mip,
+        "crop_box_dict": crop_box_dict,
+        "cropped_img": cropped_img,
+        "cropped_gt": cropped_gt,
+    }
+
+
+def segment_instance(state: dict) -> dict:
+    """Segment the downloaded volumes of an instance and place its markers.
+
+    Args:
+        state: The instance's state returned by download_instance.
+
+    Returns:
+        The instance's state for store_instance.
+    """
+    item = state["item"]
+    coord_order = list(current_app.coordinate_order.keys())
+
+    # coarser mips shrink the instance, and its padding, in x and y
+    factor = mip_factor(state["mip"])
+    img_padding = [
+        [before // factor, after // factor] if axis != "z" else [before, after]
+        for axis, (before, after) in zip(coord_order, item["Padding"])
+    ]
+
+    # the CPU-bound part runs in the worker processes, if configured
+    volumes = current_app.cpu_pool.run(
+        transform_instance_volumes,
+        {
+            "cropped_img": state.pop("cropped_img"),
+            "cropped_gt": state.pop("cropped_gt"),
+        },
+        img_padding=img_padding,
+    )
+
+    markers = []
     if item["Error_Description"] != "False Negative":
         (
             pre_pt_x,
@@ -637,7 +1331,9 @@ def process_instance(item: dict) -> None:
             post_pt_x,
             post_pt_y,
             post_pt_z,
-        ) = adjust_synapse_points(item, crop_box_dict, img_padding, coord_order)
+        ) = adjust_synapse_points(
+            item, state["crop_box_dict"], item["Padding"], coord_order
+        )
 
         (
             pre_pt_x,
@@ -649,37 +1345,58 @@ def process_instance(item: dict) -> None:
         ) = scale_synapse_points(
             pre_pt_x, pre_pt_y, pre_pt_z, post_pt_x, post_pt_y, post_pt_z
         )
+        pre_pt_x, pre_pt_y = pre_pt_x // factor, pre_pt_y // factor
+        post_pt_x, post_pt_y = post_pt_x // factor, post_pt_y // factor
 
-        vis_label = syn2rgb(cropped_seg_pad)
+        markers = [
+            (
+                pre_pt_x,
+                pre_pt_y,
+                pre_pt_z,
+                current_app.pre_id_color_main,
+                current_app.pre_id_color_sub,
+            ),
+            (
+                post_pt_x,
+                post_pt_y,
+                post_pt_z,
+                current_app.post_id_color_main,
+                current_app.post_id_color_sub,
+            ),
+        ]
 
-        vis_label = draw_cylinder(
-            vis_label,
-            pre_pt_x,
-            pre_pt_y,
-            pre_pt_z,
-            radius=10,
-            color_main=current_app.pre_id_color_main,
-            color_sub=current_app.pre_id_color_sub,
-            layout=coord_order,
-        )
-        vis_label = draw_cylinder(
-            vis_label,
-            post_pt_x,
-            post_pt_y,
-            post_pt_z,
-            radius=10,
-            color_main=current_app.post_id_color_main,
-            color_sub=current_app.post_id_color_sub,
-            layout=coord_order,
-        )
+    state.update(
+        cropped_img_pad=volumes["img"],
+        cropped_seg_pad=volumes["seg"],
+        markers=markers,
+    )
+    return state
 
-    save_slices_in_memory(
-        cropped_img_pad,
-        vis_label,
+
+def store_instance(state: dict) -> None:
+    """Store the volumes of a segmented instance.
+
+    The volumes are held in memory and written to the tile cache. Only the middle
+    slice, which the grid view shows first, is encoded here, the other slices are
+    encoded when they are requested, see store_instance_slices.
+
+    Args:
+        state: The instance's state returned by segment_instance.
+    """
+    item = state["item"]
+
+    entry = save_instance_in_memory(
+        state["cropped_img_pad"],
+        state["cropped_seg_pad"],
+        state["markers"],
         item,
-        coord_order,
+        list(current_app.coordinate_order.keys()),
+        state["cache_key"],
+        state["mip"],
     )
 
+    current_app.tile_cache.put(state["cache_key"], entry)
+
 
 def apply_transparency(image: np.ndarray, color: Optional[tuple] = None) -> Image:
     """Reduce the opacity of all black pixels to zero in an RGBA image.
@@ -690,28 +1407,28 @@ def apply_transparency(image: np.ndarray, color: Optional[tuple] = None) -> Imag
     Returns:
         The image with transparency applied to black pixels.
     """
-    image = np.array(Image.fromarray(image).convert("RGBA"))
-
-    # the coloring function is so far only used for the auto segmentation results
-    # if color is not None:
-    #    image = np.copy(image)
+    image = np.asarray(image, dtype=np.uint8)
+    if image.ndim == 2:
+        image = np.repeat(image[..., np.newaxis], 3, axis=-1)
+    if image.shape[-1] == 3:
+        alpha = np.full(image.shape[:-1] + (1,), 255, dtype=np.uint8)
+        image = np.concatenate([image, alpha], axis=-1)
+    else:
+        image = image.copy()
 
-    r, g, b, a = np.rollaxis(image, axis=-1)  # split into 4 n x m arrays
-    r_m = r != 0  # binary mask for red channel, True for all non black values
-    g_m = g != 0  # binary mask for green channel, True for all non black values
-    b_m = b != 0  # binary mask for blue channel, True for all non black values
+    # binary mask per color channel, True for all non black values
+    mask = image[..., :3] != 0
 
     # apply color
     if color is not None:
-        r[r_m] = color[0]
-        g[g_m] = color[1]
-        b[b_m] = color[2]
+        image[..., :3] = np.where(
+            mask, np.asarray(color, dtype=np.uint8), image[..., :3]
+        )
 
-    # combine the three binary masks by multiplying them (1*1=1, 1*0=0, 0*1=0, 0*0=0)
-    # multiply the combined binary mask with the alpha channel
-    a = a * ((r_m == 1) | (g_m == 1) | (b_m == 1))
+    # keep the alpha channel only where any of the color channels is non black
+    image[..., 3] *= mask.any(axis=-1)
 
-    return Image.fromarray(np.dstack([r, g, b, a]), "RGBA")
+    return Image.fromarray(image, "RGBA")
 
 
 def load_cloud_volumes(
@@ -729,31 +1446,57 @@ def load_cloud_volumes(
         neuropil_url: URL to the neuropil cloud volume (neuron segmentation).
         bucket_secret_json: Path to the JSON file with bucket secrets.
     """
-    current_app.source_cv = CloudVolume(
-        source_url,
-        secrets=bucket_secret_json,
-        fill_missing=True,
-        parallel=True,
-        progress=False,
-        use_https=True,
-    )
-    current_app.target_cv = CloudVolume(
-        target_url,
-        secrets=bucket_secret_json,
-        fill_missing=True,
-        parallel=True,
-        progress=False,
-        use_https=True,
-    )
+    # the handles are shared by the workspaces that open the same volumes
+    current_app.source_cv = shared_cloud_volume(source_url, bucket_secret_json)
+    current_app.target_cv = shared_cloud_volume(target_url, bucket_secret_json)
     if neuropil_url:
-        current_app.neuropil_cv = CloudVolume(
-            neuropil_url,
+        current_app.neuropil_cv = shared_cloud_volume(neuropil_url, bucket_secret_json)
+
+
+def shared_cloud_volume(url: str, bucket_secret_json: str) -> CloudVolume:
+    """Open a cloud volume once for all workspaces.
+
+    Args:
+        url: URL to the cloud volume.
+        bucket_secret_json: Path to the JSON file with bucket secrets.
+
+    Returns:
+        The cloud volume.
+    """
+    return current_app.workspaces.shared(
+        ("cloud_volume", url, bucket_secret_json),
+        partial(
+            CloudVolume,
+            url,
             secrets=bucket_secret_json,
             fill_missing=True,
             parallel=True,
             progress=False,
             use_https=True,
-        )
+        ),
+    )
+
+
+def load_materialization_table(path: str) -> pd.DataFrame:
+    """Read a materialization table once for all workspaces.
+
+    Only the used columns are read, from a memory-mapped cache of the CSV file if
+    MATERIALIZATION_CACHE_DIR is set, see materialization.read_materialization.
+
+    Args:
+        path: Path to the CSV file of the materialization table.
+
+    Returns:
+        A shallow copy of the shared table, columns the workspace assigns do not
+        affect the other workspaces.
+    """
+    cache_dir = current_app.config["MATERIALIZATION_CACHE_DIR"]
+    # a changed CSV file is read again
+    key = ("materialization", path, os.path.getmtime(path))
+    table = current_app.workspaces.shared(
+        key, partial(read_materialization, path, cache_dir)
+    )
+    return table.copy(deep=False)
 
 
 def determine_volume_dimensions() -> tuple:
@@ -0,0 +1,303 @@
+import datetime
+import gzip
+import io
+import json
+import logging
+import zlib
+from typing import IO, Iterable, Iterator
+
+import numpy as np
+import orjson
+import pandas as pd
+
+from synanno.backend.metadata_store import ARRAY_SHAPES
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# the export formats with their mimetype and file extension
+EXPORT_FORMATS = {
+    "json": ("application/json", "json"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# the number of instances encoded, or written as row group, at once
+CHUNK_ROWS = 2048
+
+# the key of the proofread time in the Parquet schema's metadata
+PROOFREAD_TIME_KEY = b"synanno.proofread_time"
+
+GZIP_MAGIC = b"\x1f\x8b"
+PARQUET_MAGIC = b"PAR1"
+
+
+def encode_default(obj):
+    """Encode the values orjson does not serialize natively."""
+    if isinstance(obj, datetime.timedelta):
+        return str(obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError("Type %s not serializable" % type(obj))
+
+
+def dumps(obj) -> bytes:
+    """Encode an object as JSON, numpy values included."""
+    return orjson.dumps(
+        obj,
+        default=encode_default,
+        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+    )
+
+
+def iter_records(frame: pd.DataFrame) -> Iterator[list[dict]]:
+    """Convert the metadata to records chunk by chunk, NaN becomes None."""
+    for start in range(0, len(frame), CHUNK_ROWS):
+        stop = start + CHUNK_ROWS
+        chunk = frame.iloc[start:stop]
+        yield chunk.astype(object).where(chunk.notna(), None).to_dict("records")
+
+
+def iter_json(proofread_time: dict, frame: pd.DataFrame) -> Iterator[bytes]:
+    """Encode a session like the JSON export always did, one chunk at a time.
+
+    Args:
+        proofread_time: The proofreading timer of the session.
+        frame: The metadata of the session.
+
+    Yields:
+        The parts of the JSON document.
+    """
+    yield b'{"Proofread Time":' + dumps(proofread_time) + b',"Metadata":['
+    first = True
+    for records in iter_records(frame):
+        encoded = b",".join(dumps(record) for record in records)
+        yield encoded if first else b"," + encoded
+        first = False
+    yield b"]}"
+
+
+def iter_jsonl(proofread_time: dict, frame: pd.DataFrame) -> Iterator[bytes]:
+    """Encode a session as JSON lines, the proofread time followed by the records.
+
+    Args:
+        proofread_time: The proofreading timer of the session.
+        frame: The metadata of the session.
+
+    Yields:
+        The lines of the export.
+    """
+    yield dumps({"Proofread Time": proofread_time}) + b"\n"
+    for records in iter_records(frame):
+        yield b"".join(dumps(record) + b"\n" for record in records)
+
+
+class ChunkSink(io.RawIOBase):
+    """A writable file that hands out the bytes written to it since the last call."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        """Return and forget the bytes written since the last call."""
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def uniform_columns(frame: pd.DataFrame) -> pd.DataFrame:
+    """Convert the values of object columns holding several types to strings.
+
+    E.g. the neuron_id of a false negative is -1, while the other instances of a
+    volume session hold a note that no neuron is selected. Parquet columns hold
+    a single type.
+
+    Args:
+        frame: The metadata, modified in place.
+
+    Returns:
+        The metadata.
+    """
+    for column in frame.columns[frame.dtypes == object]:
+        values = frame[column]
+        if pd.api.types.infer_dtype(values, skipna=True).startswith("mixed"):
+            frame[column] = values.where(values.isna(), values.astype(str))
+    return frame
+
+
+def to_arrow(frame: pd.DataFrame, proofread_time: dict):
+    """Convert the metadata to an Arrow table with fixed-width bbox columns.
+
+    Args:
+        frame: The metadata of the session.
+        proofread_time: The proofreading timer, kept in the schema's metadata.
+
+    Returns:
+        The Arrow table.
+
+    Raises:
+        ValueError: If a column cannot be converted.
+    """
+    import pyarrow as pa
+
+    array_columns = [column for column in ARRAY_SHAPES if column in frame]
+    try:
+        table = pa.Table.from_pandas(
+            uniform_columns(frame.drop(columns=array_columns)), preserve_index=False
+        )
+    except pa.ArrowException as exc:
+        raise ValueError(f"The session cannot be exported as Parquet: {exc}") from exc
+    for column in array_columns:
+        shape = ARRAY_SHAPES[column]
+        values = np.asarray(frame[column].tolist(), dtype=np.int64).reshape(
+            (len(frame),) + shape
+        )
+        array = pa.array(values.reshape(-1))
+        for width in reversed(shape):
+            array = pa.FixedSizeListArray.from_arrays(array, width)
+        table = table.append_column(column, array)
+
+    metadata = dict(table.schema.metadata or {})
+    metadata[PROOFREAD_TIME_KEY] = dumps(proofread_time)
+    return table.replace_schema_metadata(metadata)
+
+
+def iter_parquet(table) -> Iterator[bytes]:
+    """Encode a session as Parquet, one row group at a time.
+
+    Args:
+        table: The session as Arrow table, see to_arrow.
+
+    Yields:
+        The parts of the Parquet file.
+    """
+    import pyarrow.parquet as pq
+
+    sink = ChunkSink()
+    with pq.ParquetWriter(sink, table.schema, compression="zstd") as writer:
+        for batch in table.to_batches(max_chunksize=CHUNK_ROWS):
+            writer.write_batch(batch)
+            yield sink.take()
+    yield sink.take()
+
+
+def gzip_stream(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Compress a stream of bytes to a gzip file on the fly."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_session(
+    proofread_time: dict, frame: pd.DataFrame, fmt: str = "json", compress=False
+) -> Iterator[bytes]:
+    """Stream the export of a session.
+
+    Args:
+        proofread_time: The proofreading timer of the session.
+        frame: The metadata of the session.
+        fmt: One of EXPORT_FORMATS.
+        compress: Gzip the JSON formats, Parquet is always compressed.
+
+    Returns:
+        The parts of the export.
+
+    Raises:
+        ImportError: If Parquet is requested but pyarrow is not installed, the
+            error is raised before the first part is produced.
+        ValueError: If the metadata cannot be converted to Parquet, also raised
+            before the first part.
+    """
+    if fmt == "parquet":
+        # converted up front, so that errors surface before the response starts
+        return iter_parquet(to_arrow(frame, proofread_time))
+    if fmt == "jsonl":
+        chunks = iter_jsonl(proofread_time, frame)
+    elif fmt == "json":
+        chunks = iter_json(proofread_time, frame)
+    else:
+        raise ValueError(f"Unknown export format {fmt}.")
+    return gzip_stream(chunks) if compress else chunks
+
+
+def read_session(file: IO[bytes]) -> tuple[dict, pd.DataFrame]:
+    """Read a session exported in any of the EXPORT_FORMATS, gzipped or not.
+
+    Args:
+        file: The exported session, opened in binary mode.
+
+    Returns:
+        The proofread time, None if missing, and the metadata records as frame.
+
+    Raises:
+        ValueError: If the file holds no session.
+    """
+    head = file.read(4)
+    file.seek(0)
+    if head.startswith(GZIP_MAGIC):
+        file = gzip.GzipFile(fileobj=file)
+        head = file.peek(4)[:4]
+
+    if head == PARQUET_MAGIC:
+        return read_parquet(file)
+
+    # a JSON lines export starts with a line holding only the proofread time
+    first_line = file.readline()
+    try:
+        header = orjson.loads(first_line)
+    except orjson.JSONDecodeError:
+        header = None
+
+    if isinstance(header, dict) and "Metadata" not in header:
+        records = [orjson.loads(line) for line in file if line.strip()]
+        return header.get("Proofread Time"), pd.DataFrame(records)
+
+    if header is None:
+        content = first_line + file.read()
+        try:
+            document = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # the exports of earlier versions may hold NaN, which orjson rejects
+            document = json.loads(content)
+    else:
+        document = header
+    if not isinstance(document, dict) or "Metadata" not in document:
+        raise ValueError("Invalid JSON format: 'Metadata' key is missing!")
+    return document.get("Proofread Time"), pd.DataFrame(document["Metadata"])
+
+
+def read_parquet(file: IO[bytes]) -> tuple[dict, pd.DataFrame]:
+    """Read a session exported as Parquet, see iter_parquet."""
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(file)
+    array_columns = [column for column in ARRAY_SHAPES if column in table.schema.names]
+    frame = table.drop(array_columns).to_pandas()
+    for column in array_columns:
+        values = table.column(column).combine_chunks()
+        for _ in ARRAY_SHAPES[column]:
+            values = values.flatten()
+        shape = (table.num_rows,) + ARRAY_SHAPES[column]
+        frame[column] = values.to_numpy().reshape(shape).tolist()
+
+    metadata = table.schema.metadata or {}
+    proofread_time = (
+        orjson.loads(metadata[PROOFREAD_TIME_KEY])
+        if PROOFREAD_TIME_KEY in metadata
+        else None
+    )
+    return proofread_time, frame
@@ -0,0 +1,235 @@
+import logging
+import os
+import sqlite3
+import threading
+from typing import Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (scope TEXT PRIMARY KEY, session TEXT);
+CREATE TABLE IF NOT EXISTS tiles (
+    scope TEXT NOT NULL,
+    image_index TEXT NOT NULL,
+    layer TEXT NOT NULL,
+    slice_id TEXT NOT NULL,
+    page INTEGER,
+    mimetype TEXT NOT NULL,
+    etag TEXT NOT NULL,
+    data BLOB NOT NULL,
+    mip INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, image_index, layer, slice_id)
+);
+CREATE INDEX IF NOT EXISTS tiles_page ON tiles (scope, page);
+"""
+
+
+class SharedTileStore:
+    """Shares the encoded tiles of the current session between worker processes.
+
+    The worker that builds the pages publishes every layer it loads or rewrites to
+    an SQLite database in WAL mode. Any other worker of the same host can then
+    answer tile requests from the database while the pages are being built.
+    The tiles are scoped by workspace, publishing under a new session replaces the
+    tiles the workspace published for its previous session.
+
+    Args:
+        path: The path of the SQLite database.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        db = self._connection()
+        columns = {row[1] for row in db.execute("PRAGMA table_info(tiles)")}
+        if columns and "mip" not in columns:
+            # the tiles of an earlier version, they are published again when used
+            db.execute("DROP TABLE tiles")
+        db.executescript(SCHEMA)
+
+    def publish(
+        self,
+        scope: str,
+        session: str,
+        image_index: str,
+        layer: str,
+        page: Optional[int],
+        tiles: list[tuple[str, bytes, str, str]],
+        mip: int = 0,
+    ) -> None:
+        """Replace the tiles of an instance's layer.
+
+        Args:
+            scope: The workspace the tiles belong to.
+            session: The session the tiles belong to.
+            image_index: The image index of the instance.
+            layer: The layer of the tiles, e.g. source, target or curve.
+            page: The page of the instance.
+            tiles: The z index, encoded bytes, mimetype and ETag of every tile, an
+                empty list removes the layer.
+            mip: The mip level the tiles were rendered at.
+        """
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT session FROM sessions WHERE scope = ?", (scope,)
+            ).fetchone()
+            if row is None or row[0] != session:
+                db.execute("DELETE FROM tiles WHERE scope = ?", (scope,))
+                db.execute(
+                    "INSERT OR REPLACE INTO sessions (scope, session) VALUES (?, ?)",
+                    (scope, session),
+                )
+            db.execute(
+                "DELETE FROM tiles WHERE scope = ? AND image_index = ? AND layer = ?",
+                (scope, image_index, layer),
+            )
+            db.executemany(
+                "INSERT INTO tiles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        scope,
+                        image_index,
+                        layer,
+                        slice_id,
+                        page,
+                        mimetype,
+                        etag,
+                        data,
+                        mip,
+                    )
+                    for slice_id, data, mimetype, etag in tiles
+                ],
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def drop(self, scope: str) -> None:
+        """Remove the tiles of a workspace."""
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("DELETE FROM tiles WHERE scope = ?", (scope,))
+            db.execute("DELETE FROM sessions WHERE scope = ?", (scope,))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def session(self, scope: str) -> Optional[str]:
+        """Return the session whose tiles a workspace published, None if none."""
+        row = (
+            self._connection()
+            .execute("SELECT session FROM sessions WHERE scope = ?", (scope,))
+            .fetchone()
+        )
+        return row[0] if row is not None else None
+
+    def has_tile(self, scope: str, image_index: str, layer: str, slice_id: str) -> bool:
+        """Whether a tile is published."""
+        row = (
+            self._connection()
+            .execute(
+                "SELECT 1 FROM tiles WHERE scope = ? AND image_index = ? "
+                "AND layer = ? AND slice_id = ?",
+                (scope, image_index, layer, slice_id),
+            )
+            .fetchone()
+        )
+        return row is not None
+
+    def get_tile(
+        self, scope: str, image_index: str, layer: str, slice_id: str
+    ) -> Optional[tuple[bytes, str, str, int]]:
+        """Read a published tile.
+
+        Args:
+            scope: The workspace the tile belongs to.
+            image_index: The image index of the instance.
+            layer: The layer of the tile.
+            slice_id: The z index of the tile.
+
+        Returns:
+            The tile's encoded bytes, mimetype, ETag and mip level, None if it is
+            not published.
+        """
+        row = (
+            self._connection()
+            .execute(
+                "SELECT data, mimetype, etag, mip FROM tiles WHERE scope = ? "
+                "AND image_index = ? AND layer = ? AND slice_id = ?",
+                (scope, image_index, layer, slice_id),
+            )
+            .fetchone()
+        )
+        return (bytes(row[0]), row[1], row[2], row[3]) if row is not None else None
+
+    def instance_tiles(
+        self, scope: str, image_index: str, slice_ids: Optional[list[str]] = None
+    ) -> list[tuple[dict, bytes]]:
+        """Read the published EM and segmentation tiles of an instance.
+
+        Args:
+            scope: The workspace the tiles belong to.
+            image_index: The image index of the instance.
+            slice_ids: The z indices to read, all published slices if None.
+
+        Returns:
+            The description and the encoded bytes of every tile, ordered like
+            tile_bundle.collect_instance_tiles.
+        """
+        rows = (
+            self._connection()
+            .execute(
+                "SELECT slice_id, layer, mimetype, data FROM tiles "
+                "WHERE scope = ? AND image_index = ? "
+                "AND layer IN ('source', 'target') "
+                "ORDER BY CAST(slice_id AS INTEGER), layer",
+                (scope, image_index),
+            )
+            .fetchall()
+        )
+        wanted = set(slice_ids) if slice_ids is not None else None
+        return [
+            (
+                {
+                    "image_index": image_index,
+                    "slice": slice_id,
+                    "layer": layer,
+                    "mimetype": mimetype,
+                },
+                bytes(data),
+            )
+            for slice_id, layer, mimetype, data in rows
+            if wanted is None or slice_id in wanted
+        ]
+
+    def page_instances(self, scope: str, page: int) -> list[str]:
+        """List the instances a workspace published for a page."""
+        rows = (
+            self._connection()
+            .execute(
+                "SELECT DISTINCT image_index FROM tiles WHERE scope = ? AND page = ? "
+                "ORDER BY CAST(image_index AS INTEGER)",
+                (scope, page),
+            )
+            .fetchall()
+        )
+        return [row[0] for row in rows]
+
+    def _connection(self) -> sqlite3.Connection:
+        """Open the database once per thread, connections cannot be shared."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
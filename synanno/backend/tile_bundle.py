@@ -0,0 +1,163 @@
+import json
+import logging
+import struct
+from collections.abc import Mapping
+from typing import Optional
+
+from flask import current_app
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# the bundle starts with the byte length of its JSON index
+INDEX_LENGTH = struct.Struct(">I")
+
+
+def tile_etag(slices: Mapping, image_index: str, layer: str, slice_id: str) -> str:
+    """Derive the ETag of a tile without reading or encoding it.
+
+    EM tiles with a content key are identified by their content. All other tiles
+    are identified by the session and the version of their layer, which is bumped
+    whenever the layer is rewritten.
+
+    Args:
+        slices: The store holding the tile.
+        image_index: The image index of the instance.
+        layer: The layer of the tile, e.g. source, target or curve.
+        slice_id: The z index of the tile.
+
+    Returns:
+        The ETag of the tile.
+    """
+    content_key = getattr(slices, "content_key", None)
+    if layer == "source" and content_key is not None:
+        return f"{content_key}-{slice_id}"
+    version = current_app.tile_versions[(image_index, layer)]
+    return f"{current_app.tile_session}-{image_index}-{layer}-{slice_id}-{version}"
+
+
+def collect_instance_tiles(
+    image_index: str, slice_ids: Optional[list[str]] = None, encoded_only: bool = False
+) -> list[tuple[dict, bytes]]:
+    """Gather the EM and segmentation slices of an instance from memory.
+
+    Instances not loaded by this worker are read from the shared tile store, if
+    configured.
+
+    Args:
+        image_index: The image index of the instance.
+        slice_ids: The z indices to gather, all loaded slices if None.
+        encoded_only: Skip the slices that were not encoded yet instead of
+            encoding them, e.g. for page bundles that only hold the shown slices.
+
+    Returns:
+        The description and the encoded bytes of every available slice.
+    """
+    # workers that do not build the pages serve the shared tiles
+    if (
+        image_index not in current_app.source_image_data
+        and current_app.shared_tiles is not None
+    ):
+        return current_app.shared_tiles.instance_tiles(
+            current_app.workspaces.current_id(), image_index, slice_ids
+        )
+
+    source = current_app.source_image_data.get(image_index, {})
+    target = current_app.target_image_data.get(image_index, {})
+
+    if slice_ids is None and encoded_only and hasattr(source, "encoded_keys"):
+        slice_ids = source.encoded_keys()
+    elif slice_ids is None:
+        slice_ids = [key for key in source if key.isdigit()]
+
+    # decompress each volume once instead of once per slice
+    for slices in (source, target):
+        if hasattr(slices, "encode_slices"):
+            slices.encode_slices(slice_ids)
+
+    tiles = []
+    for slice_id in slice_ids:
+        for layer, slices in (("source", source), ("target", target)):
+            if slice_id in slices:
+                tile = {
+                    "image_index": image_index,
+                    "slice": slice_id,
+                    "layer": layer,
+                    "mimetype": getattr(slices, "mimetype", "image/png"),
+                }
+                tiles.append((tile, slices[slice_id]))
+    return tiles
+
+
+def instance_manifest(image_index: str) -> Optional[dict]:
+    """List the slices available in memory for each layer of an instance.
+
+    Args:
+        image_index: The image index of the instance.
+
+    Returns:
+        The z indices per layer and the layers' versions, None if the instance is
+        not loaded.
+    """
+    if image_index not in current_app.source_image_data:
+        return None
+
+    layers = {"source": current_app.source_image_data[image_index]}
+    target = current_app.target_image_data.get(image_index, {})
+    layers["target"] = target
+    layers.update({key: target[key] for key in target if not key.isdigit()})
+
+    manifest = {
+        layer: sorted((key for key in slices if key.isdigit()), key=int)
+        for layer, slices in layers.items()
+    }
+    manifest["versions"] = {
+        layer: current_app.tile_versions.get((image_index, layer), 0)
+        for layer in layers
+    }
+    return manifest
+
+
+def pack_tile_bundle(tiles: list[tuple[dict, bytes]]) -> bytes:
+    """Concatenate tiles into a single length-prefixed binary bundle.
+
+    The bundle holds a 4 byte big-endian length, a JSON index of that length
+    listing every tile with the offset and length of its bytes, and the tiles'
+    bytes back to back. Offsets are relative to the end of the index.
+
+    Args:
+        tiles: The description and the encoded bytes of every tile.
+
+    Returns:
+        The bundle.
+    """
+    index, offset = [], 0
+    for tile, data in tiles:
+        index.append({**tile, "offset": offset, "length": len(data)})
+        offset += len(data)
+
+    index_bytes = json.dumps({"tiles": index}).encode("utf-8")
+    return b"".join(
+        [INDEX_LENGTH.pack(len(index_bytes)), index_bytes] + [data for _, data in tiles]
+    )
+
+
+def unpack_tile_bundle(bundle: bytes) -> list[tuple[dict, bytes]]:
+    """Split a bundle created with pack_tile_bundle into its tiles.
+
+    Args:
+        bundle: The bundle.
+
+    Returns:
+        The description and the encoded bytes of every tile.
+    """
+    (index_length,) = INDEX_LENGTH.unpack_from(bundle)
+    index_start, body_start = INDEX_LENGTH.size, INDEX_LENGTH.size + index_length
+    index = json.loads(bundle[index_start:body_start])
+
+    tiles = []
+    for tile in index["tiles"]:
+        start = body_start + tile["offset"]
+        end = start + tile["length"]
+        tiles.append((tile, bundle[start:end]))
+    return tiles
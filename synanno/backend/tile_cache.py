@@ -0,0 +1,158 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import zipfile
+from typing import Optional
+
+from .utils import NpEncoder
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# eviction frees the cache down to this fraction of its size cap
+LOW_WATER_RATIO = 0.9
+
+
+class TileCache:
+    """Content-addressed on-disk cache for the tiles of processed instances.
+
+    Every entry is a ZIP archive holding named byte blobs, stored under the hash of
+    the parameters that produced it. The modification time of an entry doubles as
+    its last access time, the least recently used entries are evicted as soon as
+    the cache grows beyond its size cap. Eviction frees space down to a low-water
+    mark below the cap, so that the directory is not scanned on every put once the
+    cache is full.
+
+    Args:
+        cache_dir: Directory holding the cache entries.
+        max_size_bytes: Size cap of the cache, a value of 0 disables the cache.
+    """
+
+    def __init__(self, cache_dir: str, max_size_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        self._lock = threading.Lock()
+        self._size_bytes = 0
+
+        if self.enabled:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._size_bytes = sum(
+                os.path.getsize(path) for path, _ in self._list_entries()
+            )
+
+    @property
+    def enabled(self) -> bool:
+        """Whether the cache stores and returns entries."""
+        return self.max_size_bytes > 0
+
+    @staticmethod
+    def make_key(**params) -> str:
+        """Derive the content address of an entry from its parameters.
+
+        Args:
+            params: JSON serializable parameters that determine the entry's content.
+
+        Returns:
+            The hex digest identifying the entry.
+        """
+        serialized = json.dumps(params, sort_keys=True, cls=NpEncoder)
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[dict[str, bytes]]:
+        """Load an entry and mark it as recently used.
+
+        Args:
+            key: The content address of the entry.
+
+        Returns:
+            The entry's blobs by name or None if the entry is not cached.
+        """
+        if not self.enabled:
+            return None
+
+        path = self._entry_path(key)
+        try:
+            with zipfile.ZipFile(path, "r") as archive:
+                entry = {name: archive.read(name) for name in archive.namelist()}
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, zipfile.BadZipFile) as exc:
+            logger.warning("Discarding unreadable tile cache entry %s: %s", key, exc)
+            with self._lock:
+                self._size_bytes -= self._remove(path)
+            return None
+        return entry
+
+    def put(self, key: str, entry: dict[str, bytes]) -> None:
+        """Store an entry and evict the least recently used entries if needed.
+
+        Args:
+            key: The content address of the entry.
+            entry: The blobs to store by name.
+        """
+        if not self.enabled or not entry:
+            return
+
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # write to a temporary file first so readers never see partial entries
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                with zipfile.ZipFile(tmp_file, "w", zipfile.ZIP_STORED) as archive:
+                    for name, blob in entry.items():
+                        archive.writestr(name, blob)
+            previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+        except OSError as exc:
+            logger.warning("Failed to write tile cache entry %s: %s", key, exc)
+            self._remove(tmp_path)
+            return
+
+        with self._lock:
+            self._size_bytes += os.path.getsize(path) - previous_size
+            if self._size_bytes > self.max_size_bytes:
+                self._evict()
+
+    def _entry_path(self, key: str) -> str:
+        """Return the path of an entry, sharded by the first two hex digits."""
+        return os.path.join(self.cache_dir, key[:2], key + ".zip")
+
+    def _list_entries(self) -> list[tuple[str, float]]:
+        """List the paths and last access times of all entries."""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for file_name in files:
+                if file_name.endswith(".zip"):
+                    path = os.path.join(root, file_name)
+                    try:
+                        entries.append((path, os.path.getmtime(path)))
+                    except FileNotFoundError:
+                        continue
+        return entries
+
+    def _evict(self) -> None:
+        """Remove the least recently used entries until the cache is below its
+        low-water mark."""
+        low_water_bytes = self.max_size_bytes * LOW_WATER_RATIO
+        for path, _ in sorted(self._list_entries(), key=lambda entry: entry[1]):
+            if self._size_bytes <= low_water_bytes:
+                break
+            self._size_bytes -= self._remove(path)
+        logger.info("Tile cache evicted to %d bytes.", self._size_bytes)
+
+    @staticmethod
+    def _remove(path: str) -> int:
+        """Remove a file and return the number of bytes freed."""
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            return size
+        except FileNotFoundError:
+            return 0
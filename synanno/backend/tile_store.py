@@ -0,0 +1,260 @@
+import itertools
+import logging
+import math
+import threading
+from collections.abc import Mapping, MutableMapping
+from functools import partial
+from typing import Callable, Iterator, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def entry_nbytes(value) -> int:
+    """Approximate the memory held by a stored instance layer or one of its entries.
+
+    Args:
+        value: Instance slices, a dict of encoded slices or encoded bytes.
+
+    Returns:
+        The size in bytes.
+    """
+    if hasattr(value, "nbytes"):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, Mapping):
+        return sum(entry_nbytes(v) for v in value.values())
+    return 0
+
+
+class TileLayer(MutableMapping):
+    """One layer (source or target) of a TileStore, keyed by image index.
+
+    Behaves like the defaultdict(dict) it replaces: accessing an unknown instance
+    creates an empty entry. Accessing an evicted instance loads it again. get(),
+    iteration and len() only consider the instances held in memory.
+
+    Args:
+        store: The store holding the layer.
+        name: The name of the layer.
+    """
+
+    def __init__(self, store: "TileStore", name: str):
+        self.store = store
+        self.name = name
+
+    def __getitem__(self, image_index: str):
+        return self.store.get_layer(self.name, image_index)
+
+    def __setitem__(self, image_index: str, value) -> None:
+        self.store.set_layer(self.name, image_index, value)
+
+    def __delitem__(self, image_index: str) -> None:
+        self.store.delete_layer(self.name, image_index)
+
+    def __contains__(self, image_index: object) -> bool:
+        return self.store.has_layer(self.name, image_index)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.store.resident(self.name))
+
+    def __len__(self) -> int:
+        return len(self.store.resident(self.name))
+
+    def get(self, image_index: str, default=None):
+        """Return the layer of an instance held in memory, without loading it."""
+        return self.store.resident(self.name).get(image_index, default)
+
+
+class TileStore:
+    """Memory-budgeted store of the instances' source and target slices.
+
+    Tracks the memory held by the loaded instances. Once the budget is exceeded, the
+    instances furthest from the page the user is viewing are evicted first, ties
+    are broken by the least recent access. Instances with drawn masks are pinned,
+    since their masks cannot be restored. Evicted instances are loaded again when
+    they are accessed. Layers that grow after they are stored, such as instance
+    slices encoding their slices on request, report their growth through their
+    on_grow attribute, and the budget is enforced again.
+
+    Args:
+        budget_bytes: The memory budget, a value of 0 disables eviction.
+        loader: Loads an evicted instance into the store again by its image index
+            and the mip level its EM slices were held at.
+        page_of: Returns the page of every known instance by image index.
+    """
+
+    def __init__(
+        self,
+        budget_bytes: int,
+        loader: Optional[Callable[[str, int], None]] = None,
+        page_of: Optional[Callable[[], dict[str, int]]] = None,
+    ):
+        self.budget_bytes = budget_bytes
+        self.loader = loader
+        self.page_of = page_of
+        self.current_page: Optional[int] = None
+        self.source = TileLayer(self, "source")
+        self.target = TileLayer(self, "target")
+        self._layers: dict[str, dict] = {"source": {}, "target": {}}
+        self._evicted: dict[str, set[str]] = {}
+        self._evicted_mips: dict[str, int] = {}
+        self._loading: dict[str, tuple[threading.Event, int]] = {}
+        self._last_access: dict[str, int] = {}
+        self._clock = itertools.count()
+        self._lock = threading.RLock()
+
+    @property
+    def nbytes(self) -> int:
+        """The memory held by all loaded instances."""
+        with self._lock:
+            return sum(
+                entry_nbytes(value)
+                for layer in self._layers.values()
+                for value in layer.values()
+            )
+
+    def resident(self, layer: str) -> dict:
+        """The instances of a layer that are held in memory."""
+        return self._layers[layer]
+
+    def get_layer(self, layer: str, image_index: str):
+        """Return the layer of an instance, loading it again if it was evicted."""
+        if image_index in self._evicted and self.loader is not None:
+            self._reload(image_index)
+
+        with self._lock:
+            self._evicted.pop(image_index, None)
+            self._evicted_mips.pop(image_index, None)
+            self._last_access[image_index] = next(self._clock)
+            return self._layers[layer].setdefault(image_index, {})
+
+    def _reload(self, image_index: str) -> None:
+        """Load an evicted instance again. Concurrent accesses to the instance wait
+        for this load instead of starting their own."""
+        with self._lock:
+            if image_index not in self._evicted:
+                return
+            if image_index in self._loading:
+                loaded, loader_thread = self._loading[image_index]
+                # the loader itself may access the instance while loading it
+                if loader_thread == threading.get_ident():
+                    return
+            else:
+                loaded, loader_thread = threading.Event(), None
+                self._loading[image_index] = (loaded, threading.get_ident())
+            mip = self._evicted_mips.get(image_index, 0)
+
+        if loader_thread is not None:
+            loaded.wait()
+            return
+
+        logger.info("Loading evicted instance %s again.", image_index)
+        try:
+            self.loader(image_index, mip)
+        finally:
+            with self._lock:
+                del self._loading[image_index]
+            loaded.set()
+
+    def set_layer(self, layer: str, image_index: str, value) -> None:
+        """Store the layer of an instance and enforce the memory budget."""
+        if hasattr(value, "on_grow"):
+            value.on_grow = partial(self.enforce_budget, keep=image_index)
+        with self._lock:
+            self._layers[layer][image_index] = value
+            self._evicted.pop(image_index, None)
+            self._evicted_mips.pop(image_index, None)
+            self._last_access[image_index] = next(self._clock)
+        self.enforce_budget(keep=image_index)
+
+    def delete_layer(self, layer: str, image_index: str) -> None:
+        """Remove the layer of an instance, whether loaded or evicted."""
+        with self._lock:
+            removed = self._layers[layer].pop(image_index, None) is not None
+            if layer in self._evicted.get(image_index, ()):
+                self._evicted[image_index].discard(layer)
+                if not self._evicted[image_index]:
+                    del self._evicted[image_index]
+                    self._evicted_mips.pop(image_index, None)
+                removed = True
+            if not any(image_index in values for values in self._layers.values()):
+                self._last_access.pop(image_index, None)
+        if not removed:
+            raise KeyError(image_index)
+
+    def has_layer(self, layer: str, image_index: object) -> bool:
+        """Whether the layer of an instance is loaded or can be loaded again."""
+        with self._lock:
+            return image_index in self._layers[layer] or layer in self._evicted.get(
+                image_index, ()
+            )
+
+    def enforce_budget(self, keep: Optional[str] = None) -> None:
+        """Evict instances until the store fits its memory budget.
+
+        Args:
+            keep: An instance that must stay in memory, e.g. the one just stored.
+        """
+        if self.budget_bytes <= 0 or self.nbytes <= self.budget_bytes:
+            return
+
+        pages = self.page_of() if self.page_of is not None else {}
+        with self._lock:
+            sizes = {
+                image_index: sum(
+                    entry_nbytes(layer[image_index])
+                    for layer in self._layers.values()
+                    if image_index in layer
+                )
+                for image_index in self._last_access
+            }
+            size = sum(sizes.values())
+
+            def distance(image_index: str) -> float:
+                if self.current_page is None:
+                    return 0
+                if image_index not in pages:
+                    return math.inf
+                return abs(pages[image_index] - self.current_page)
+
+            candidates = sorted(
+                (
+                    image_index
+                    for image_index in sizes
+                    if image_index != keep and not self._pinned(image_index)
+                ),
+                key=lambda i: (-distance(i), self._last_access[i]),
+            )
+
+            evicted = 0
+            for image_index in candidates:
+                if size <= self.budget_bytes:
+                    break
+                self._evict(image_index)
+                size -= sizes[image_index]
+                evicted += 1
+
+        logger.info(
+            "Evicted %d instances, the tile store holds %d bytes.", evicted, size
+        )
+
+    def _pinned(self, image_index: str) -> bool:
+        """Whether an instance holds drawn masks and must not be evicted."""
+        target = self._layers["target"].get(image_index, {})
+        return any(not key.isdigit() for key in target)
+
+    def _evict(self, image_index: str) -> None:
+        """Drop an instance from memory but remember how to load it again."""
+        # a full resolution instance is loaded at full resolution again
+        self._evicted_mips[image_index] = getattr(
+            self._layers["source"].get(image_index), "mip", 0
+        )
+        layers = {
+            name for name, values in self._layers.items() if image_index in values
+        }
+        for name in layers:
+            del self._layers[name][image_index]
+        self._evicted[image_index] = layers
+        self._last_access.pop(image_index, None)
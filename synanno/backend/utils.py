@@ -1,10 +1,11 @@
 import io
 import json
 import logging
-from typing import Tuple
+from typing import Tuple, Union
 
 import numpy as np
 from PIL import Image
+from skimage.transform import resize
 
 logging.basicConfig(level="INFO")
 logger = logging.getLogger(__name__)
@@ -70,70 +71,92 @@ def adjust_datatype(data: np.ndarray) -> Tuple[np.ndarray, str]:
         return data.astype(np.uint64), "uint64"
 
 
-def draw_cylinder(
-    image: np.ndarray,
-    center_x: int,
-    center_y: int,
-    center_z: int,
-    radius: int,
-    color_main: Tuple[int, int, int],
-    color_sub: Tuple[int, int, int],
+def resize_mask(mask: np.ndarray, shape: tuple) -> np.ndarray:
+    """Resize a segmentation mask to the given shape and binarize it.
+
+    Integer scale factors take an exact nearest-neighbour path without float
+    conversion: upsampling repeats the voxels, downsampling keeps the center voxel
+    of each block. Other factors are resampled with skimage, anti-aliased when
+    downsampling.
+
+    Args:
+        mask: The mask to resize.
+        shape: The shape to resize to.
+
+    Returns:
+        The resized binary mask, the unchanged mask if it already has the shape.
+    """
+    if tuple(mask.shape) == tuple(shape):
+        return mask
+
+    index = [slice(None)] * mask.ndim
+    repeats = [1] * mask.ndim
+    for axis, (size, target) in enumerate(zip(mask.shape, shape)):
+        if target >= size and target % size == 0:
+            repeats[axis] = target // size
+        elif target < size and size % target == 0:
+            factor = size // target
+            index[axis] = slice(factor // 2, None, factor)
+        else:
+            break
+    else:
+        out = mask[tuple(index)] > 0
+        for axis, factor in enumerate(repeats):
+            if factor > 1:
+                out = np.repeat(out, factor, axis=axis)
+        return out.astype(np.uint8)
+
+    resized = resize(
+        mask,
+        shape,
+        mode="constant",
+        preserve_range=True,
+        anti_aliasing=sum(shape) < sum(mask.shape),
+    )
+    return (resized > 0.5).astype(np.uint8)
+
+
+def render_overlay(
+    labels: np.ndarray,
+    markers: list,
     layout: list[str],
+    z_offset: int = 0,
+    radius: int = 10,
 ) -> np.ndarray:
-    """
-    Function to draw a cylinder in a 4D numpy array.
+    """Render the RGBA overlay of a segmentation volume in a single array pass.
 
-    The color of the cylinder changes based on the distance from the center_z.
+    Synapse voxels are magenta, all other voxels transparent. Each marker is drawn
+    as a cylinder along z, in its main color on the marker's slice and in its sub
+    color on all other slices.
 
     Args:
-        image: Input 4D numpy array.
-        center_x: X-coordinate of the cylinder center.
-        center_y: Y-coordinate of the cylinder center.
-        center_z: Z-coordinate of the cylinder center.
-        radius: Radius of the cylinder.
-        color_main: RGB color of the circle in the center_z layer.
-        color_sub: RGB color of the circles in the other layers.
-        layout: The layout of the axes, for example, "zyxc".
+        labels: The segmentation volume, or a slab of it.
+        markers: The x, y, z position, main and sub color of each marker.
+        layout: The layout of the axes, for example, "zyx".
+        z_offset: The z position of the volume's first slice relative to the
+            markers' z positions.
+        radius: Radius of the marker cylinders.
 
     Returns:
-        4D numpy array with the cylinder drawn.
+        The RGBA overlay, with the channels as last axis.
     """
+    overlay = np.zeros(labels.shape + (4,), dtype=np.uint8)
+    overlay[labels > 0] = (255, 0, 255, 255)
 
-    # Find the index for each coordinate in the image shape based on the provided layout
-    z_index = layout.index("z")
-    y_index = layout.index("y")
-    x_index = layout.index("x")
-
-    # Get the lengths along each axis
-    z_len = image.shape[z_index]
-    y_len = image.shape[y_index]
-    x_len = image.shape[x_index]
-
-    # Create coordinate grid
-    Y, X = np.meshgrid(np.arange(y_len), np.arange(x_len), indexing="ij")
-
-    # Create 3D mask for the cylinder
-    mask_cylinder = (X - center_x) ** 2 + (Y - center_y) ** 2 <= radius**2
-
-    # Use a list of slices to index the array dynamically
-    slice_list = [slice(None)] * 4
-
-    for i in range(z_len):
-        slice_list[z_index] = i
-        if i != center_z:
-            slice_list[y_index], slice_list[x_index] = (
-                np.where(mask_cylinder),
-                np.where(mask_cylinder)[1],
-            )
-            image[tuple(slice_list)] = color_sub
-        else:
-            slice_list[y_index], slice_list[x_index] = (
-                np.where(mask_cylinder),
-                np.where(mask_cylinder)[1],
-            )
-            image[tuple(slice_list)] = color_main
+    z_axis, y_axis, x_axis = (layout.index(c) for c in "zyx")
+    # a view of the overlay with the axes ordered z, y, x, channel
+    view = np.moveaxis(overlay, (z_axis, y_axis, x_axis), (0, 1, 2))
+    y = np.arange(view.shape[1])[:, np.newaxis]
+    x = np.arange(view.shape[2])[np.newaxis, :]
+    z = np.arange(view.shape[0]) + z_offset
+
+    for center_x, center_y, center_z, color_main, color_sub in markers:
+        disk = (x - center_x) ** 2 + (y - center_y) ** 2 <= radius**2
+        colors = np.where((z == center_z)[:, np.newaxis], color_main, color_sub)
+        view[:, disk, :3] = colors[:, np.newaxis, :]
+        view[:, disk, 3] = 255
 
-    return image
+    return overlay
 
 
 def img_to_png_bytes(img: np.ndarray) -> bytes:
@@ -148,6 +171,50 @@ def img_to_png_bytes(img: np.ndarray) -> bytes:
     return img_io.getvalue()  # Return byte data
 
 
+# the supported tile codecs and the mimetypes they are served with
+TILE_MIMETYPES = {
+    "png": "image/png",
+    "webp-lossless": "image/webp",
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+}
+
+
+def encode_tile(
+    img: Union[np.ndarray, Image.Image],
+    codec: str = "png",
+    quality: int = 90,
+    png_compress_level: int = 6,
+) -> bytes:
+    """Encode an image with one of the tile codecs.
+
+    Args:
+        img: The image to encode.
+        codec: One of the codecs listed in TILE_MIMETYPES.
+        quality: Quality (0-100) of the lossy webp and jpeg codecs.
+        png_compress_level: The zlib compression level (0-9) of the png codec.
+
+    Returns:
+        The encoded image.
+    """
+    if not isinstance(img, Image.Image):
+        img = Image.fromarray(img)
+    img_io = io.BytesIO()
+    if codec == "png":
+        img.save(img_io, format="PNG", compress_level=png_compress_level)
+    elif codec == "webp-lossless":
+        img.save(img_io, format="WEBP", lossless=True)
+    elif codec == "webp":
+        img.save(img_io, format="WEBP", quality=quality)
+    elif codec == "jpeg":
+        img.save(img_io, format="JPEG", quality=quality)
+    else:
+        raise ValueError(
+            f"Unknown tile codec {codec}, expected one of {list(TILE_MIMETYPES)}."
+        )
+    return img_io.getvalue()
+
+
 def png_bytes_to_pil_img(png_bytes: bytes) -> np.ndarray:
     """Convert PNG byte data back to a NumPy array."""
     img_io = io.BytesIO(png_bytes)  # Convert bytes to BytesIO object
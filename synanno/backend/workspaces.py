@@ -0,0 +1,227 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar, Token
+from typing import Any, Callable, Hashable, Optional
+
+from flask import Flask, has_request_context, session
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# the ID of the workspace shared by all requests without per-session workspaces
+DEFAULT_WORKSPACE = "default"
+
+# the workspace of the running request or background job
+current_workspace: ContextVar[Optional["Workspace"]] = ContextVar(
+    "current_workspace", default=None
+)
+
+
+class WorkspacesFull(RuntimeError):
+    """Raised if a workspace is needed while max_workspaces workspaces are in use."""
+
+
+class Workspace:
+    """Holds the session state of one annotator, e.g. the metadata and the tiles.
+
+    Args:
+        workspace_id: The Flask session ID the workspace belongs to.
+    """
+
+    def __init__(self, workspace_id: str):
+        self.workspace_id = workspace_id
+        self.last_used = time.monotonic()
+
+
+class WorkspaceManager:
+    """Maps Flask sessions to workspaces, so one server hosts many annotators.
+
+    Read-only resources, such as cloud volume handles and materialization tables,
+    are shared by all workspaces, see shared. Workspaces unused for longer than
+    idle_timeout are dropped. At most max_workspaces workspaces are kept, once they
+    are all taken, the least recently used workspace that holds no session state is
+    dropped to make room. A workspace in use is never dropped for another one,
+    WorkspacesFull is raised instead.
+
+    Args:
+        initialize: Sets up the session state of a new workspace, it is called
+            with the workspace bound.
+        per_session: Give every Flask session its own workspace, otherwise all
+            requests share the default workspace.
+        max_workspaces: The number of workspaces kept at most.
+        idle_timeout: Seconds after which an unused workspace is dropped, 0 keeps
+            idle workspaces.
+        on_evict: Called with the workspace bound before it is dropped.
+        in_use: Called with the workspace bound, tells whether it holds session
+            state, e.g. an opened dataset. Without it all workspaces are in use.
+    """
+
+    def __init__(
+        self,
+        initialize: Callable[[], None],
+        per_session: bool = False,
+        max_workspaces: int = 8,
+        idle_timeout: float = 0,
+        on_evict: Optional[Callable[[], None]] = None,
+        in_use: Optional[Callable[[], bool]] = None,
+    ):
+        self.initialize = initialize
+        self.per_session = per_session
+        self.max_workspaces = max(max_workspaces, 1)
+        self.idle_timeout = idle_timeout
+        self.on_evict = on_evict
+        self.in_use = in_use
+        self._workspaces: OrderedDict[str, Workspace] = OrderedDict()
+        self._shared: dict[Hashable, Any] = {}
+        self._lock = threading.RLock()
+
+    def current_id(self) -> str:
+        """Return the ID of the bound workspace or of the request's session."""
+        workspace = current_workspace.get()
+        if workspace is not None:
+            return workspace.workspace_id
+        if self.per_session and has_request_context():
+            return session.sid
+        return DEFAULT_WORKSPACE
+
+    def current(self) -> Workspace:
+        """Return the bound workspace or the workspace of the request's session."""
+        workspace = current_workspace.get()
+        if workspace is not None:
+            return workspace
+        return self.get(self.current_id())
+
+    def get(self, workspace_id: str) -> Workspace:
+        """Return a workspace, it is created and initialized if needed.
+
+        Args:
+            workspace_id: The ID of the workspace.
+
+        Returns:
+            The workspace.
+
+        Raises:
+            WorkspacesFull: If a new workspace is needed but all are in use.
+        """
+        with self._lock:
+            workspace = self._workspaces.get(workspace_id)
+            if workspace is None:
+                self._evict(keep=self.max_workspaces - 1)
+                if len(self._workspaces) >= self.max_workspaces:
+                    raise WorkspacesFull(
+                        f"All {self.max_workspaces} workspaces are in use."
+                    )
+                workspace = Workspace(workspace_id)
+                token = self.bind(workspace)
+                try:
+                    self.initialize()
+                finally:
+                    current_workspace.reset(token)
+                self._workspaces[workspace_id] = workspace
+                logger.info("Created workspace %s.", workspace_id)
+            self._workspaces.move_to_end(workspace_id)
+            workspace.last_used = time.monotonic()
+            return workspace
+
+    @staticmethod
+    def bind(workspace: Workspace) -> Token:
+        """Make a workspace the current one of the running context.
+
+        Threads started from the context inherit the workspace if they run in a
+        copy of it, see contextvars.copy_context.
+
+        Args:
+            workspace: The workspace to bind.
+
+        Returns:
+            The token to restore the previous workspace with.
+        """
+        return current_workspace.set(workspace)
+
+    def shared(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """Return a resource shared by all workspaces, created once per key.
+
+        The resource must not be modified by the workspaces.
+
+        Args:
+            key: Identifies the resource, e.g. its kind and path.
+            factory: Creates the resource.
+
+        Returns:
+            The shared resource.
+        """
+        with self._lock:
+            if key not in self._shared:
+                self._shared[key] = factory()
+            return self._shared[key]
+
+    def _evict(self, keep: int) -> None:
+        """Drop idle workspaces, and unused ones beyond keep, least recent first."""
+        now = time.monotonic()
+        for workspace_id, workspace in list(self._workspaces.items()):
+            idle = (
+                self.idle_timeout > 0 and now - workspace.last_used > self.idle_timeout
+            )
+            if idle or (
+                len(self._workspaces) > keep and not self._holds_state(workspace)
+            ):
+                self._drop(workspace_id, workspace)
+
+    def _holds_state(self, workspace: Workspace) -> bool:
+        """Tell whether a workspace is in use, see in_use."""
+        if self.in_use is None:
+            return True
+        token = self.bind(workspace)
+        try:
+            return self.in_use()
+        finally:
+            current_workspace.reset(token)
+
+    def _drop(self, workspace_id: str, workspace: Workspace) -> None:
+        """Release a workspace and forget it."""
+        del self._workspaces[workspace_id]
+        if self.on_evict is not None:
+            token = self.bind(workspace)
+            try:
+                self.on_evict()
+            except Exception as exc:
+                logger.error("Failed to release workspace %s: %s", workspace_id, exc)
+            finally:
+                current_workspace.reset(token)
+        logger.info("Dropped workspace %s.", workspace_id)
+
+
+class WorkspaceFlask(Flask):
+    """Flask app that keeps the session state in the current workspace.
+
+    Attributes assigned before the workspaces attribute are app-wide, e.g. the
+    tile cache and the job executor. All attributes assigned later are read from
+    and written to the current workspace, see WorkspaceManager.current.
+    """
+
+    def __getattr__(self, name: str) -> Any:
+        workspaces = self.__dict__.get("workspaces")
+        if workspaces is not None and not name.startswith("__"):
+            try:
+                return getattr(workspaces.current(), name)
+            except AttributeError:
+                pass
+        raise AttributeError(
+            f"{type(self).__name__!r} object has no attribute {name!r}"
+        )
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        workspaces = self.__dict__.get("workspaces")
+        if workspaces is None or name in self.__dict__ or hasattr(type(self), name):
+            super().__setattr__(name, value)
+        else:
+            setattr(workspaces.current(), name, value)
+
+    def __delattr__(self, name: str) -> None:
+        workspaces = self.__dict__.get("workspaces")
+        if workspaces is None or name in self.__dict__:
+            super().__delattr__(name)
+        else:
+            delattr(workspaces.current(), name)
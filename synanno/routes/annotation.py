@@ -10,7 +10,16 @@ import logging
 from typing import Dict
 
 # flask util functions
-from flask import Blueprint, current_app, jsonify, render_template, request
+from flask import (
+    Blueprint,
+    Response,
+    current_app,
+    jsonify,
+    make_response,
+    render_template,
+    request,
+    stream_with_context,
+)
 
 # flask ajax requests
 from flask_cors import cross_origin
@@ -18,13 +27,17 @@ from flask_cors import cross_origin
 # for type hinting
 from jinja2 import Template
 
-from synanno.backend.processing import free_page, retrieve_instance_metadata
+from synanno.backend.edit_log import log_edit
+from synanno.backend.processing import create_page_metadata, free_page, upcoming_pages
 
 logger = logging.getLogger(__name__)
 
 # define a Blueprint for annotation routes
 blueprint = Blueprint("annotation", __name__)
 
+# the label a click on an instance's card switches to
+NEXT_LABEL = {"incorrect": "unsure", "unsure": "correct", "correct": "incorrect"}
+
 
 @blueprint.route("/retrieve_first_page_of_section/<int:section_index>")
 def retrieve_first_page_of_section(section_index):
@@ -46,8 +59,11 @@ def annotation(page: int = 1) -> Template:
         The annotation view
     """
 
-    # remove the synapse and image slices for the previous and next page
-    free_page()
+    # the tile store evicts the instances furthest from this page first
+    current_app.tile_store.current_page = page
+
+    # remove the synapse and image slices, except for the pages loaded ahead
+    free_page(keep_pages=[page] + upcoming_pages(page, current_app.prefetcher.depth))
 
     # start the timer for the annotation process
     if current_app.proofread_time["start_grid"] is None:
@@ -91,18 +107,28 @@ def is_metadata_locked():
 def update_images(page: int = 1):
     """Fetch updated image data and load the data for the current page."""
 
-    # Check if retrieve_instance_metadata is already running
-    if current_app.retrieve_instance_metadata_lock.locked():
-        logger.warning("retrieve_instance_metadata is already running.")
-        return "", 204  # Return an empty response with 204 No Content status
+    # the user moved on, stop loading the previous page and the pages ahead of it,
+    # the new page build starts once the previous one released the loading lock
+    current_app.prefetcher.cancel(wait=False)
+    current_app.tile_store.current_page = page
 
-    retrieve_instance_metadata(page=page)
+    create_page_metadata(page=page)
 
     # Retrieve the data for the current page
-    data = (
-        current_app.df_metadata.query("Page == @page")
-        .sort_values(by=["Image_Index"])
-        .to_dict("records")
+    with current_app.df_metadata_lock:
+        data = (
+            current_app.df_metadata.query("Page == @page")
+            .sort_values(by=["Image_Index"])
+            .to_dict("records")
+        )
+
+    # the tiles are loaded in the background, the grid follows the progress through
+    # the page's event stream
+    current_app.page_events.open(page, [item["Image_Index"] for item in data])
+    job_id = current_app.prefetcher.schedule(
+        current_app._get_current_object(),
+        upcoming_pages(page, current_app.prefetcher.depth),
+        current_page=page,
     )
 
     # Retrieve image index for the first page
@@ -112,19 +138,78 @@ def update_images(page: int = 1):
         else False
     )
 
-    return render_template(
-        "annotation_image_tiles.html",
-        images=data,
-        page=page,
-        neuron_id=current_app.selected_neuron_id,
-        grid_opacity=current_app.grid_opacity,
-        neuronReady=current_app.neuron_ready,
-        fn_page="true" if fn_page else "false",
-        activeNeuronSection=(
-            current_app.page_section_mapping[page][0]
-            if page in current_app.page_section_mapping
-            else 0
-        ),
+    response = make_response(
+        render_template(
+            "annotation_image_tiles.html",
+            images=data,
+            page=page,
+            neuron_id=current_app.selected_neuron_id,
+            grid_opacity=current_app.grid_opacity,
+            neuronReady=current_app.neuron_ready,
+            fn_page="true" if fn_page else "false",
+            activeNeuronSection=(
+                current_app.page_section_mapping[page][0]
+                if page in current_app.page_section_mapping
+                else 0
+            ),
+        )
+    )
+    # the client follows the page build through /jobs/<job_id> or the page events
+    response.headers["X-Job-Id"] = job_id or ""
+    return response
+
+
+@blueprint.route("/page_events/<int:page>", methods=["GET"])
+@cross_origin()
+def page_events(page: int) -> Response:
+    """Stream the loading progress of a page as Server-Sent Events.
+
+    Args:
+        page: The page to follow.
+
+    Return:
+        An event stream with a ready event per loaded instance and a final done event
+    """
+    return Response(
+        stream_with_context(current_app.page_events.subscribe(page)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@blueprint.route("/jobs/<job_id>", methods=["GET"])
+@cross_origin()
+def job_status(job_id: str):
+    """Report the state of a background job.
+
+    Args:
+        job_id: The ID returned when the job was submitted.
+
+    Return:
+        The job's kind, state (queued, running, done, failed or cancelled), error
+        and timestamps as JSON
+    """
+    status = current_app.jobs.status(job_id)
+    if status is None:
+        return jsonify(error="Job not found"), 404
+    return jsonify(status)
+
+
+@blueprint.route("/jobs/<job_id>/events", methods=["GET"])
+@cross_origin()
+def job_events(job_id: str) -> Response:
+    """Stream the state changes of a background job as Server-Sent Events.
+
+    Args:
+        job_id: The ID returned when the job was submitted.
+
+    Return:
+        An event stream with an event per state change, ending with the final state
+    """
+    return Response(
+        stream_with_context(current_app.jobs.subscribe(job_id)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
@@ -161,23 +246,79 @@ def update_card() -> Dict[str, object]:
     label = request.form["label"]
 
     # update the session data with the new label
-    if label == "incorrect":
-        current_app.df_metadata.loc[
-            (current_app.df_metadata["Page"] == page)
-            & (current_app.df_metadata["Image_Index"] == index),
-            "Label",
-        ] = "unsure"
-    elif label == "unsure":
-        current_app.df_metadata.loc[
-            (current_app.df_metadata["Page"] == page)
-            & (current_app.df_metadata["Image_Index"] == index),
-            "Label",
-        ] = "correct"
-    elif label == "correct":
-        current_app.df_metadata.loc[
-            (current_app.df_metadata["Page"] == page)
-            & (current_app.df_metadata["Image_Index"] == index),
-            "Label",
-        ] = "incorrect"
+    if label in NEXT_LABEL:
+        values = {"Label": NEXT_LABEL[label]}
+        with current_app.df_metadata_lock:
+            if current_app.metadata_store.update(page, index, **values):
+                log_edit("update", page=page, image_index=index, values=values)
 
     return jsonify({"result": "success", "label": label})
+
+
+@blueprint.route("/update-cards", methods=["POST"])
+@cross_origin()
+def update_cards() -> Dict[str, object]:
+    """Updates the labels and error flags of many instances at once.
+
+    The grid and categorize views collect the clicks made while a request is
+    running and send them in a single request. The JSON body holds the changes,
+    each with the page and data_id of an instance and its new label and/or flag.
+    Unlike /update-card the label is the new label, not the one clicked on.
+
+    Return:
+        The number of updated instances
+    """
+    payload = request.get_json()
+    try:
+        updated = update_instances(
+            payload["changes"], bool(payload.get("delete_fps", False))
+        )
+    except (KeyError, TypeError, ValueError) as exc:
+        return jsonify({"error": f"Invalid changes: {exc}"}), 400
+
+    return jsonify({"result": "success", "updated": updated})
+
+
+def update_instances(changes: list[dict], delete_fps: bool = False) -> int:
+    """Apply the label and error flag changes of many instances at once.
+
+    The changes are written with a single indexed assignment per column, see
+    MetadataStore.update_many.
+
+    Args:
+        changes: The page and data_id of every changed instance and its new label
+            and/or error flag.
+        delete_fps: Remove the instances flagged as falsePositive instead.
+
+    Returns:
+        The number of instances that were updated or removed.
+    """
+    updates, drops = [], []
+    for change in changes:
+        page, index = int(change["page"]), int(change["data_id"])
+        values = {}
+        if "label" in change:
+            if change["label"] not in NEXT_LABEL:
+                raise ValueError(f"unknown label {change['label']}")
+            values["Label"] = change["label"]
+        if "flag" in change:
+            # remove unwanted quotation marks; the pragmatically set the
+            # False Negative flag it will be set as "False Negative"
+            flag = str(change["flag"]).replace('"', "").replace("'", "")
+            if flag == "falsePositive" and delete_fps:
+                drops.append((page, index))
+                continue
+            values["Error_Description"] = flag
+        if values:
+            updates.append((page, index, values))
+
+    store = current_app.metadata_store
+    with current_app.df_metadata_lock:
+        updated = store.update_many(updates)
+        dropped = store.drop_many(drops)
+        for page, index, values in updated:
+            log_edit("update", page=page, image_index=index, values=values)
+        for page, index in dropped:
+            log_edit("drop", page=page, image_index=index)
+
+    return len(updated) + len(dropped)
@@ -1,4 +1,5 @@
 import logging
+from functools import partial
 
 import numpy as np
 import torch
@@ -7,7 +8,8 @@ from flask import Blueprint, current_app, jsonify, request
 from synanno.backend.auto_segmentation.config import get_config
 from synanno.backend.auto_segmentation.dataset import binarize_tensor, normalize_tensor
 from synanno.backend.auto_segmentation.trainer import Trainer
-from synanno.backend.processing import apply_transparency
+from synanno.backend.edit_log import log_masks
+from synanno.backend.processing import apply_transparency, bump_tile_version
 from synanno.backend.utils import img_to_png_bytes, png_bytes_to_pil_img
 
 blueprint = Blueprint("auto_annotate", __name__)
@@ -24,9 +26,7 @@ def load_images_and_masks(data_id: int) -> tuple:
     Returns:
         Loaded images and masks as 3D numpy arrays.
     """
-    source_images_dict = dict(
-        sorted(current_app.source_image_data[str(data_id)].items(), key=lambda k: k[0])
-    )
+    source_slices = current_app.source_image_data[str(data_id)]
 
     target_images_dict = {}
     if "curve" in current_app.target_image_data[str(data_id)]:
@@ -40,10 +40,10 @@ def load_images_and_masks(data_id: int) -> tuple:
     map_slice_to_idx = {}
     image_np_list = []
 
-    for i, (key_source, byte_image_source) in enumerate(source_images_dict.items()):
+    # render the slices straight from the instance's volume, no PNG round trip
+    for i, key_source in enumerate(sorted(source_slices)):
         map_slice_to_idx[key_source] = i
-        img = png_bytes_to_pil_img(byte_image_source)
-        image_np_list.append(np.array(img))
+        image_np_list.append(np.array(source_slices.array(key_source)))
 
     img_np_3d = np.stack(image_np_list, axis=0)
     mask_np_3d = np.zeros(
@@ -136,6 +136,7 @@ def save_auto_masks(
     """
     canvas_type = "auto_curve"
     map_idx_to_slice = {v: k for k, v in map_slice_to_idx.items()}
+    masks = {}
 
     if canvas_type not in current_app.target_image_data[str(data_id)]:
         current_app.target_image_data[str(data_id)][canvas_type] = {}
@@ -145,10 +146,10 @@ def save_auto_masks(
 
         if not non_zero or np.max(img_array) > 1e-4:
             image = apply_transparency(img_array, color=(0, 255, 255))
-            image_byte = img_to_png_bytes(image)
-            current_app.target_image_data[str(data_id)][canvas_type][
-                str(map_idx_to_slice[i])
-            ] = image_byte
+            masks[str(map_idx_to_slice[i])] = img_to_png_bytes(image)
+    current_app.target_image_data[str(data_id)][canvas_type].update(masks)
+    bump_tile_version(data_id, canvas_type)
+    log_masks(data_id, canvas_type, masks)
 
 
 @blueprint.route("/auto_annotate", methods=["POST"])
@@ -165,9 +166,12 @@ def auto_annotate() -> dict:
     sample = prepare_sample(img_np_3d, mask_np_3d)
 
     trainer = Trainer()
-    prediction, _ = trainer.run_inference(
-        CONFIG["TRAINING_CONFIG"]["checkpoints"], [sample]
+    model_path = CONFIG["TRAINING_CONFIG"]["checkpoints"]
+    # the model is loaded once and shared by all workspaces
+    model = current_app.workspaces.shared(
+        ("model", model_path), partial(trainer.load_model, model_path)
     )
+    prediction, _ = trainer.run_inference(model_path, [sample], model=model)
 
     save_auto_masks(data_id, map_slice_to_idx, prediction)
 
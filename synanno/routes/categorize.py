@@ -4,6 +4,8 @@ import json
 from flask import Blueprint, current_app, render_template, request
 from flask_cors import cross_origin
 
+from synanno.routes.annotation import update_instances
+
 # Define a Blueprint for categorize routes
 blueprint = Blueprint("categorize", __name__)
 
@@ -81,28 +83,12 @@ def update_flags(flags, delete_fps):
         flags: List of flags to update.
         delete_fps: Boolean indicating if false positives should be deleted.
     """
+    changes = []
     for flag in flags:
         page_nr, img_nr, error_flag = dict(flag).values()
+        changes.append({"page": page_nr, "data_id": img_nr, "flag": error_flag})
 
-        # remove unwanted quotation marks; the pragmatically set the
-        # False Negative flag it will be set as "False Negative"
-        error_flag = error_flag.replace('"', "")
-        error_flag = error_flag.replace("'", "")
-
-        if error_flag == "falsePositive" and delete_fps:
-            current_app.df_metadata.drop(
-                current_app.df_metadata[
-                    (current_app.df_metadata["Page"] == int(page_nr))
-                    & (current_app.df_metadata["Image_Index"] == int(img_nr))
-                ].index,
-                inplace=True,
-            )
-        else:
-            current_app.df_metadata.loc[
-                (current_app.df_metadata["Page"] == int(page_nr))
-                & (current_app.df_metadata["Image_Index"] == int(img_nr)),
-                "Error_Description",
-            ] = error_flag
+    update_instances(changes, delete_fps)
 
 
 def stop_categorization_timer():
@@ -1,6 +1,5 @@
 import logging
 
-import pandas as pd
 from flask import Blueprint, current_app, render_template, session
 
 import synanno.backend.ng_util as ng_util
@@ -9,6 +8,7 @@ from synanno.backend.processing import (
     calculate_number_of_pages_for_neuron_section_based_loading,
     determine_volume_dimensions,
     load_cloud_volumes,
+    load_materialization_table,
 )
 from synanno.routes.opendata import (
     calculate_scale_factor,
@@ -32,6 +32,8 @@ def demo():
 
     # Reset logic
     session.clear()
+    # keep the session ID, and thus the workspace, that is reset below
+    session["workspace"] = True
     initialize_global_variables(current_app)
 
     return render_template("demo_setup.html", next_route="/demo_annotation")
@@ -58,7 +60,9 @@ def demo_init():
     target_url = "gs://h01-release/data/20210729/c3/synapses/whole_ei_onlyvol"
     neuropil_url = "gs://h01-release/data/20210601/proofread_104"
 
-    current_app.synapse_data = pd.read_csv("/app/h01/h01_104_materialization.csv")
+    current_app.synapse_data = load_materialization_table(
+        "/app/h01/h01_104_materialization.csv"
+    )
 
     load_cloud_volumes(source_url, target_url, neuropil_url, "~/.cloudvolume/secrets")
 
@@ -1,13 +1,18 @@
-import io
+from functools import partial
 
 import numpy as np
 import pandas as pd
 from cloudvolume import Bbox
 from flask import Blueprint, current_app, jsonify, request
 from flask_cors import cross_origin
-from PIL import Image
 
-from synanno.backend.processing import calculate_crop_pad
+from synanno.backend.edit_log import log_edit
+from synanno.backend.instance_store import InstanceSlices
+from synanno.backend.processing import (
+    bump_tile_version,
+    calculate_crop_pad,
+    source_tile_encoder,
+)
 from synanno.backend.utils import adjust_datatype
 
 blueprint = Blueprint("false_negatives", __name__)
@@ -78,10 +83,7 @@ def ng_bbox_fn_save() -> dict:
 
     save_volume_slices(cropped_img, item, coordinate_order)
 
-    df_item = pd.DataFrame([item])
-    current_app.df_metadata = pd.concat(
-        [current_app.df_metadata, df_item], ignore_index=True
-    )
+    add_false_negative(item)
 
     return jsonify(
         {
@@ -93,6 +95,19 @@ def ng_bbox_fn_save() -> dict:
     )
 
 
+def add_false_negative(item: dict) -> None:
+    """Add a false negative to the metadata and log it.
+
+    Args:
+        item: The metadata record of the false negative.
+    """
+    # page builds in the background append to the metadata as well
+    with current_app.df_metadata_lock:
+        # logged first, so that edits of the new instance follow it in the log
+        log_edit("append", records=[item])
+        current_app.metadata_store.append([item])
+
+
 def get_corrected_coordinates(request) -> tuple:
     """Retrieve and correct coordinates from the request."""
     cz1 = int(request.form["z1"])
@@ -268,15 +283,15 @@ def scale_padding(img_padding: list, coordinate_order: list) -> list:
 def save_volume_slices(
     cropped_img: np.ndarray, item: dict, coordinate_order: list
 ) -> None:
-    """Save the volume slices to the current app's source image data."""
+    """Save the volume to the current app's source image data."""
     slice_axis = coordinate_order.index("z")
-    for s in range(cropped_img.shape[slice_axis]):
-        image_index = str(item["Image_Index"])
-        img_z_index = str(item["Adjusted_Bbox"][slice_axis * 2] + s)
-
-        slicing_img = [s if idx == slice_axis else slice(None) for idx in range(3)]
-        img_c = Image.fromarray(adjust_datatype(cropped_img[tuple(slicing_img)])[0])
-        img_io = io.BytesIO()
-        img_c.save(img_io, format="PNG")
-        img_io.seek(0)
-        current_app.source_image_data[image_index][img_z_index] = img_io.getvalue()
+    encode, mimetype = source_tile_encoder()
+    current_app.source_image_data[str(item["Image_Index"])] = InstanceSlices(
+        adjust_datatype(cropped_img)[0],
+        item["Adjusted_Bbox"][slice_axis * 2],
+        slice_axis,
+        partial(np.take, axis=slice_axis),
+        encode=encode,
+        mimetype=mimetype,
+    )
+    bump_tile_version(item["Image_Index"], "source")
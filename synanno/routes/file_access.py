@@ -1,14 +1,111 @@
-import io
 import logging
+from collections.abc import Mapping
+from typing import Optional
 
-from flask import Blueprint, Response, current_app, request, send_file
+from flask import Blueprint, Response, current_app, jsonify, request
 from flask_cors import cross_origin
 
+from synanno.backend.processing import source_tile_token
+from synanno.backend.tile_bundle import (
+    collect_instance_tiles,
+    instance_manifest,
+    pack_tile_bundle,
+    tile_etag,
+)
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 blueprint = Blueprint("file_access", __name__)
 
+# EM tiles requested with the token of their mip never change, see send_tile
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def send_tile(slices: Mapping, image_index: str, layer: str, slice_id: str):
+    """Send a tile with cache validators, answering conditional requests with 304.
+
+    EM tiles requested with the token of the session and the mip they are held at
+    (query argument v, see processing.source_tile_token) are cacheable forever. All
+    other tiles have to be revalidated, e.g. a grid resolution tile requested by a
+    view that expects full resolution.
+
+    Args:
+        slices: The store holding the tile.
+        image_index: The image index of the instance.
+        layer: The layer of the tile, e.g. source, target or curve.
+        slice_id: The z index of the tile.
+
+    Returns:
+        The tile or an empty 304 response.
+    """
+    etag = tile_etag(slices, image_index, layer, slice_id)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(
+            slices[slice_id], mimetype=getattr(slices, "mimetype", "image/png")
+        )
+
+    response.set_etag(etag)
+    if layer == "source" and request.args.get("v") == source_tile_token(
+        getattr(slices, "mip", 0)
+    ):
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def send_shared_tile(image_index: str, layer: str, slice_id: str):
+    """Send a tile published by the worker that built the page, see send_tile.
+
+    Args:
+        image_index: The image index of the instance.
+        layer: The layer of the tile, e.g. source, target or curve.
+        slice_id: The z index of the tile.
+
+    Returns:
+        The tile, an empty 304 response or None if the tile is not published.
+    """
+    if current_app.shared_tiles is None:
+        return None
+    tile = current_app.shared_tiles.get_tile(
+        current_app.workspaces.current_id(), image_index, layer, slice_id
+    )
+    if tile is None:
+        return None
+    if request.method == "HEAD":
+        return "", 200
+
+    data, mimetype, etag, mip = tile
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(data, mimetype=mimetype)
+
+    response.set_etag(etag)
+    session = current_app.shared_tiles.session(current_app.workspaces.current_id())
+    if layer == "source" and request.args.get("v") == f"{session}.{mip}":
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def has_tile(image_index: str, layer: str, slice_id: str) -> bool:
+    """Whether a tile is held in memory or published by another worker."""
+    store = (
+        current_app.source_image_data
+        if layer == "source"
+        else current_app.target_image_data
+    )
+    if image_index in store and slice_id in store[image_index]:
+        return True
+    return current_app.shared_tiles is not None and current_app.shared_tiles.has_tile(
+        current_app.workspaces.current_id(), image_index, layer, slice_id
+    )
+
 
 @blueprint.route("/get_swc", methods=["GET"])
 def get_swc():
@@ -27,12 +124,8 @@ def source_and_target_exist(image_index, slice_id):
     """Valide that both source and target images are available."""
     image_index = str(image_index)
     slice_id = str(slice_id)
-    if (
-        image_index in current_app.source_image_data
-        and slice_id in current_app.source_image_data[image_index]
-    ) and (
-        image_index in current_app.target_image_data
-        and slice_id in current_app.target_image_data[image_index]
+    if has_tile(image_index, "source", slice_id) and has_tile(
+        image_index, "target", slice_id
     ):
         return "Image found", 200
     return "Image not found", 204
@@ -44,14 +137,95 @@ def source_img_exists(image_index, slice_id):
     """Serves EM images from memory."""
     image_index = str(image_index)
     slice_id = str(slice_id)
-    if (
-        image_index in current_app.source_image_data
-        and slice_id in current_app.source_image_data[image_index]
-    ):
+    if has_tile(image_index, "source", slice_id):
         return "Image found", 200
     return "Image not found", 204
 
 
+def requested_image_indices() -> Optional[list[str]]:
+    """Resolve the instances addressed by the query arguments of a request.
+
+    Returns:
+        The image indices given by image_index (comma separated) or the indices of
+        the instances on the given page, None if neither is given.
+    """
+    if request.args.get("image_index"):
+        return request.args["image_index"].split(",")
+    if request.args.get("page"):
+        page = int(request.args["page"])
+        with current_app.df_metadata_lock:
+            df = current_app.df_metadata
+            image_indices = [str(i) for i in df.loc[df["Page"] == page, "Image_Index"]]
+        # workers that do not build the pages know them from the shared tiles
+        if not image_indices and current_app.shared_tiles is not None:
+            image_indices = current_app.shared_tiles.page_instances(
+                current_app.workspaces.current_id(), page
+            )
+        return image_indices
+    return None
+
+
+@blueprint.route("/get_tile_manifest", methods=["GET"])
+@cross_origin()
+def get_tile_manifest():
+    """Lists the slices and overlay layers available for a page or instances.
+
+    Query Args:
+        page: The page whose instances to list.
+        image_index: Comma separated instances to list, takes precedence over the
+            page.
+
+    Returns:
+        The manifest version and per instance the available z indices by layer
+        together with the layers' versions. Instances that are not loaded map to
+        null.
+    """
+    image_indices = requested_image_indices()
+    if image_indices is None:
+        return "Either a page or an image index is required", 400
+
+    return jsonify(
+        version=current_app.tile_manifest_version,
+        instances={index: instance_manifest(index) for index in image_indices},
+    )
+
+
+@blueprint.route("/get_tile_bundle", methods=["GET"])
+@cross_origin()
+def get_tile_bundle():
+    """Serves all slices of a page or of a single instance in one response.
+
+    Page bundles only hold the slices that were encoded while loading the page,
+    usually the middle slices, the remaining slices are bundled per instance.
+
+    Query Args:
+        page: The page whose instances to bundle.
+        image_index: Comma separated instances to bundle, takes precedence over
+            the page.
+        slice_id: Restrict the bundle to a single slice of each instance.
+
+    Returns:
+        The length-prefixed tile bundle, see tile_bundle.pack_tile_bundle.
+    """
+    image_indices = requested_image_indices()
+    if image_indices is None:
+        return "Either a page or an image index is required", 400
+
+    slice_id = request.args.get("slice_id")
+    encoded_only = not request.args.get("image_index")
+    tiles = []
+    for image_index in image_indices:
+        tiles.extend(
+            collect_instance_tiles(
+                image_index,
+                [str(slice_id)] if slice_id is not None else None,
+                encoded_only=encoded_only,
+            )
+        )
+
+    return Response(pack_tile_bundle(tiles), mimetype="application/octet-stream")
+
+
 @blueprint.route("/get_source_image/<image_index>/<slice_id>", methods=["GET", "HEAD"])
 @cross_origin()
 def get_source_image(image_index, slice_id):
@@ -64,10 +238,12 @@ def get_source_image(image_index, slice_id):
     ):
         if request.method == "HEAD":
             return "", 200  # Respond with an empty body for HEAD request
-        return send_file(
-            io.BytesIO(current_app.source_image_data[image_index][slice_id]),
-            mimetype="image/png",
+        return send_tile(
+            current_app.source_image_data[image_index], image_index, "source", slice_id
         )
+    shared = send_shared_tile(image_index, "source", slice_id)
+    if shared is not None:
+        return shared
     if request.method == "HEAD":
         return "", 204  # Return 204 No Content instead of 404 Not Found
     return "Image not found", 404
@@ -85,10 +261,12 @@ def get_target_image(image_index, slice_id):
     ):
         if request.method == "HEAD":
             return "", 200  # Respond with an empty body for HEAD request
-        return send_file(
-            io.BytesIO(current_app.target_image_data[image_index][slice_id]),
-            mimetype="image/png",
+        return send_tile(
+            current_app.target_image_data[image_index], image_index, "target", slice_id
         )
+    shared = send_shared_tile(image_index, "target", slice_id)
+    if shared is not None:
+        return shared
     if request.method == "HEAD":
         return "", 204  # Return 204 No Content instead of 404 Not Found
     return "Image not found", 404
@@ -107,10 +285,15 @@ def get_curve_image(image_index, slice_id):
     ):
         if request.method == "HEAD":
             return "", 200  # Respond with an empty body for HEAD request
-        return send_file(
-            io.BytesIO(current_app.target_image_data[image_index]["curve"][slice_id]),
-            mimetype="image/png",
+        return send_tile(
+            current_app.target_image_data[image_index]["curve"],
+            image_index,
+            "curve",
+            slice_id,
         )
+    shared = send_shared_tile(image_index, "curve", slice_id)
+    if shared is not None:
+        return shared
     if request.method == "HEAD":
         return "", 204  # Return 204 No Content instead of 404 Not Found
     return "Image not found", 404
@@ -131,12 +314,15 @@ def get_auto_curve_image(image_index, slice_id):
     ):
         if request.method == "HEAD":
             return "", 200  # Respond with an empty body for HEAD request
-        return send_file(
-            io.BytesIO(
-                current_app.target_image_data[image_index]["auto_curve"][slice_id]
-            ),
-            mimetype="image/png",
+        return send_tile(
+            current_app.target_image_data[image_index]["auto_curve"],
+            image_index,
+            "auto_curve",
+            slice_id,
         )
+    shared = send_shared_tile(image_index, "auto_curve", slice_id)
+    if shared is not None:
+        return shared
     if request.method == "HEAD":
         return "", 204  # Return 204 No Content instead of 404 Not Found
     return "Image not found", 404
@@ -157,12 +343,15 @@ def get_circle_pre_image(image_index, slice_id):
     ):
         if request.method == "HEAD":
             return "", 200  # Respond with an empty body for HEAD request
-        return send_file(
-            io.BytesIO(
-                current_app.target_image_data[image_index]["circlePre"][slice_id]
-            ),
-            mimetype="image/png",
+        return send_tile(
+            current_app.target_image_data[image_index]["circlePre"],
+            image_index,
+            "circlePre",
+            slice_id,
         )
+    shared = send_shared_tile(image_index, "circlePre", slice_id)
+    if shared is not None:
+        return shared
     if request.method == "HEAD":
         return "", 204  # Return 204 No Content instead of 404 Not Found
     return "Image not found", 404
@@ -183,12 +372,15 @@ def get_circle_post_image(image_index, slice_id):
     ):
         if request.method == "HEAD":
             return "", 200  # Respond with an empty body for HEAD request
-        return send_file(
-            io.BytesIO(
-                current_app.target_image_data[image_index]["circlePost"][slice_id]
-            ),
-            mimetype="image/png",
+        return send_tile(
+            current_app.target_image_data[image_index]["circlePost"],
+            image_index,
+            "circlePost",
+            slice_id,
         )
+    shared = send_shared_tile(image_index, "circlePost", slice_id)
+    if shared is not None:
+        return shared
     if request.method == "HEAD":
         return "", 204  # Return 204 No Content instead of 404 Not Found
     return "Image not found", 404
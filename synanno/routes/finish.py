@@ -1,12 +1,11 @@
-import datetime
 import io
-import json
 import logging
 import zipfile
 from typing import Optional
 
 from flask import (
     Blueprint,
+    Response,
     current_app,
     flash,
     render_template,
@@ -17,6 +16,7 @@ from flask import (
 from jinja2 import Template
 
 from synanno import initialize_global_variables
+from synanno.backend.session_io import EXPORT_FORMATS, export_session
 from synanno.backend.utils import img_to_png_bytes, png_bytes_to_pil_img
 
 logging.basicConfig(level=logging.INFO)
@@ -47,10 +47,14 @@ def export_draw() -> Template:
 
 @blueprint.route("/download_json", methods=["GET", "HEAD"])
 def download_json():
-    """Provide JSON data as a direct download from memory.
+    """Stream the session data as a download.
+
+    The query parameter format selects the export format, json (default), jsonl or
+    parquet, gzip=1 compresses the JSON formats. Any of them can be loaded again
+    on the open data view.
 
     Returns:
-        - Serves JSON data directly from memory.
+        - Streams the export while encoding it.
         - Returns 200 for HEAD requests if data exists.
         - Renders an error page if no data is available.
     """
@@ -58,30 +62,32 @@ def download_json():
         flash("No file - session data is empty.", "error")
         return render_template("export_annotate.html", disable_snp=" ")
 
-    final_data = {
-        "Proofread Time": current_app.proofread_time,
-        "Metadata": current_app.df_metadata.to_dict("records"),
-    }
-
-    json_bytes = convert_json_to_bytes(final_data)
+    fmt = request.args.get("format", "json")
+    if fmt not in EXPORT_FORMATS:
+        return f"Unknown export format {fmt}", 400
+    compress = request.args.get("gzip") == "1" and fmt != "parquet"
 
     if request.method == "HEAD":
         return "", 200
 
-    return send_file(
-        json_bytes,
-        mimetype="application/json",
-        as_attachment=True,
-        download_name="synanno.json",
-    )
-
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    if compress:
+        mimetype, extension = "application/gzip", f"{extension}.gz"
 
-def convert_json_to_bytes(data: dict) -> io.BytesIO:
-    """Convert JSON data to bytes."""
-    json_str = json.dumps(data, indent=4, default=json_serial)
-    json_bytes = io.BytesIO(json_str.encode("utf-8"))
-    json_bytes.seek(0)
-    return json_bytes
+    try:
+        chunks = export_session(
+            current_app.proofread_time, current_app.df_metadata, fmt, compress
+        )
+    except ImportError:
+        return "The Parquet export requires pyarrow, see synanno[parquet]", 501
+    except ValueError as exc:
+        logger.error(f"Failed to export the session: {exc}")
+        return str(exc), 422
+    return Response(
+        chunks,
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=synanno.{extension}"},
+    )
 
 
 @blueprint.route("/download_all_masks", methods=["GET"])
@@ -134,15 +140,8 @@ def create_zip_with_masks() -> io.BytesIO:
 
 def get_metadata_for_image_index(img_index: str) -> Optional[dict]:
     """Retrieve metadata for a given image index."""
-    img_index_int = int(img_index)  # noqa: F841
-    if current_app.df_metadata.query("Image_Index == @img_index_int").to_dict(
-        "records"
-    ):
-        return current_app.df_metadata.query("Image_Index == @img_index_int").to_dict(
-            "records"
-        )[0]
-    else:
-        return None
+    with current_app.df_metadata_lock:
+        return current_app.metadata_store.find(int(img_index))
 
 
 @blueprint.route("/reset")
@@ -154,14 +153,7 @@ def reset() -> Template:
         Renders the landing-page view.
     """
     session.clear()
+    # keep the session ID, and thus the workspace, that is reset below
+    session["workspace"] = True
     initialize_global_variables(current_app)
     return render_template("landingpage.html")
-
-
-def json_serial(obj):
-    """JSON serializer for objects not serializable by default json code."""
-    if isinstance(obj, (datetime.timedelta)):
-        return str(obj)
-    if isinstance(obj, (datetime.datetime)):
-        return obj.isoformat()
-    raise TypeError("Type %s not serializable" % type(obj))
@@ -9,7 +9,12 @@ from flask import Blueprint, current_app, jsonify, render_template, request
 from flask_cors import cross_origin
 from PIL import Image
 
-from synanno.backend.processing import process_instance, update_slice_number
+from synanno.backend.edit_log import log_edit, log_masks
+from synanno.backend.processing import (
+    bump_tile_version,
+    process_instance,
+    update_slice_number,
+)
 from synanno.backend.utils import img_to_png_bytes, png_bytes_to_pil_img
 
 blueprint = Blueprint("manual_annotate", __name__)
@@ -32,9 +37,8 @@ def draw() -> str:
 
 def get_instance_data(page: int, index: int) -> dict:
     """Retrieve instance specific data from metadata."""
-    return current_app.df_metadata.query(
-        "Page == @page & Image_Index == @index"
-    ).to_dict("records")[0]
+    with current_app.df_metadata_lock:
+        return current_app.metadata_store.get(page, index)
 
 
 def decode_image(image_base64: str) -> Image:
@@ -65,6 +69,8 @@ def save_image_data(
         current_app.target_image_data[img_index][canvas_type][
             str(viewed_instance_slice)
         ] = image_byte
+    bump_tile_version(img_index, canvas_type)
+    log_masks(img_index, canvas_type, {str(viewed_instance_slice): image_byte})
 
 
 @blueprint.route("/save_canvas", methods=["POST"])
@@ -109,14 +115,21 @@ def load_missing_slices() -> dict:
     slices, redraw the mask and auto generate the mask we thus need to download the
     remaining slices.
 
+    The slices are downloaded in a background job, see /jobs/<job_id>.
+
     Returns:
-        JSON response indicating success.
+        JSON response with the ID of the job.
     """
-    data = current_app.df_metadata.query(
-        "Label == 'incorrect' or Label == 'unsure'"
-    ).to_dict("records")
+    job_id = current_app.jobs.submit(
+        current_app._get_current_object(), "load_missing_slices", load_draw_instances
+    )
+    return jsonify({"result": "success", "job_id": job_id})
 
-    update_slice_number(data)
+
+def load_draw_instances() -> None:
+    """Load all slices of the instances labeled as incorrect or unsure."""
+    frame = current_app.df_metadata
+    update_slice_number(frame.index[frame["Label"].isin(["incorrect", "unsure"])])
 
     data = current_app.df_metadata.query(
         "Label == 'incorrect' or Label == 'unsure'"
@@ -125,8 +138,6 @@ def load_missing_slices() -> dict:
     for instance in data:
         process_instance(instance)
 
-    return jsonify({"result": "success"})
-
 
 @blueprint.route("/save_pre_post_coordinates", methods=["POST"])
 @cross_origin()
@@ -149,44 +160,15 @@ def save_pre_post_coordinates() -> tuple:
         str(request.form["id"]),
     )
     x, y, z = scale_coordinates(x, y, z)
-    x += (
-        current_app.df_metadata.loc[
-            (current_app.df_metadata["Image_Index"] == data_id)
-            & (current_app.df_metadata["Page"] == page),
-            "Adjusted_Bbox",
-        ].values[0][x_index * 2]
-        - current_app.df_metadata.loc[
-            (current_app.df_metadata["Image_Index"] == data_id)
-            & (current_app.df_metadata["Page"] == page),
-            "Padding",
-        ].values[0][x_index][0]
-    )
 
-    y += (
-        current_app.df_metadata.loc[
-            (current_app.df_metadata["Image_Index"] == data_id)
-            & (current_app.df_metadata["Page"] == page),
-            "Adjusted_Bbox",
-        ].values[0][y_index * 2]
-        - current_app.df_metadata.loc[
-            (current_app.df_metadata["Image_Index"] == data_id)
-            & (current_app.df_metadata["Page"] == page),
-            "Padding",
-        ].values[0][y_index][0]
-    )
-    z -= current_app.df_metadata.loc[
-        (current_app.df_metadata["Image_Index"] == data_id)
-        & (current_app.df_metadata["Page"] == page),
-        "Padding",
-    ].values[0][z_index][0]
+    instance = get_instance_data(page, data_id)
+    x += instance["Adjusted_Bbox"][x_index * 2] - instance["Padding"][x_index][0]
+    y += instance["Adjusted_Bbox"][y_index * 2] - instance["Padding"][y_index][0]
+    z -= instance["Padding"][z_index][0]
 
     update_metadata(data_id, page, x, y, z, id)
 
-    middle_slice = current_app.df_metadata.loc[
-        (current_app.df_metadata["Image_Index"] == data_id)
-        & (current_app.df_metadata["Page"] == page),
-        "Middle_Slice",
-    ].values[0]
+    middle_slice = instance["Middle_Slice"]
 
     update_segmentation_color(data_id, middle_slice, (128, 128, 128, 0.5))
     return json.dumps({"success": True}), 200, {"ContentType": "application/json"}
@@ -207,20 +189,12 @@ def scale_coordinates(x: int, y: int, z: int) -> tuple:
 
 def update_metadata(data_id: int, page: int, x: int, y: int, z: int, id: str) -> None:
     """Update the metadata with the new coordinates."""
-    if id == "pre":
-        current_app.df_metadata.loc[
-            (current_app.df_metadata["Image_Index"] == data_id)
-            & (current_app.df_metadata["Page"] == page),
-            ["pre_pt_x", "pre_pt_y", "pre_pt_z"],
-        ] = [x, y, z]
-    elif id == "post":
-        current_app.df_metadata.loc[
-            (current_app.df_metadata["Image_Index"] == data_id)
-            & (current_app.df_metadata["Page"] == page),
-            ["post_pt_x", "post_pt_y", "post_pt_z"],
-        ] = [x, y, z]
-    else:
+    if id not in ("pre", "post"):
         raise ValueError("id must be pre or post")
+    values = {f"{id}_pt_x": x, f"{id}_pt_y": y, f"{id}_pt_z": z}
+    with current_app.df_metadata_lock:
+        if current_app.metadata_store.update(page, data_id, **values):
+            log_edit("update", page=page, image_index=data_id, values=values)
 
 
 def update_segmentation_color(data_id: str, middle_slice: int, color: tuple) -> None:
@@ -244,6 +218,7 @@ def update_segmentation_color(data_id: str, middle_slice: int, color: tuple) ->
         current_app.target_image_data[str(data_id)][str(middle_slice)] = (
             img_to_png_bytes(seg_slice_numpy)
         )
+        bump_tile_version(data_id, "target")
 
 
 @blueprint.route("/get_coordinates", methods=["GET"])
@@ -2,12 +2,12 @@ import json
 import logging
 
 import numpy as np
-import pandas as pd
 from flask import Blueprint, current_app, flash, jsonify, render_template, request
 from flask_cors import cross_origin
 from werkzeug.datastructures import MultiDict
 
 import synanno.backend.ng_util as ng_util
+from synanno.backend.edit_log import log_edit, replay_edits, start_session
 from synanno.backend.neuron_processing.load_neuron import (
     load_neuron_skeleton,
     neuron_to_bytes,
@@ -28,9 +28,13 @@ from synanno.backend.processing import (
     calculate_number_of_pages,
     calculate_number_of_pages_for_neuron_section_based_loading,
     determine_volume_dimensions,
+    ensure_full_resolution,
     load_cloud_volumes,
+    load_materialization_table,
     update_slice_number,
 )
+from synanno.backend.session_io import read_session
+from synanno.backend.utils import TILE_MIMETYPES
 
 # Setup logging
 logging.basicConfig(level="INFO")
@@ -133,20 +137,19 @@ def save_coordinate_order_and_crop_size(form: MultiDict):
 
 
 def load_json_to_metadata(file_json):
-    """Load the provided JSON file into the metadata DataFrame.
+    """Load the provided session export into the metadata DataFrame.
 
     Args:
-        file_json: The JSON file provided by the user.
+        file_json: The JSON, JSON lines or Parquet export provided by the user,
+            optionally gzipped, see session_io.read_session.
     """
     try:
-        # Read JSON file as a dictionary
-        json_data = json.load(file_json)  # file_json is a file-like object
+        # Read the exported session, any of the export formats works
+        proofread_time, df_new_metadata = read_session(file_json)
 
         # Extract "Proofread Time" (store it as a dictionary in the app context)
-        if "Proofread Time" in json_data and isinstance(
-            json_data["Proofread Time"], dict
-        ):
-            current_app.proofread_time = json_data["Proofread Time"]
+        if isinstance(proofread_time, dict):
+            current_app.proofread_time = proofread_time
         else:
             logger.warning(
                 "Proofread Time missing or invalid in JSON. Setting default."
@@ -160,15 +163,7 @@ def load_json_to_metadata(file_json):
                 "difference_categorize": None,
             }
 
-        # Extract metadata
-        if "Metadata" not in json_data:
-            raise ValueError("Invalid JSON format: 'Metadata' key is missing!")
-
-        metadata_records = json_data["Metadata"]
-
-        # Load into DataFrame
         expected_columns = set(current_app.df_metadata.columns)
-        df_new_metadata = pd.DataFrame(metadata_records)
 
         # Ensure all required columns exist
         actual_columns = set(df_new_metadata.columns)
@@ -201,7 +196,8 @@ def load_json_to_metadata(file_json):
 
         # Sort and update slices
         current_app.df_metadata.sort_values(["Page", "Image_Index"], inplace=True)
-        update_slice_number(current_app.df_metadata.to_dict("records"))
+        update_slice_number()
+        log_edit("replace", records=current_app.df_metadata.to_dict("records"))
 
     except json.JSONDecodeError:
         logger.error("Invalid JSON file: Failed to parse.")
@@ -363,6 +359,38 @@ def handle_volume_view():
     current_app.synapse_data.reset_index(drop=True, inplace=True)
 
 
+def session_config(source_url: str, target_url: str, neuropil_url: str) -> dict:
+    """Collect the settings that determine the instances of a session.
+
+    Args:
+        source_url: URL to the source cloud volume.
+        target_url: URL to the target cloud volume.
+        neuropil_url: URL to the neuropil cloud volume.
+
+    Returns:
+        The settings, the edit log only restores edits made with the same ones.
+    """
+    return {
+        "source_url": source_url,
+        "target_url": target_url,
+        "neuropil_url": neuropil_url,
+        "view_style": current_app.view_style,
+        "selected_neuron_id": current_app.selected_neuron_id,
+        "coordinate_order": current_app.coordinate_order,
+        "crop_size": [
+            current_app.crop_size_x,
+            current_app.crop_size_y,
+            current_app.crop_size_z,
+        ],
+        "tiles_per_page": current_app.tiles_per_page,
+        "subvolume": {
+            coord + bound: request.form.get(coord + bound)
+            for coord in current_app.coordinate_order
+            for bound in ("1", "2")
+        },
+    }
+
+
 @blueprint.route("/upload", methods=["GET", "POST"])
 def upload_file():
     """Upload the source, target, and json file specified by the user.
@@ -376,6 +404,9 @@ def upload_file():
 
     current_app.tiles_per_page = int(request.form.get("tiles_per_page"))
 
+    if request.form.get("tile_codec") in TILE_MIMETYPES:
+        current_app.source_tile_codec = request.form.get("tile_codec")
+
     save_coordinate_order_and_crop_size(request.form)
 
     source_url = request.form.get("source_url")
@@ -413,6 +444,12 @@ def upload_file():
     nr_instances = 0
 
     file_json = request.files["file_json"]
+    # the edits logged for the same dataset before a restart are restored below,
+    # unless the uploaded export replaces them
+    logged_edits = start_session(
+        session_config(source_url, target_url, neuropil_url),
+        resume=not file_json.filename,
+    )
     if file_json.filename:
         load_json_to_metadata(file_json)
         nr_instances = len(current_app.df_metadata.index)
@@ -448,6 +485,9 @@ def upload_file():
             nr_instances = len(current_app.synapse_data.index)
         current_app.n_pages = calculate_number_of_pages(nr_instances)
 
+    if logged_edits:
+        replay_edits(current_app.edit_log, logged_edits)
+
     if current_app.ng_version is None:
         ng_util.setup_ng(
             app=current_app._get_current_object(),
@@ -529,20 +569,13 @@ def get_instance():
 
     if load == "full":
         with current_app.df_metadata_lock:
+            data = current_app.metadata_store.get(page, index)
 
-            number_of_slices = len(current_app.source_image_data[str(index)])
-
-            middle_slice = int(
-                current_app.df_metadata.loc[
-                    (current_app.df_metadata["Page"] == page)
-                    & (current_app.df_metadata["Image_Index"] == index),
-                    "Middle_Slice",
-                ].item()
-            )
+        # the instance view shows the EM at full resolution
+        ensure_full_resolution(data)
 
-            data = current_app.df_metadata.query(
-                "Page == @page & Image_Index == @index"
-            ).to_dict("records")[0]
+        number_of_slices = len(current_app.source_image_data[str(index)])
+        middle_slice = int(data["Middle_Slice"])
 
         range_min = data["Adjusted_Bbox"][coordinate_order.index("z") * 2]
 
@@ -558,9 +591,8 @@ def get_instance():
         )
 
     elif load == "single":
-        data = current_app.df_metadata.query(
-            "Page == @page & Image_Index == @index"
-        ).to_dict("records")[0]
+        with current_app.df_metadata_lock:
+            data = current_app.metadata_store.get(page, index)
 
         data = json.dumps(data)
 
@@ -715,12 +747,9 @@ def load_materialization():
     try:
         logger.info("Loading the materialization table...")
         path = materialization_path.replace("file://", "")
-        # check if current_app.synapse_data is empty dictionary
-        if not hasattr(current_app, "synapse_data") or not current_app.synapse_data:
-            current_app.synapse_data = pd.read_csv(path)
-            logger.info("Materialization table loaded successfully!")
-        else:
-            logger.info("Materialization table already loaded!")
+        # the table is read once and shared by all workspaces
+        current_app.synapse_data = load_materialization_table(path)
+        logger.info("Materialization table loaded successfully!")
 
         return jsonify({"status": "success"}), 200
 
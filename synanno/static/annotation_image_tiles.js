@@ -1,33 +1,110 @@
-import { fetchImageExistence, updateImages } from "./utils/image_loader.js";
+import {
+  fetchImageExistence,
+  updateImages,
+  fetchTileBundle,
+  loadTileManifest,
+  releaseTileBundle,
+  showBundledSlice,
+} from "./utils/image_loader.js";
 import { updateSynapseColors, updateSynapseColor } from "./utils/viewer_utils.js";
-import { updateLabelClasses } from "./utils/label_utils.js";
+import { queueLabelChange, updateLabelClasses } from "./utils/label_utils.js";
 
 $(document).ready(() => {
   const neuronReady = $("script[src*='annotation_image_tiles.js']").data("neuron-ready") === true;
   const fnPage = $("script[src*='annotation_image_tiles.js']").data("fn-page") === true;
   const $sharkContainerAnnotate = $("#shark_container_minimap");
 
+  // Keep the tiles of every bundle fetched for the page, dropping duplicates
+  const mergeTiles = (tiles) => {
+    for (const [key, url] of tiles) {
+      if (window.pageTiles.has(key)) URL.revokeObjectURL(url);
+      else window.pageTiles.set(key, url);
+    }
+  };
+
+  // Load the shown slices of the page in a single request, the remaining slices of an
+  // instance are bundled once the user hovers or scrolls it
+  const loadPageTiles = (page) => {
+    loadTileManifest({ page }).catch((error) => console.error("Error loading tile manifest:", error));
+    fetchTileBundle({ page })
+      .then(mergeTiles)
+      .catch((error) => console.error("Error loading tile bundle:", error));
+  };
+
+  const instanceBundles = new Map();
+  const loadInstanceTiles = (dataId) => {
+    if (!instanceBundles.has(dataId)) {
+      const bundle = fetchTileBundle({ image_index: dataId })
+        .then(mergeTiles)
+        .catch((error) => {
+          instanceBundles.delete(dataId);
+          console.error("Error loading tile bundle:", error);
+        });
+      instanceBundles.set(dataId, bundle);
+    }
+    return instanceBundles.get(dataId);
+  };
+
+  // Show each instance as soon as its tiles are ready, the page's event stream
+  // reports every loaded instance and closes once the whole page is loaded
+  const followPageLoad = (page) => {
+    if (window.pageEvents) window.pageEvents.close();
+    const events = new EventSource(`/page_events/${page}`);
+    window.pageEvents = events;
+
+    const showProgress = (event) => {
+      const { ready, total } = JSON.parse(event.data);
+      const percent = total > 0 ? (100 * ready) / total : 100;
+      $("#page-load-progress .progress-bar").css("width", `${percent}%`);
+    };
+
+    events.addEventListener("progress", showProgress);
+    events.addEventListener("ready", (event) => {
+      showProgress(event);
+      const { image_index } = JSON.parse(event.data);
+      $(`#imgSource-${image_index}, #imgTarget-${image_index}`).each((_, img) => {
+        $(img).attr("src", $(img).data("src"));
+      });
+    });
+    events.addEventListener("error", (event) => {
+      if (event.data) console.error("Failed to load instance:", JSON.parse(event.data).image_index);
+    });
+    events.addEventListener("done", () => {
+      events.close();
+      $("#page-load-progress").addClass("d-none");
+      loadPageTiles(page);
+    });
+  };
+
+  if (window.pageTiles) releaseTileBundle(window.pageTiles);
+  window.pageTiles = new Map();
+  const currentPage = $(".image-card-btn").first().attr("page");
+  if (currentPage) followPageLoad(currentPage);
+  else $("#page-load-progress").addClass("d-none");
+
   // Delegated event binding for page navigation
   $(document).on("click", ".nav-anno", updateSynapseColors);
 
   // Delegated event binding for image card updates
-  $(document).on("click", ".image-card-btn", async function () {
+  $(document).on("click", ".image-card-btn", function () {
     const dataId = $(this).attr("data_id");
     const page = $(this).attr("page");
     const label = $(this).attr("label");
 
-    try {
-      const data = await $.post("/update-card", { data_id: dataId, page, label });
-      updateLabelClasses(dataId, label);
-
-      if (neuronReady) {
-        const newLabel = $(`#id-a-${dataId}`).attr("label");
-        updateSynapseColor(dataId, newLabel);
-        window.setupWindowResizeHandler($sharkContainerAnnotate[0]);
-      }
-    } catch (error) {
-      console.error("Error updating label:", error);
+    updateLabelClasses(dataId, label);
+    const newLabel = $(`#id-a-${dataId}`).attr("label");
+
+    if (neuronReady) {
+      updateSynapseColor(dataId, newLabel);
+      window.setupWindowResizeHandler($sharkContainerAnnotate[0]);
     }
+
+    // clicks made in quick succession are sent in a single batch
+    queueLabelChange(page, dataId, newLabel).catch((error) => console.error("Error updating label:", error));
+  });
+
+  $(".annotate-item").on("mouseenter", function () {
+    loadInstanceTiles($(this).find(".image-card-btn").attr("data_id"));
   });
 
   let isScrollingLocked = false;
@@ -56,6 +133,9 @@ $(document).ready(() => {
     const newSlice = currentSlice + (event.originalEvent.deltaY > 0 ? 1 : -1);
 
     try {
+      if (showBundledSlice(window.pageTiles, dataId, newSlice, fnPage, $imgSource, $imgTarget)) return;
+      await loadInstanceTiles(dataId);
+      if (showBundledSlice(window.pageTiles, dataId, newSlice, fnPage, $imgSource, $imgTarget)) return;
       const response = await fetchImageExistence(dataId, newSlice, fnPage);
       if (response) await updateImages(dataId, newSlice, fnPage, $imgSource, $imgTarget);
     } catch (error) {
@@ -1,7 +1,16 @@
+import {
+  fetchImageExistence,
+  fetchTileBundle,
+  loadTileManifest,
+  releaseTileBundle,
+  showBundledSlice,
+} from "./utils/image_loader.js";
+
 $(document).ready(function () {
   const neuronID = $("script[src*='annotation_module.js']").data("neuron-id");
 
   let ngLink, cz0, cy0, cx0, dataId, page, currentSlice, dataJson; // Define dataJson in the outer scope
+  let instanceTiles = new Map(); // all slices of the instance shown in the modal
 
   // Cache frequently used elements
   const $detailsModal = $('#detailsModal');
@@ -76,6 +85,10 @@ $(document).ready(function () {
       }
 
       $detailsModal.modal("show");
+
+      await loadTileManifest({ image_index: dataId });
+      releaseTileBundle(instanceTiles);
+      instanceTiles = await fetchTileBundle({ image_index: dataId });
     } catch (error) {
       console.error("Error fetching instance data:", error);
     }
@@ -129,14 +142,19 @@ $(document).ready(function () {
     }
 
     try {
-      const exists = await $.get(dataJson.Error_Description === "False Negative" ?
-        `/source_img_exists/${dataId}/${newSlice}` :
-        `/source_and_target_exist/${dataId}/${newSlice}`);
+      const fnInstance = dataJson.Error_Description === "False Negative";
+      if (showBundledSlice(instanceTiles, dataId, newSlice, fnInstance, $imgSource, $imgTarget)) {
+        currentSlice = newSlice;
+        isModalScrollingLocked = false;
+        return;
+      }
+
+      const exists = await fetchImageExistence(dataId, newSlice, fnInstance);
 
       if (exists) {
         const newSourceImg = new Image();
         newSourceImg.src = `/get_source_image/${dataId}/${newSlice}`;
-        if (dataJson.Error_Description === "False Negative") {
+        if (fnInstance) {
           await newSourceImg.decode();
         } else {
           const newTargetImg = new Image();
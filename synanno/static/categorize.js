@@ -1,5 +1,5 @@
 import { fetchImageExistence, updateImages } from "./utils/image_loader.js";
-import { updateLabelClasses } from "./utils/label_utils.js";
+import { flushLabelChanges, queueLabelChange, updateLabelClasses } from "./utils/label_utils.js";
 
 $(document).ready(() => {
   const neuronReady = $("script[src*='categorize.js']").data("neuron-ready") === true;
@@ -10,7 +10,7 @@ $(document).ready(() => {
   updateEmptyStateMessage();
 
   // Delegated event binding for image card updates
-  $(document).on("click", ".image-card-btn", async function () {
+  $(document).on("click", ".image-card-btn", function () {
 
     const dataId = $(this).attr("data_id");
     const page = $(this).attr("page");
@@ -21,20 +21,18 @@ $(document).ready(() => {
 
     if (customFLagVal !== "False Negative") {
 
-      try {
-        const data = await $.post("/update-card", { data_id: dataId, page, label});
-        updateLabelClasses(dataId, label);
+      updateLabelClasses(dataId, label);
 
-        const newLabel = $(this).attr("label");
+      const newLabel = $(this).attr("label");
 
-        if (newLabel === "correct") {
-          lockInstanceFields(page, dataId);
-        } else {
-          enableInstanceFields(page, dataId);
-        }
-      } catch (error) {
-        console.error("Error updating label:", error);
+      if (newLabel === "correct") {
+        lockInstanceFields(page, dataId);
+      } else {
+        enableInstanceFields(page, dataId);
       }
+
+      // clicks made in quick succession are sent in a single batch
+      queueLabelChange(page, dataId, newLabel).catch((error) => console.error("Error updating label:", error));
   }
   });
 
@@ -163,6 +161,7 @@ function updateEmptyStateMessage() {
 
 async function submitData(deleteFps) {
   try {
+    await flushLabelChanges();
     const flags = await collectFlagsFromNonCorrectCards();
     await $.ajax({
       url: '/pass_flags',
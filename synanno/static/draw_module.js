@@ -1,3 +1,5 @@
+import { isSliceAvailable, loadTileManifest } from "./utils/image_loader.js";
+
 $(document).ready(() => {
   const currentPage = parseInt($("script[src*='draw_module.js']").data("current-page")) || -1;
   const currentView = $("script[src*='draw_module.js']").data("current-view") || "draw";
@@ -34,38 +36,28 @@ $(document).ready(() => {
     $("#neuron-id-draw-module").text(`cx: ${parseInt(cx0)} - cy: ${parseInt(cy0)} - cz: ${parseInt(viewedSlice)}`);
   };
 
-  const loadImage = (url, $element) => {
-    $.ajax({
-      url: url,
-      type: "HEAD",
-      success: function (data, textStatus, xhr) {
-        if (xhr.status === 200) {
-          $(new Image())
-            .attr("src", url)
-            .on("load", function () {
-              $element.attr("src", this.src).removeClass("d-none");
-            });
-        } else if (xhr.status === 204) {
-          console.info("Status 204: No content found for image:", url);
-          $element.addClass("d-none");
-        }
-      },
-      error: function (xhr) {
-        console.error("Error loading image:", url, "Status:", xhr.status);
-        $element.addClass("d-none");
-      }
-    });
+  // Show an overlay layer's slice if the tile manifest lists it, hide the element otherwise
+  const loadImage = (url, $element, layer, slice) => {
+    if (!isSliceAvailable(dataId, slice, [layer])) {
+      $element.addClass("d-none");
+      return false;
+    }
+    $(new Image())
+      .attr("src", url)
+      .on("load", function () {
+        $element.attr("src", this.src).removeClass("d-none");
+      });
+    return true;
   };
 
   const updateImages = async (dataId, slice) => {
     try {
-      await loadImage(`/get_auto_curve_image/${dataId}/${slice}`, $imgTarget);
-      if ($imgTarget.hasClass("d-none")) {
-        await loadImage(`/get_curve_image/${dataId}/${slice}`, $imgTarget);
+      if (!loadImage(`/get_auto_curve_image/${dataId}/${slice}`, $imgTarget, "auto_curve", slice)) {
+        loadImage(`/get_curve_image/${dataId}/${slice}`, $imgTarget, "curve", slice);
       }
 
-      await loadImage(`/get_circle_pre_image/${dataId}/${slice}`, $imgPreCircle);
-      await loadImage(`/get_circle_post_image/${dataId}/${slice}`, $imgPostCircle);
+      loadImage(`/get_circle_pre_image/${dataId}/${slice}`, $imgPreCircle, "circlePre", slice);
+      loadImage(`/get_circle_post_image/${dataId}/${slice}`, $imgPostCircle, "circlePost", slice);
     } catch (error) {
       console.error("Error updating images:", error);
     }
@@ -95,6 +87,7 @@ $(document).ready(() => {
       );
 
       if (mode === "draw") {
+        await loadTileManifest({ image_index: dataId });
         await updateImages(dataId, dataJson.Middle_Slice);
       }
 
@@ -156,8 +149,9 @@ $(document).ready(() => {
         },
       });
 
-      const exists = await $.get(`/source_img_exists/${dataId}/${newSlice}`);
-      if (exists) {
+      // a single manifest request replaces the existence probes of all layers
+      await loadTileManifest({ image_index: dataId });
+      if (isSliceAvailable(dataId, newSlice, ["source"])) {
         $imgSource.attr("src", `/get_source_image/${dataId}/${newSlice}`);
         await updateImages(dataId, newSlice);
         currentSlice = newSlice;
@@ -1,11 +1,11 @@
 $(document).ready(function () {
   // Enable "start new process" button after mask or JSON download
-  $("#dl_draw_masks, #dl_draw_JSON").click(function () {
+  $("#dl_draw_masks, #dl_draw_JSON, #dl_draw_parquet").click(function () {
       $("#resetButton").removeClass("disabled");
   });
 
   // Show loading bar and enable button after JSON download
-  $("#dl_annotate_json").click(function () {
+  $("#dl_annotate_json, #dl_annotate_parquet").click(function () {
       $("#loading-bar").css('display', 'flex');
       $("#resetButton").removeClass("disabled");
       $("#loading-bar").css('display', 'none'); // TODO: Fix loading-bar timing issue
@@ -17,9 +17,21 @@ $(document).ready(function () {
       $("#loading-bar").css('display', 'flex');
       $(".text-white").text("Downloading missing slices...");
       $.post("/load_missing_slices")
-          .done(function () {
-              $("#loading-bar").css('display', 'none');
-              window.location.href = event.target.getAttribute('href');
+          .done(function (response) {
+              // the slices are loaded in a background job, follow it until it ends
+              const events = new EventSource(`/jobs/${response.job_id}/events`);
+              events.addEventListener("done", function () {
+                  events.close();
+                  $("#loading-bar").css('display', 'none');
+                  window.location.href = event.target.getAttribute('href');
+              });
+              ["failed", "cancelled", "error"].forEach(function (state) {
+                  events.addEventListener(state, function () {
+                      events.close();
+                      console.error('Error loading missing slices');
+                      $("#loading-bar").css('display', 'none');
+                  });
+              });
           })
           .fail(function () {
               console.error('Error loading missing slices');
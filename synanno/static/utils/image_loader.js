@@ -1,7 +1,27 @@
-export async function fetchImageExistence(dataId, newSlice, fnPage) {
+// Available slices per layer of the instances seen so far, keyed by image index
+const tileManifest = new Map();
+
+// Fetch the available slices and overlay layers of a page ({ page }) or of
+// instances ({ image_index: "1,2" }) and remember them for isSliceAvailable
+export async function loadTileManifest(params) {
+    const manifest = await $.get("/get_tile_manifest", params);
+    for (const [dataId, layers] of Object.entries(manifest.instances)) {
+      if (layers) tileManifest.set(dataId, layers);
+      else tileManifest.delete(dataId);
+    }
+    return manifest;
+  }
+
+  export function isSliceAvailable(dataId, slice, layers) {
+    const instance = tileManifest.get(String(dataId));
+    return Boolean(instance) && layers.every((layer) => (instance[layer] || []).includes(String(slice)));
+  }
+
+  export async function fetchImageExistence(dataId, newSlice, fnPage) {
     try {
-      const url = fnPage ? `/source_img_exists/${dataId}/${newSlice}` : `/source_and_target_exist/${dataId}/${newSlice}`;
-      return await $.get(url);
+      // only instances missing from the manifest cost a request
+      if (!tileManifest.has(String(dataId))) await loadTileManifest({ image_index: dataId });
+      return isSliceAvailable(dataId, newSlice, fnPage ? ["source"] : ["source", "target"]);
     } catch (error) {
       console.error("Image existence check failed:", error);
       return false;
@@ -32,3 +52,43 @@ export async function fetchImageExistence(dataId, newSlice, fnPage) {
       console.error("Error updating images:", error);
     }
   }
+
+  export function tileKey(dataId, layer, slice) {
+    return `${dataId}/${layer}/${slice}`;
+  }
+
+  // Fetch all slices of a page ({ page }) or an instance ({ image_index }) in one request
+  // and expose every slice as object URL, keyed by tileKey
+  export async function fetchTileBundle(params) {
+    const response = await fetch(`/get_tile_bundle?${new URLSearchParams(params)}`);
+    if (!response.ok) throw new Error(`HTTP error! Status: ${response.status}`);
+
+    // layout: 4 byte big-endian index length | JSON index | tile bytes
+    const buffer = await response.arrayBuffer();
+    const indexLength = new DataView(buffer).getUint32(0);
+    const index = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, indexLength)));
+    const bodyStart = 4 + indexLength;
+
+    const tiles = new Map();
+    for (const tile of index.tiles) {
+      const blob = new Blob([new Uint8Array(buffer, bodyStart + tile.offset, tile.length)], { type: tile.mimetype });
+      tiles.set(tileKey(tile.image_index, tile.layer, tile.slice), URL.createObjectURL(blob));
+    }
+    return tiles;
+  }
+
+  export function releaseTileBundle(tiles) {
+    for (const url of tiles.values()) URL.revokeObjectURL(url);
+    tiles.clear();
+  }
+
+  // Show a slice from a fetched bundle, returns false if the bundle does not hold it
+  export function showBundledSlice(tiles, dataId, newSlice, fnPage, $imgSource, $imgTarget) {
+    const sourceUrl = tiles.get(tileKey(dataId, "source", newSlice));
+    const targetUrl = tiles.get(tileKey(dataId, "target", newSlice));
+    if (!sourceUrl || (!fnPage && !targetUrl)) return false;
+
+    $imgSource.attr("src", sourceUrl).attr("data-current-slice", newSlice);
+    if (!fnPage) $imgTarget.attr("src", targetUrl).attr("data-current-slice", newSlice);
+    return true;
+  }
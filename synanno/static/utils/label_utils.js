@@ -11,3 +11,45 @@ export function updateLabelClasses(dataId, label) {
       $(`#id-a-${dataId}`).attr("label", newLabel);
     }
   }
+
+// Label changes that are not sent yet, the latest change of an instance wins
+const pendingChanges = new Map();
+let inFlight = null;
+
+function sendChanges(keepalive = false) {
+  const changes = [...pendingChanges.values()];
+  pendingChanges.clear();
+  return fetch("/update-cards", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ changes }),
+    keepalive,
+  }).then((response) => {
+    if (response.ok) return;
+    // retry with the next batch, unless the instance was changed again since
+    changes.forEach((change) => {
+      const key = `${change.page}_${change.data_id}`;
+      if (!pendingChanges.has(key)) pendingChanges.set(key, change);
+    });
+    throw new Error(`Failed to update ${changes.length} labels: ${response.status}`);
+  });
+}
+
+// Send the pending label changes, changes made while a batch is in flight are sent
+// together once it returns
+export function flushLabelChanges() {
+  if (inFlight) return inFlight.catch(() => {}).then(flushLabelChanges);
+  if (!pendingChanges.size) return Promise.resolve();
+  inFlight = sendChanges().finally(() => (inFlight = null));
+  return inFlight;
+}
+
+export function queueLabelChange(page, dataId, label) {
+  pendingChanges.set(`${page}_${dataId}`, { page, data_id: dataId, label });
+  return flushLabelChanges();
+}
+
+// the changes of the last clicks must not be lost when leaving the view
+window.addEventListener("pagehide", () => {
+  if (pendingChanges.size) sendChanges(true).catch(() => {});
+});
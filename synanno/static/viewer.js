@@ -578,15 +578,9 @@ function createMetadataElement(metadata, colors, activeNeuronSection) {
         entry.addEventListener("click", function () {
             const sectionIndex = this.getAttribute("data-section-index");
 
-            // 🔹 First, check if retrieve_instance_metadata is locked
-            fetch("/is_metadata_locked")
-                .then(response => response.json())
-                .then(data => {
-                    if (data.locked) {
-                        alert("Data update is currently in progress. Please wait before navigating.");
-                    } else {
-                        // Proceed only if the lock is free
-                        fetch(`/retrieve_first_page_of_section/${sectionIndex}`)
+            // pages load in the background and are cancelled on navigation, no need
+            // to wait for the current page to finish loading
+            fetch(`/retrieve_first_page_of_section/${sectionIndex}`)
                 .then(response => response.json())
                 .then(data => {
                     if (data.page) {
@@ -596,9 +590,6 @@ function createMetadataElement(metadata, colors, activeNeuronSection) {
                     }
                 })
                 .catch(error => console.error("Error fetching first page:", error));
-                    }
-                })
-                .catch(error => console.error("Error checking metadata lock:", error));
         });
     });
 
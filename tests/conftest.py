@@ -1,7 +1,12 @@
+import os
+
 import pytest
 
 from synanno import create_app
 
+# the tests only log edits to their temporary directories
+os.environ["EDIT_LOG_DIR"] = ""
+
 app = create_app()
 
 
@@ -0,0 +1,57 @@
+import numpy as np
+from cloudvolume import Bbox, Vec
+
+from synanno.backend.chunk_planner import PageCutouts, merge_regions
+
+
+class FakeCloudVolume:
+    """In-memory stand-in for a CloudVolume that counts downloads."""
+
+    def __init__(self, shape=(256, 256, 64), chunk_size=(64, 64, 16)):
+        self.data = np.arange(np.prod(shape), dtype=np.uint32).reshape(shape)
+        self.chunk_size = Vec(*chunk_size)
+        self.downloads = []
+
+    def mip_resolution(self, mip):
+        return Vec(8, 8, 33)
+
+    def mip_chunk_size(self, mip):
+        return self.chunk_size
+
+    def mip_voxel_offset(self, mip):
+        return Vec(0, 0, 0)
+
+    def mip_bounds(self, mip):
+        return Bbox((0, 0, 0), self.data.shape)
+
+    def download(self, bbox, mip=0, parallel=True):
+        self.downloads.append(bbox)
+        return self.data[bbox.to_slices()][..., np.newaxis]
+
+
+def test_merge_regions_only_merges_without_extra_voxels():
+    shared = [Bbox((0, 0, 0), (64, 64, 16)), Bbox((0, 0, 0), (128, 64, 16))]
+    diagonal = Bbox((64, 64, 0), (192, 192, 16))
+
+    regions, assignment = merge_regions(shared + [diagonal])
+
+    assert len(regions) == 2
+    assert assignment[0] == assignment[1] != assignment[2]
+
+
+def test_page_cutouts_match_direct_download():
+    cv = FakeCloudVolume()
+    bboxes = {
+        0: Bbox((10, 10, 5), (60, 60, 11)),
+        1: Bbox((20, 30, 4), (70, 80, 10)),
+        2: Bbox((180, 180, 40), (250, 250, 46)),
+    }
+
+    cutouts = PageCutouts(cv, bboxes, coord_resolution=np.array([8, 8, 33]))
+
+    for key, bbox in bboxes.items():
+        np.testing.assert_array_equal(
+            cutouts.get(key)[..., 0], cv.data[bbox.to_slices()]
+        )
+    assert len(cv.downloads) == 2
+    assert cutouts.get("unknown") is None
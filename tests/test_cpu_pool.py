@@ -0,0 +1,25 @@
+import numpy as np
+
+from synanno.backend.cpu_pool import CpuPool
+from synanno.backend.processing import transform_instance_volumes
+
+
+def test_cpu_pool_matches_in_process_results():
+    cropped_img = np.random.randint(0, 255, size=(16, 12, 4), dtype=np.uint8)
+    cropped_gt = np.zeros((8, 6, 4), dtype=np.uint8)
+    cropped_gt[3:5, 2:4, :] = 1
+    arrays = {"cropped_img": cropped_img, "cropped_gt": cropped_gt}
+    padding = [[1, 1], [0, 2], [0, 0]]
+
+    expected = CpuPool(0).run(transform_instance_volumes, arrays, img_padding=padding)
+
+    pool = CpuPool(2)
+    try:
+        result = pool.run(transform_instance_volumes, arrays, img_padding=padding)
+    finally:
+        pool.shutdown()
+
+    assert result.keys() == expected.keys()
+    for key in expected:
+        np.testing.assert_array_equal(result[key], expected[key])
+    assert result["seg"].any()
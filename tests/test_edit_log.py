@@ -0,0 +1,84 @@
+import shutil
+
+from synanno.backend.edit_log import (
+    EditLog,
+    log_edit,
+    log_masks,
+    replay_edits,
+    start_session,
+)
+from synanno.backend.workspaces import current_workspace
+from synanno.routes.categorize import update_flags
+from tests.conftest import app
+
+
+def make_record(page, image_index):
+    record = dict.fromkeys(app.workspaces.get("default").columns, 0)
+    return record | {"Page": page, "Image_Index": image_index, "Label": "correct"}
+
+
+def test_edit_log_batches_edits_and_skips_torn_lines(tmp_path):
+    path = tmp_path / "edits.jsonl"
+    log = EditLog(str(path), flush_interval=60)
+    for index in range(3):
+        log.append("update", page=1, image_index=index, values={"Label": "unsure"})
+    # flushing does not wait for the batch interval
+    log.flush()
+    assert [record["image_index"] for record in log.records()] == [0, 1, 2]
+
+    log.close()
+    with open(path, "a") as file:
+        file.write('{"op": "upd')
+    assert len(EditLog(str(path)).records()) == 3
+
+
+def test_reopened_dataset_restores_logged_edits(tmp_path):
+    config = {"source_url": "gs://source", "coordinate_order": {"x": (4, 8)}}
+    app.config["EDIT_LOG_DIR"] = str(tmp_path)
+    try:
+        with app.app_context():
+            token = app.workspaces.bind(app.workspaces.get("before-crash"))
+            assert start_session(config) == []
+            log_edit("append", records=[make_record(1, 0), make_record(1, 1)])
+            app.metadata_store.append([make_record(1, 0), make_record(1, 1)])
+            update_flags(
+                [
+                    {"page": 1, "id": 0, "flag": "falsePositive"},
+                    {"page": 1, "id": 1, "flag": "badFit"},
+                ],
+                delete_fps=True,
+            )
+            log_masks("1", "curve", {"4": b"mask"})
+            app.edit_log.close()
+            current_workspace.reset(token)
+
+            # a restarted server creates the workspace empty, its log is kept
+            for name in ("restart", "other-dataset"):
+                shutil.copy(tmp_path / "before-crash.jsonl", tmp_path / f"{name}.jsonl")
+            token = app.workspaces.bind(app.workspaces.get("restart"))
+            assert app.df_metadata.empty
+            # reopening the same dataset replays the log
+            replay_edits(app.edit_log, start_session(config))
+            assert app.df_metadata[["Image_Index", "Error_Description"]].to_dict(
+                "records"
+            ) == [{"Image_Index": 1, "Error_Description": "badFit"}]
+            assert app.target_image_data["1"]["curve"] == {"4": b"mask"}
+            assert app.n_pages == 1
+            # the log is compacted to a snapshot of the restored state
+            assert [record["op"] for record in app.edit_log.records()] == [
+                "session",
+                "replace",
+                "masks",
+            ]
+            app.edit_log.close()
+            current_workspace.reset(token)
+
+            # opening another dataset discards the log
+            token = app.workspaces.bind(app.workspaces.get("other-dataset"))
+            assert start_session(config | {"source_url": "gs://other"}) == []
+            assert app.df_metadata.empty
+            assert [record["op"] for record in app.edit_log.records()] == ["session"]
+            app.edit_log.close()
+            current_workspace.reset(token)
+    finally:
+        app.config["EDIT_LOG_DIR"] = ""
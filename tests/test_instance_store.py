@@ -0,0 +1,47 @@
+from functools import partial
+
+import numpy as np
+
+from synanno.backend.instance_store import InstanceSlices
+from synanno.backend.utils import TILE_MIMETYPES, encode_tile, png_bytes_to_pil_img
+
+
+def test_instance_slices_encode_on_demand():
+    volume = np.random.randint(0, 255, size=(8, 8, 4), dtype=np.uint8)
+    slices = InstanceSlices(volume, 10, 2, partial(np.take, axis=2))
+
+    assert list(slices) == ["10", "11", "12", "13"]
+    assert "14" not in slices
+    np.testing.assert_array_equal(
+        np.array(png_bytes_to_pil_img(slices["12"])), volume[:, :, 2]
+    )
+
+    slices["curve"] = b"mask"
+    assert slices["curve"] == b"mask" and len(slices) == 5
+
+
+def test_instance_slices_cache_entry_round_trip():
+    volume = np.arange(2 * 3 * 4, dtype=np.uint16).reshape(2, 3, 4)
+    slices = InstanceSlices(volume, 0, 0, partial(np.take, axis=0))
+
+    restored = InstanceSlices.from_cache_entry(
+        slices.to_cache_entry("source"), "source", partial(np.take, axis=0)
+    )
+
+    np.testing.assert_array_equal(restored.volume, volume)
+    np.testing.assert_array_equal(restored.array("1"), volume[1])
+
+
+def test_instance_slices_custom_codec():
+    volume = np.random.randint(0, 255, size=(4, 16, 16), dtype=np.uint8)
+    slices = InstanceSlices(
+        volume,
+        0,
+        0,
+        partial(np.take, axis=0),
+        encode=partial(encode_tile, codec="jpeg", quality=80),
+        mimetype=TILE_MIMETYPES["jpeg"],
+    )
+
+    assert slices["0"][:2] == b"\xff\xd8"
+    assert slices.mimetype == "image/jpeg"
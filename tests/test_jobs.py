@@ -0,0 +1,54 @@
+import threading
+
+from flask import current_app
+
+from synanno.backend.jobs import JobExecutor
+from tests.conftest import app
+
+
+def test_job_runs_in_app_context_and_reports_state():
+    jobs = JobExecutor(max_workers=1, keep_alive=0.05)
+    release = threading.Event()
+    seen = []
+
+    def build(page, cancel_event):
+        release.wait(5)
+        seen.append((page, current_app.name, cancel_event.is_set()))
+
+    job_id = jobs.submit(app, "page_build", build, 3, cancellable=True)
+    assert jobs.status(job_id)["state"] in ("queued", "running")
+
+    threading.Timer(0.1, release.set).start()
+    messages = [m for m in jobs.subscribe(job_id) if not m.startswith(":")]
+
+    assert messages[-1].startswith("event: done")
+    assert seen == [(3, app.name, False)]
+    assert jobs.status(job_id)["state"] == "done"
+
+
+def test_job_failure_and_status_route():
+    jobs = JobExecutor(max_workers=1)
+
+    def fail():
+        raise RuntimeError("boom")
+
+    job_id = jobs.submit(app, "page_build", fail)
+    status = jobs.wait(job_id)
+    assert status["state"] == "failed" and status["error"] == "boom"
+
+    with app.test_client() as client:
+        assert client.get("/jobs/unknown").status_code == 404
+
+
+def test_job_cancelled_while_queued_forgets_its_cancel_event():
+    jobs = JobExecutor(max_workers=1)
+    release = threading.Event()
+
+    running = jobs.submit(app, "page_build", lambda: release.wait(5))
+    queued = jobs.submit(app, "page_build", lambda cancel_event: None, cancellable=True)
+    jobs.cancel(queued)
+    release.set()
+    jobs.wait(running)
+
+    assert jobs.status(queued)["state"] == "cancelled"
+    assert jobs._cancel_events == {}
@@ -0,0 +1,42 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from synanno.backend.materialization import (
+    MATERIALIZATION_COLUMNS,
+    read_materialization,
+)
+
+
+def write_table(path, n=50):
+    table = pd.DataFrame({column: np.arange(n) for column in MATERIALIZATION_COLUMNS})
+    table["pre_neuron_id"] = np.arange(n) + 5_000_000_000
+    table["unused"] = 1.5
+    table.to_csv(path, index=False)
+    return table
+
+
+def test_materialization_table_is_cached_with_compact_dtypes(tmp_path):
+    path = tmp_path / "materialization.csv"
+    write_table(path)
+    cache_dir = tmp_path / "cache"
+
+    for _ in range(2):
+        table = read_materialization(str(path), str(cache_dir))
+        assert list(table.columns) == MATERIALIZATION_COLUMNS
+        assert table["x"].dtype == np.int32
+        # the neuron IDs do not fit into 32 bits
+        assert table["pre_neuron_id"].dtype == np.int64
+        assert table["pre_neuron_id"].iloc[-1] == 5_000_000_049
+        assert len(os.listdir(cache_dir)) == 1
+
+    # a changed CSV file gets a new cache file
+    write_table(path, n=10)
+    os.utime(path, ns=(0, 0))
+    assert len(read_materialization(str(path), str(cache_dir))) == 10
+    assert len(os.listdir(cache_dir)) == 2
+
+    pd.testing.assert_frame_equal(
+        read_materialization(str(path)), read_materialization(str(path), str(cache_dir))
+    )
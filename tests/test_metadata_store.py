@@ -0,0 +1,97 @@
+import contextvars
+import threading
+
+import numpy as np
+import pandas as pd
+
+from synanno.backend.workspaces import current_workspace
+from synanno.routes.false_negatives import add_false_negative
+from tests.conftest import app
+
+
+def make_record(page, image_index):
+    return {
+        "Page": page,
+        "Image_Index": image_index,
+        "Label": "correct",
+        "Original_Bbox": [image_index] * 6,
+        "Padding": [[0, 0], [0, 0], [0, image_index]],
+    }
+
+
+def test_metadata_store_indexes_pages_and_image_indices():
+    with app.app_context():
+        store, original = app.metadata_store, app.df_metadata
+        app.df_metadata = pd.DataFrame([make_record(1, i) for i in range(3)])
+
+        assert store.get(1, 2)["Original_Bbox"] == [2] * 6
+        assert store.get(2, 2) is None
+        assert store.update(1, 1, Label="incorrect")
+        assert app.df_metadata["Label"].tolist() == ["correct", "incorrect", "correct"]
+
+        store.append([make_record(2, 3), make_record(2, 4)])
+        assert store.has_page(2)
+        assert store.find(4)["Page"] == 2
+
+        assert store.drop(1, 0)
+        assert store.get(1, 0) is None
+        assert store.get(2, 3)["Label"] == "correct"
+
+        # appending after a drop keeps the labels of the rows indexed before
+        store.append([make_record(3, 5)])
+        assert store.get(1, 1)["Label"] == "incorrect"
+        assert store.get(3, 5)["Image_Index"] == 5
+        store.append([make_record(3, 6)])
+        assert store.find(6)["Page"] == 3
+        assert store.drop(3, 5) and store.drop(3, 6)
+
+        labels = app.df_metadata.index[app.df_metadata["Page"] == 2]
+        padding = store.array("Padding", labels)
+        assert padding.shape == (2, 3, 2)
+        store.set_array("Padding", labels, padding + 1)
+        assert store.get(2, 4)["Padding"] == [[1, 1], [1, 1], [1, 5]]
+
+        # replacing the frame rebuilds the index
+        app.df_metadata = pd.DataFrame([make_record(5, 7)])
+        assert store.get(5, 7)["Page"] == 5
+        assert not store.has_page(2)
+        assert np.array_equal(store.array("Original_Bbox"), [[7] * 6])
+
+        app.df_metadata = original
+
+
+def test_false_negatives_and_page_builds_append_concurrently():
+    with app.app_context():
+        original = app.df_metadata
+        app.df_metadata = pd.DataFrame([make_record(1, 0)])
+        token = app.workspaces.bind(app.workspaces.current())
+
+        def build_pages():
+            with app.app_context():
+                for page in range(2, 52):
+                    with app.df_metadata_lock:
+                        if not app.metadata_store.has_page(page):
+                            app.metadata_store.append(
+                                [make_record(page, page * 100 + i) for i in range(3)]
+                            )
+
+        def add_false_negatives():
+            with app.app_context():
+                for image_index in range(50):
+                    add_false_negative(make_record(1, 10_000 + image_index))
+
+        threads = [
+            threading.Thread(target=contextvars.copy_context().run, args=(target,))
+            for target in (build_pages, add_false_negatives)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # no append overwrote another one and the index covers every row
+        assert len(app.df_metadata) == 1 + 50 * 3 + 50
+        assert app.metadata_store.find(10_049)["Page"] == 1
+        assert app.metadata_store.get(51, 5102)["Label"] == "correct"
+        current_workspace.reset(token)
+        app.df_metadata = original
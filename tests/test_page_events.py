@@ -0,0 +1,48 @@
+import threading
+import time
+
+from synanno.backend.page_events import PageEvents
+
+
+def test_page_events_replay_and_follow():
+    events = PageEvents(keep_alive=0.05)
+    events.open(3, [10, 11])
+    events.ready(3, 10)
+
+    def finish_page():
+        events.ready(3, 11)
+        events.ready(3, 11)  # duplicates are dropped
+        events.finish(3)
+
+    threading.Timer(0.1, finish_page).start()
+    messages = [m for m in events.subscribe(3) if not m.startswith(":")]
+
+    assert [m.split("\n")[0] for m in messages] == [
+        "event: progress",
+        "event: ready",
+        "event: ready",
+        "event: done",
+    ]
+    assert '"ready": 2, "total": 2' in messages[-1]
+
+
+def test_page_events_reopen_only_finished_pages():
+    events = PageEvents()
+    events.open(1, [0, 1])
+    events.ready(1, 0)
+    events.open(1, [0, 1])  # still loading, keeps the stream
+
+    assert events._streams[1]["ready"] == {0}
+
+
+def test_page_events_forget_finished_pages():
+    events = PageEvents(retention=0.05)
+    events.open(1, [0])
+    events.finish(1)
+    events.open(2, [1])
+    assert set(events._streams) == {1, 2}
+
+    time.sleep(0.1)
+    events.open(3, [2])
+    # the unfinished page is kept
+    assert set(events._streams) == {2, 3}
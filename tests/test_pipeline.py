@@ -0,0 +1,55 @@
+import threading
+
+from synanno.backend.pipeline import Stage, StagedPipeline
+
+
+def test_pipeline_passes_items_through_all_stages():
+    stored, done, failed = [], [], []
+    lock = threading.Lock()
+
+    def download(item):
+        if item == 3:
+            raise ValueError("download failed")
+        return None if item == 5 else item * 10
+
+    def store(value):
+        with lock:
+            stored.append(value)
+
+    pipeline = StagedPipeline(
+        [
+            Stage("download", download, 3),
+            Stage("segment", lambda value: value + 1, 2),
+            Stage("store", store, 1),
+        ],
+        queue_size=2,
+    )
+    timings = pipeline.run(
+        range(8),
+        on_done=done.append,
+        on_error=lambda item, exc: failed.append(item),
+    )
+
+    assert sorted(stored) == [1, 11, 21, 41, 61, 71]
+    assert sorted(done) == [0, 1, 2, 4, 5, 6, 7]
+    assert failed == [3]
+    assert timings["download"]["items"] == 8
+    assert timings["download"]["errors"] == 1
+    assert timings["store"]["items"] == 6
+
+
+def test_pipeline_drops_items_once_cancelled():
+    cancel_event = threading.Event()
+    done = []
+
+    def stop(item):
+        cancel_event.set()
+        return item
+
+    pipeline = StagedPipeline(
+        [Stage("first", stop), Stage("second", lambda item: item)],
+        cancel_event=cancel_event,
+    )
+    pipeline.run(range(4), on_done=done.append)
+
+    assert done == []
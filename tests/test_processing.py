@@ -0,0 +1,162 @@
+import numpy as np
+import pandas as pd
+from scipy.ndimage import center_of_mass
+
+from synanno.backend.processing import (
+    apply_transparency,
+    get_center_blob_value_vectorized,
+    grid_mip,
+    marker_radius,
+    process_syn,
+    store_instance,
+    update_slice_number,
+)
+from synanno.backend.utils import render_overlay, resize_mask
+from tests.conftest import app
+
+
+def test_center_blob_matches_per_blob_centroids():
+    rng = np.random.default_rng(0)
+    labeled = rng.integers(0, 12, size=(32, 32, 6))
+    blob_values = np.unique(labeled)[1:]
+
+    centers = np.array([center_of_mass(labeled == value) for value in blob_values])
+    distances = np.linalg.norm(centers - np.array(labeled.shape) / 2.0, axis=1)
+
+    assert (
+        get_center_blob_value_vectorized(labeled, blob_values)
+        == blob_values[np.argmin(distances)]
+    )
+
+
+def test_process_syn_keeps_the_center_blob():
+    gt = np.zeros((32, 32, 4), dtype=np.uint8)
+    gt[14:18, 14:18, :] = 1
+    gt[0:3, 0:3, :] = 1
+
+    seg = process_syn(gt)
+
+    assert np.count_nonzero(seg) == 16 * 4
+    assert seg[15, 15, 0] != 0 and seg[1, 1, 0] == 0
+
+
+def test_resize_mask_integer_factors():
+    mask = np.zeros((4, 4, 2), dtype=np.uint8)
+    mask[1, 2, :] = 7
+
+    up = resize_mask(mask, (8, 8, 2))
+    assert up.shape == (8, 8, 2) and up.dtype == np.uint8
+    np.testing.assert_array_equal(up[2:4, 4:6], 1)
+    assert up.sum() == 4 * 2
+
+    down = resize_mask(up, (4, 4, 2))
+    np.testing.assert_array_equal(down, mask > 0)
+
+    assert resize_mask(mask, (6, 6, 2)).shape == (6, 6, 2)
+
+
+def test_render_overlay_draws_labels_and_markers():
+    labels = np.zeros((3, 32, 32), dtype=np.uint8)
+    labels[:, 0, 0] = 1
+    markers = [(16, 8, 11, (0, 255, 0), (200, 255, 200))]
+
+    overlay = render_overlay(labels, markers, ["z", "y", "x"], z_offset=10, radius=2)
+
+    assert overlay.shape == (3, 32, 32, 4)
+    assert tuple(overlay[0, 0, 0]) == (255, 0, 255, 255)
+    assert tuple(overlay[1, 8, 16]) == (0, 255, 0, 255)
+    assert tuple(overlay[0, 8, 16]) == (200, 255, 200, 255)
+    assert overlay[1, 16, 16, 3] == 0 and overlay[1, 5, 5, 3] == 0
+    assert np.count_nonzero(overlay[1, ..., 3]) == 13 + 1
+
+
+def test_apply_transparency_colors_non_black_pixels():
+    gray = np.array([[0, 128], [255, 0]], dtype=np.uint8)
+
+    image = np.array(apply_transparency(gray, color=(0, 255, 255)))
+
+    assert tuple(image[0, 1]) == (0, 255, 255, 255)
+    assert image[0, 0, 3] == 0 and image[1, 1, 3] == 0
+
+
+class FakeMipVolume:
+    """Source volume stand-in whose mips halve x and y, mip 2 also z."""
+
+    available_mips = [0, 1, 2]
+
+    def mip_resolution(self, mip):
+        return np.array([8 * 2**mip, 8 * 2**mip, 40 * (2 if mip == 2 else 1)])
+
+
+def test_grid_mip_falls_back_to_full_resolution():
+    with app.app_context():
+        app.source_cv = FakeMipVolume()
+
+        for configured, expected in [(0, 0), (1, 1), (2, 0), (5, 0)]:
+            app.config["GRID_MIP"] = configured
+            assert grid_mip() == expected
+
+        assert marker_radius(0) == 10
+        assert marker_radius(1) == 5
+        app.config["GRID_MIP"] = 0
+
+
+def test_update_slice_number_extends_every_instance():
+    with app.app_context():
+        original = app.df_metadata
+        app.coordinate_order = {"x": (4, 8), "y": (4, 8), "z": (33, 33)}
+        app.vol_dim = (100, 100, 50)
+        app.crop_size_z_draw = 16
+        app.df_metadata = pd.DataFrame(
+            {
+                "Page": [1, 1, 1],
+                "Image_Index": [0, 1, 2],
+                "crop_size_z": [6, 20, 6],
+                "Original_Bbox": [
+                    [10, 20, 10, 20, 22, 28],
+                    [10, 20, 10, 20, 0, 20],
+                    [10, 20, 10, 20, 0, 6],
+                ],
+                "Adjusted_Bbox": [None] * 3,
+                "Padding": [None] * 3,
+            }
+        )
+
+        update_slice_number()
+
+        # an instance with too many slices does not stop the others' update
+        records = app.df_metadata.to_dict("records")
+        assert [record["crop_size_z"] for record in records] == [16, 20, 16]
+        assert records[0]["Original_Bbox"] == [10, 20, 10, 20, 17, 33]
+        assert records[1]["Original_Bbox"] == [10, 20, 10, 20, 0, 20]
+        assert records[2]["Original_Bbox"] == [10, 20, 10, 20, -5, 11]
+        assert records[2]["Adjusted_Bbox"] == [10, 20, 10, 20, 0, 11]
+        assert records[2]["Padding"] == [[0, 0], [0, 0], [5, 0]]
+
+        app.df_metadata = original
+
+
+def test_store_instance_encodes_only_the_middle_slice():
+    with app.app_context():
+        app.coordinate_order = {"x": (4, 8), "y": (4, 8), "z": (33, 33)}
+        item = {
+            "Image_Index": 7,
+            "Middle_Slice": 12,
+            "Adjusted_Bbox": [0, 8, 0, 8, 10, 16],
+            "Error_Description": "None",
+        }
+        volume = np.zeros((8, 8, 6), dtype=np.uint8)
+        store_instance(
+            {
+                "item": item,
+                "cropped_img_pad": volume,
+                "cropped_seg_pad": volume,
+                "markers": [],
+                "cache_key": "test-store-instance",
+                "mip": 0,
+            }
+        )
+
+        for slices in (app.source_image_data["7"], app.target_image_data["7"]):
+            assert list(slices._encoded) == ["12"]
+        del app.source_image_data["7"], app.target_image_data["7"]
@@ -1,3 +1,17 @@
+import gzip
+
+import numpy as np
+import pandas as pd
+import pytest
+from flask import Flask
+
+from synanno import configure_app
+from synanno.backend.instance_store import InstanceSlices
+from synanno.backend.processing import bump_tile_version, source_tile_token
+from synanno.routes.file_access import send_tile
+from tests.conftest import app
+
+
 def test_landingpage(client):
     response = client.get("/")
     assert response.status_code == 200
@@ -12,3 +26,159 @@ def test_open_annotate(client):
 def test_open_draw(client):
     response = client.get("/open_data/draw")
     assert response.status_code == 200
+
+
+def test_tile_conditional_get(client):
+    app.source_image_data["9"] = {"2": b"em-2"}
+    app.target_image_data["9"] = {"curve": {"2": b"curve-2"}}
+
+    response = client.get("/get_source_image/9/2")
+    assert response.data == b"em-2"
+    etag = response.headers["ETag"]
+    assert (
+        client.get("/get_source_image/9/2", headers={"If-None-Match": etag}).status_code
+        == 304
+    )
+
+    response = client.get("/get_curve_image/9/2")
+    etag = response.headers["ETag"]
+    with app.app_context():
+        bump_tile_version("9", "curve")
+    response = client.get("/get_curve_image/9/2", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.data == b"curve-2"
+
+
+def test_tile_manifest(client):
+    app.source_image_data["11"] = {"3": b"em-3", "4": b"em-4"}
+    app.target_image_data["11"] = {"3": b"seg-3", "curve": {"4": b"curve-4"}}
+
+    manifest = client.get("/get_tile_manifest?image_index=11,12").get_json()
+
+    assert manifest["instances"]["11"]["source"] == ["3", "4"]
+    assert manifest["instances"]["11"]["target"] == ["3"]
+    assert manifest["instances"]["11"]["curve"] == ["4"]
+    assert manifest["instances"]["12"] is None
+
+
+def test_update_cards_applies_a_batch_of_changes(client):
+    original = app.df_metadata
+    app.df_metadata = pd.DataFrame(
+        {
+            "Page": [1, 1, 2],
+            "Image_Index": [0, 1, 2],
+            "Label": ["correct"] * 3,
+            "Error_Description": ["None"] * 3,
+        }
+    )
+    try:
+        response = client.post(
+            "/update-cards",
+            json={
+                "changes": [
+                    {"page": "1", "data_id": "0", "label": "unsure"},
+                    {"page": 2, "data_id": 2, "label": "incorrect", "flag": "badFit"},
+                    {"page": 1, "data_id": 1, "flag": "falsePositive"},
+                    {"page": 3, "data_id": 7, "label": "unsure"},
+                ],
+                "delete_fps": True,
+            },
+        )
+        assert response.get_json()["updated"] == 3
+        assert app.df_metadata.to_dict("list") == {
+            "Page": [1, 2],
+            "Image_Index": [0, 2],
+            "Label": ["unsure", "incorrect"],
+            "Error_Description": ["None", "badFit"],
+        }
+
+        response = client.post(
+            "/update-cards", json={"changes": [{"page": 1, "data_id": 0, "label": "x"}]}
+        )
+        assert response.status_code == 400
+    finally:
+        app.df_metadata = original
+
+
+def test_download_json_streams_the_requested_format(client):
+    original, pages = app.df_metadata, app.n_pages
+    app.df_metadata = pd.DataFrame({"Page": [1, 1], "Image_Index": [0, 1]})
+    app.n_pages = 1
+    try:
+        response = client.get("/download_json?format=jsonl&gzip=1")
+        assert response.is_streamed
+        assert response.headers["Content-Disposition"].endswith("synanno.jsonl.gz")
+        lines = gzip.decompress(response.data).splitlines()
+        assert lines[1:] == [
+            b'{"Page":1,"Image_Index":0}',
+            b'{"Page":1,"Image_Index":1}',
+        ]
+
+        assert client.get("/download_json?format=csv").status_code == 400
+    finally:
+        app.df_metadata, app.n_pages = original, pages
+
+
+def test_download_parquet_with_false_negatives(client):
+    pytest.importorskip("pyarrow")
+    original, pages = app.df_metadata, app.n_pages
+    app.df_metadata = pd.DataFrame(
+        {"Page": [1, 1], "neuron_id": ["No Neuron Selected", -1]}
+    )
+    app.n_pages = 1
+    try:
+        response = client.get("/download_json?format=parquet")
+        assert response.status_code == 200
+        assert response.data.startswith(b"PAR1")
+
+        # values Parquet cannot hold are reported instead of failing the response
+        app.df_metadata["neuron_id"] = [1j, 2j]
+        assert client.get("/download_json?format=parquet").status_code == 422
+    finally:
+        app.df_metadata, app.n_pages = original, pages
+
+
+def test_only_sessions_create_workspaces(client):
+    workspaces = app.workspaces
+    count = len(workspaces._workspaces)
+    workspaces.per_session = True
+    try:
+        # a request without a session creates no workspace
+        with app.test_client() as anonymous:
+            assert anonymous.get("/open_data").status_code == 302
+        assert client.get("/static/annotation.js").status_code == 200
+        assert client.get("/").status_code == 200
+        assert len(workspaces._workspaces) == count
+
+        # the session started by the landing page gets one
+        assert client.get("/open_data").status_code == 200
+        assert len(workspaces._workspaces) == count + 1
+    finally:
+        workspaces.per_session = False
+
+
+def test_em_tiles_are_immutable_only_at_the_requested_mip():
+    slices = InstanceSlices(
+        np.zeros((4, 4, 2), dtype=np.uint8),
+        0,
+        2,
+        lambda volume, position: volume[..., position],
+        content_key="grid",
+        mip=1,
+    )
+    with app.test_request_context():
+        grid, full = source_tile_token(1), source_tile_token(0)
+
+    with app.test_request_context(f"/get_source_image/12/0?v={grid}"):
+        response = send_tile(slices, "12", "source", "0")
+        assert "immutable" in response.headers["Cache-Control"]
+    # a view expecting full resolution revalidates the grid resolution tile
+    with app.test_request_context(f"/get_source_image/12/0?v={full}"):
+        response = send_tile(slices, "12", "source", "0")
+        assert response.headers["Cache-Control"] == "no-cache"
+
+
+def test_unknown_tile_codec_falls_back_to_png(monkeypatch):
+    monkeypatch.setenv("SOURCE_TILE_CODEC", "wepb")
+    flask_app = Flask(__name__)
+    configure_app(flask_app)
+    assert flask_app.config["SOURCE_TILE_CODEC"] == "png"
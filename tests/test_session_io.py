@@ -0,0 +1,74 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from synanno.backend.session_io import export_session, read_session
+
+PROOFREAD_TIME = {"start_grid": "2024-01-01T10:00:00", "difference_grid": None}
+
+
+def make_frame(n=5):
+    return pd.DataFrame(
+        {
+            "Page": np.arange(n) // 2 + 1,
+            "Image_Index": np.arange(n),
+            "Label": ["correct", "incorrect"] * (n // 2) + ["unsure"] * (n % 2),
+            "Original_Bbox": [[i, i + 8, 0, 16, 0, 16] for i in range(n)],
+            "Padding": [[[0, 0], [0, 0], [0, i]] for i in range(n)],
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    "fmt, compress",
+    [("json", False), ("json", True), ("jsonl", False), ("jsonl", True)],
+)
+def test_json_exports_load_again(fmt, compress):
+    frame = make_frame()
+    export = b"".join(export_session(PROOFREAD_TIME, frame, fmt, compress))
+    if fmt == "json" and not compress:
+        assert json.loads(export)["Metadata"][1]["Label"] == "incorrect"
+
+    proofread_time, loaded = read_session(io.BytesIO(export))
+    assert proofread_time == PROOFREAD_TIME
+    pd.testing.assert_frame_equal(loaded, frame)
+
+
+def test_parquet_export_keeps_typed_bbox_columns():
+    pytest.importorskip("pyarrow")
+    frame = make_frame(5000)
+    export = b"".join(export_session(PROOFREAD_TIME, frame, "parquet"))
+
+    proofread_time, loaded = read_session(io.BytesIO(export))
+    assert proofread_time == PROOFREAD_TIME
+    pd.testing.assert_frame_equal(loaded, frame)
+
+
+def test_parquet_export_stores_mixed_columns_as_strings():
+    pytest.importorskip("pyarrow")
+    frame = make_frame(3)
+    # a false negative added in a volume session
+    frame["neuron_id"] = ["No Neuron Selected", "No Neuron Selected", -1]
+    export = b"".join(export_session(PROOFREAD_TIME, frame, "parquet"))
+
+    _, loaded = read_session(io.BytesIO(export))
+    assert loaded["neuron_id"].tolist() == [
+        "No Neuron Selected",
+        "No Neuron Selected",
+        "-1",
+    ]
+    # the exported metadata is left as it is
+    assert frame["neuron_id"].tolist()[-1] == -1
+
+
+def test_earlier_json_exports_load():
+    export = json.dumps(
+        {"Proofread Time": PROOFREAD_TIME, "Metadata": [{"Page": 1, "cz0": np.nan}]},
+        indent=4,
+    )
+    proofread_time, loaded = read_session(io.BytesIO(export.encode()))
+    assert loaded["Page"].tolist() == [1]
+    assert loaded["cz0"].isna().all()
@@ -0,0 +1,84 @@
+from functools import partial
+
+import numpy as np
+
+from synanno.backend.instance_store import InstanceSlices
+from synanno.backend.processing import bump_tile_version, store_instance_slices
+from synanno.backend.shared_tiles import SharedTileStore
+from synanno.backend.tile_bundle import unpack_tile_bundle
+from tests.conftest import app
+
+
+def test_shared_tile_store_replaces_layers_and_sessions(tmp_path):
+    store = SharedTileStore(str(tmp_path / "tiles.sqlite"))
+    store.publish(
+        "w", "a", "1", "source", 3, [("5", b"em-5", "image/png", "e5")], mip=1
+    )
+    store.publish("w", "a", "1", "target", 3, [("5", b"seg-5", "image/png", "s5")])
+    store.publish("w", "a", "2", "source", 4, [("0", b"em-0", "image/png", "e0")])
+
+    assert store.get_tile("w", "1", "source", "5") == (
+        b"em-5",
+        "image/png",
+        "e5",
+        1,
+    )
+    assert [tile["layer"] for tile, _ in store.instance_tiles("w", "1")] == [
+        "source",
+        "target",
+    ]
+    assert store.page_instances("w", 3) == ["1"]
+
+    store.publish("w", "a", "1", "target", 3, [])
+    assert not store.has_tile("w", "1", "target", "5")
+
+    # a new session discards the tiles the workspace published before
+    store.publish("v", "c", "1", "source", 3, [("5", b"other", "image/png", "o5")])
+    store.publish("w", "b", "3", "source", 1, [("0", b"em-0", "image/png", "e0")])
+    assert store.session("w") == "b"
+    assert store.get_tile("w", "1", "source", "5") is None
+    assert store.get_tile("v", "1", "source", "5")[0] == b"other"
+
+
+def test_tile_routes_fall_back_to_shared_tiles(client, tmp_path):
+    app.shared_tiles = SharedTileStore(str(tmp_path / "tiles.sqlite"))
+    try:
+        with app.app_context():
+            app.source_image_data["11"] = {"3": b"em-3"}
+            bump_tile_version("11", "source")
+            # another worker only sees the published tiles
+            del app.source_image_data["11"]
+            app.tile_versions.clear()
+
+        response = client.get("/get_source_image/11/3")
+        assert response.status_code == 200
+        assert response.data == b"em-3"
+        assert (
+            client.get(
+                "/get_source_image/11/3",
+                headers={"If-None-Match": response.headers["ETag"]},
+            ).status_code
+            == 304
+        )
+
+        tiles = unpack_tile_bundle(client.get("/get_tile_bundle?image_index=11").data)
+        assert [(tile["slice"], data) for tile, data in tiles] == [("3", b"em-3")]
+    finally:
+        app.shared_tiles = None
+
+
+def test_publish_skips_slices_that_were_not_encoded(tmp_path):
+    app.shared_tiles = SharedTileStore(str(tmp_path / "tiles.sqlite"))
+    try:
+        with app.app_context():
+            volume = np.random.randint(0, 255, size=(8, 8, 4), dtype=np.uint8)
+            slices = InstanceSlices(volume, 10, 2, partial(np.take, axis=2))
+            store_instance_slices("12", slices, None, middle_slice=12)
+
+            scope = app.workspaces.current_id()
+            assert slices.encoded_keys() == ["12"]
+            assert app.shared_tiles.has_tile(scope, "12", "source", "12")
+            assert not app.shared_tiles.has_tile(scope, "12", "source", "11")
+            del app.source_image_data["12"]
+    finally:
+        app.shared_tiles = None
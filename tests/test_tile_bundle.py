@@ -0,0 +1,57 @@
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from synanno.backend.instance_store import InstanceSlices
+from synanno.backend.tile_bundle import pack_tile_bundle, unpack_tile_bundle
+from tests.conftest import app
+
+
+def test_tile_bundle_round_trip():
+    tiles = [
+        ({"image_index": "0", "slice": "3", "layer": "source"}, b"em"),
+        ({"image_index": "0", "slice": "3", "layer": "target"}, b"overlay"),
+    ]
+
+    unpacked = unpack_tile_bundle(pack_tile_bundle(tiles))
+
+    assert [data for _, data in unpacked] == [b"em", b"overlay"]
+    assert unpacked[1][0]["layer"] == "target"
+
+
+def test_get_tile_bundle_route(client):
+    app.source_image_data["7"] = {"4": b"em-4", "5": b"em-5"}
+    app.target_image_data["7"] = {"4": b"overlay-4", "curve": {}}
+
+    response = client.get("/get_tile_bundle?image_index=7")
+    tiles = unpack_tile_bundle(response.data)
+
+    assert response.status_code == 200
+    assert [(tile["slice"], tile["layer"], data) for tile, data in tiles] == [
+        ("4", "source", b"em-4"),
+        ("4", "target", b"overlay-4"),
+        ("5", "source", b"em-5"),
+    ]
+    assert client.get("/get_tile_bundle").status_code == 400
+
+
+def test_page_bundle_only_holds_encoded_slices(client):
+    volume = np.random.randint(0, 255, size=(8, 8, 4), dtype=np.uint8)
+    slices = InstanceSlices(volume, 10, 2, partial(np.take, axis=2))
+    slices.encode_slices(["12"])
+    original, app.df_metadata = app.df_metadata, pd.DataFrame(
+        [{"Page": 1, "Image_Index": 7}]
+    )
+    app.source_image_data["7"] = slices
+    app.target_image_data["7"] = {}
+
+    page_tiles = unpack_tile_bundle(client.get("/get_tile_bundle?page=1").data)
+    assert [tile["slice"] for tile, _ in page_tiles] == ["12"]
+    assert slices.encoded_keys() == ["12"]
+
+    instance_tiles = unpack_tile_bundle(
+        client.get("/get_tile_bundle?image_index=7").data
+    )
+    assert [tile["slice"] for tile, _ in instance_tiles] == ["10", "11", "12", "13"]
+    app.df_metadata = original
@@ -0,0 +1,43 @@
+import os
+
+from synanno.backend.tile_cache import TileCache
+
+
+def test_tile_cache_round_trip(tmp_path):
+    cache = TileCache(str(tmp_path), max_size_bytes=1024**2)
+    key = cache.make_key(source_url="gs://bucket/em", bbox=[0, 6, 0, 256, 0, 256])
+
+    assert cache.get(key) is None
+    cache.put(key, {"source/3": b"png-bytes", "target/3": b"overlay"})
+    assert cache.get(key) == {"source/3": b"png-bytes", "target/3": b"overlay"}
+
+
+def test_tile_cache_evicts_least_recently_used(tmp_path):
+    cache = TileCache(str(tmp_path), max_size_bytes=3500)
+    keys = [cache.make_key(index=i) for i in range(3)]
+
+    for age, key in enumerate(keys):
+        cache.put(key, {"source/0": os.urandom(1000)})
+        path = cache._entry_path(key)
+        os.utime(path, (age, age))
+    cache.get(keys[0])  # refresh the oldest entry
+    cache.put(cache.make_key(index=3), {"source/0": os.urandom(1000)})
+
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+
+
+def test_tile_cache_evicts_to_the_low_water_mark(tmp_path, monkeypatch):
+    cache = TileCache(str(tmp_path), max_size_bytes=50_000)
+    scans = []
+    list_entries = cache._list_entries
+    monkeypatch.setattr(
+        cache, "_list_entries", lambda: scans.append(1) or list_entries()
+    )
+
+    for index in range(60):
+        cache.put(cache.make_key(index=index), {"source/0": os.urandom(1000)})
+
+    # every eviction frees room for several entries before the next scan
+    assert cache._size_bytes <= cache.max_size_bytes
+    assert 0 < len(scans) <= 5
@@ -0,0 +1,91 @@
+import threading
+import time
+
+import numpy as np
+
+from synanno.backend.instance_store import InstanceSlices
+from synanno.backend.tile_store import TileStore
+
+
+def test_tile_store_evicts_by_page_distance_and_reloads():
+    pages = {"1": 1, "2": 2, "3": 5, "4": 1}
+    reloaded = []
+
+    def loader(image_index, mip):
+        reloaded.append((image_index, mip))
+        store.source[image_index] = {"0": b"x" * 100}
+
+    store = TileStore(350, loader=loader, page_of=lambda: pages)
+    store.current_page = 1
+    for image_index in ["1", "2", "3"]:
+        store.source[image_index] = {"0": b"x" * 100}
+        store.target[image_index] = {}
+    # drawn masks pin the instance
+    store.target["2"]["curve"] = {"0": b"m" * 10}
+
+    store.source["4"] = {"0": b"x" * 100}
+
+    # the instance on page 5 is the furthest, page 2 is pinned
+    assert set(store.source) == {"1", "2", "4"}
+    assert "3" in store.source and "3" in store.target
+    assert store.nbytes <= 350
+
+    # reloading evicts the least recently used instance of the current page
+    assert store.source["3"] == {"0": b"x" * 100}
+    assert reloaded == [("3", 0)]
+    assert set(store.source) == {"2", "3", "4"}
+
+    del store.source["1"]
+    assert "1" not in store.source
+
+
+def test_tile_store_enforces_budget_when_slices_are_encoded():
+    def slices():
+        return InstanceSlices(
+            np.zeros((4, 4, 8), dtype=np.uint8),
+            0,
+            2,
+            lambda volume, position: volume[..., position],
+            encode=lambda image: b"x" * 100,
+        )
+
+    store = TileStore(0)
+    store.source["1"], store.source["2"] = slices(), slices()
+    store.budget_bytes = store.nbytes + 250
+
+    # encoding the slices of one instance evicts the other
+    store.source["2"].encode_slices(["0", "1"])
+    assert set(store.source) == {"1", "2"}
+    store.source["2"]["2"]
+    assert set(store.source) == {"2"}
+
+
+def test_tile_store_reloads_an_instance_once_for_concurrent_accesses():
+    release = threading.Event()
+    reloaded = []
+
+    def loader(image_index, mip):
+        reloaded.append(image_index)
+        release.wait()
+        store.source[image_index] = {"0": b"x" * 100}
+
+    store = TileStore(150, loader=loader)
+    store.source["1"] = {"0": b"x" * 100}
+    store.source["2"] = {"0": b"x" * 100}
+    assert set(store.source) == {"2"}
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(store.source["1"]))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    # let every access reach the store while the first one is loading
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert reloaded == ["1"]
+    assert results == [{"0": b"x" * 100}] * 4
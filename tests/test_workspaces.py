@@ -0,0 +1,46 @@
+import pytest
+
+from synanno.backend.workspaces import (
+    WorkspaceFlask,
+    WorkspaceManager,
+    WorkspacesFull,
+    current_workspace,
+)
+
+
+def test_workspaces_keep_session_state_apart():
+    app = WorkspaceFlask(__name__)
+    app.cache = "app-wide"
+    evicted = []
+    app.workspaces = WorkspaceManager(
+        lambda: setattr(app, "labels", []),
+        max_workspaces=2,
+        on_evict=lambda: evicted.append(app.workspaces.current_id()),
+        in_use=lambda: bool(app.labels),
+    )
+
+    for workspace_id in ["a", "b", "a"]:
+        token = app.workspaces.bind(app.workspaces.get(workspace_id))
+        app.labels.append(workspace_id)
+        assert app.cache == "app-wide"
+        current_workspace.reset(token)
+
+    assert app.workspaces.get("b").labels == ["b"]
+    assert app.workspaces.get("a").labels == ["a", "a"]
+    assert "labels" not in app.__dict__
+
+    # a workspace in use is never dropped for another one
+    with pytest.raises(WorkspacesFull):
+        app.workspaces.get("c")
+    assert evicted == []
+
+    # the least recently used workspace without state makes room
+    app.workspaces.get("b").labels.clear()
+    app.workspaces.get("a")
+    app.workspaces.get("c")
+    assert evicted == ["b"]
+
+    loads = []
+    for _ in range(2):
+        app.workspaces.shared("table", lambda: loads.append(1) or "table")
+    assert loads == [1]